@@ -7,24 +7,47 @@ Licensed under the MIT license. See LICENSE file on the project webpage for deta
 XBlock to allow for video playback from Azure Media Services
 Built using documentation from: http://amp.azure.net/libs/amp/latest/docs/index.html
 """
+import hashlib
+import json
 import logging
+from multiprocessing import TimeoutError
+import time
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.core.urlresolvers import NoReverseMatch, reverse
-from django.http import HttpResponseBadRequest
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import get_language
 from edxval.models import Video
 from opaque_keys.edx.keys import UsageKey
-import requests
 from util.views import ensure_valid_usage_key
+from webob import Response
 from xblock.core import XBlock
-from xblock.fields import Boolean, List, Scope, String
+from xblock.fields import Boolean, Float, List, Scope, String
 from xblock.fragment import Fragment
-from xblockutils.resources import ResourceLoader
 from xblockutils.studio_editable import StudioEditableXBlockMixin
 from xmodule.modulestore.django import modulestore
 
-from .utils import _, AssetsMode
+from .bundle import get_bundle_manifest
+from .clients import get_media_service_clients
+from .embed import fill_csrf_tokens, get_cacheable_headers, get_embed_cache, get_embed_http_max_age, \
+    is_per_visitor, strip_csrf_tokens
+from .events import get_event_publisher, is_async_publishing
+from .executor import get_thread_pool, run_concurrently
+from .metrics import measured, timed
+from .progress import clean_intervals, get_heartbeat_allowance, get_watched_fraction, limit_intervals, \
+    merge_intervals, parse_duration, WATCH_COMPLETION_THRESHOLD, WATCH_HEARTBEAT_INTERVAL, \
+    WATCH_HEARTBEAT_MAX_INTERVALS, WATCH_HEARTBEAT_SLACK, WATCH_MAX_INTERVALS, WATCH_MAX_PLAYBACK_RATE
+from .resources import CachedResourceLoader
+from .search import is_search_enabled, search_course
+from .tokens import get_token_service, InvalidSigningKey
+from .transcripts import get_transcript_cache, gzip_chunks, TranscriptStream, TranscriptTooLarge
+from .utils import _, AssetsMode, decode_cursor, encode_cursor, etag_matches
+from .video_info import get_video_duration, get_video_info_cache
+from .webvtt import get_cue_index_json
 
 APP_AZURE_VIDEO_PIPELINE = True
 
@@ -38,7 +61,41 @@ except ImportError:
 
 
 log = logging.getLogger(__name__)
-loader = ResourceLoader(__name__)
+loader = CachedResourceLoader(__name__)
+
+# Defaults, can be overridden in Django settings:
+# - `max-age` (seconds) of transcripts served by `transcript` handler;
+TRANSCRIPT_HTTP_MAX_AGE = 60 * 60
+# - max number of languages `transcript_cues_batch` handler serves at once;
+TRANSCRIPT_BATCH_MAX_SIZE = 20
+# - size of the thread pool transcripts of a batch are fetched concurrently with;
+TRANSCRIPT_FETCH_WORKERS = 8
+# - max number of events `publish_events` handler accepts at once;
+EVENTS_BATCH_MAX_SIZE = 100
+# - whether the player's JS/CSS is served as a (cacheable) bundle rather than inlined into each block;
+USE_ASSET_BUNDLE = True
+# - number of videos `list_stream_videos` handler returns per page (and the max one a client may ask for);
+STREAM_VIDEOS_PAGE_SIZE = 50
+STREAM_VIDEOS_MAX_PAGE_SIZE = 200
+# - number of Azure Media Services asset lookups (locators, files) run at once, each takes `LOOKUPS_PER_ASSET` threads;
+AMS_LOOKUP_CONCURRENCY = 4
+# - how long (seconds) asset lookups are waited for;
+AMS_LOOKUP_TIMEOUT = 10
+# - max size (bytes of compact JSON) of the default-language cue index embedded into `student_view`, 0 disables it;
+TRANSCRIPT_PREFETCH_MAX_SIZE = 64 * 1024
+# - whether players are built only once they scroll into view (blocks' `lazy_load` setting overrides it).
+PLAYER_LAZY_LOAD = False
+
+AMP_JS_URL = '//amp.azure.net/libs/amp/2.1.5/azuremediaplayer.min.js'
+AMP_CSS_URL = '//amp.azure.net/libs/amp/2.1.5/skins/amp-default/azuremediaplayer.min.css'
+# Stands in for the (per-user) playback token in the cached player HTML:
+PLAYBACK_TOKEN_PLACEHOLDER = '__AMS_PLAYBACK_TOKEN__'
+
+# Upstream calls an asset lookup makes concurrently (locators of both types and files):
+LOOKUPS_PER_ASSET = 3
+
+# Columns the video picker needs:
+STREAM_VIDEO_FIELDS = ('edx_video_id', 'client_video_id', 'created')
 
 # According to edx-platform vertical xblocks
 CLASS_PRIORITY = ['video']
@@ -147,16 +204,56 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
         scope=Scope.settings
     )
 
+    lazy_load = String(
+        display_name=_("Load player on scroll"),
+        help=_(
+            "Show a lightweight placeholder and build the player only once it scrolls into view or is clicked. "
+            "Speeds up units with many videos."
+        ),
+        values=(
+            {'display_name': _("Site default"), 'value': ''},
+            {'display_name': _("On"), 'value': 'on'},
+            {'display_name': _("Off"), 'value': 'off'},
+        ),
+        default='',
+        scope=Scope.settings
+    )
+
+    # Watch progress of the learner (see `progress` module): sorted, disjoint `[start, end]` intervals (seconds)
+    # of the video they've watched, video duration (see `get_watch_duration`), whether it's been completed
+    # and when (unix time) the previous heartbeat has been received.
+    watched_intervals = List(
+        default=[],
+        scope=Scope.user_state
+    )
+    watched_duration = Float(
+        default=0.0,
+        scope=Scope.user_state
+    )
+    watch_heartbeat_at = Float(
+        default=0.0,
+        scope=Scope.user_state
+    )
+    watch_completed = Boolean(
+        default=False,
+        scope=Scope.user_state
+    )
+
+    # Completion is reported by `watch_progress` handler rather than on view (or by the view itself if
+    # watch tracking is disabled, see `complete_on_view`):
+    has_custom_completion = True
+
     # These are what become visible in the Mixin editor
     editable_fields = (
         # Settings tab:
         'display_name', 'video_url', 'verification_key', 'protection_type',
         'token_issuer', 'token_scope', 'captions', 'transcripts_enabled',
-        'assets_download', 'download_url', 'share',
+        'assets_download', 'download_url', 'share', 'lazy_load',
         # Management tab:
         'edx_video_id', 'caption_ids'
     )
 
+    @measured('view')
     def studio_view(self, context):
         """
         Render a form for editing this XBlock.
@@ -165,14 +262,9 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
             azure_config = get_azure_config(self.location.org) if APP_AZURE_VIDEO_PIPELINE else {}
         except ImproperlyConfigured:
             azure_config = {}
-        list_stream_videos = []
-
-        if azure_config:
-            list_stream_videos = self.get_list_stream_videos()
         context = {
             'fields': [],
             'has_azure_config': len(azure_config) != 0,
-            'list_stream_videos': list_stream_videos,
             'edx_video_id': self.edx_video_id,
             'caption_ids': self.caption_ids
         }
@@ -211,12 +303,16 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
             "transcripts_enabled": bool(self.transcripts_enabled and self.captions),
             "download_url": self.download_url,
             "assets_download": self.assets_download in [AssetsMode.edx, AssetsMode.combined],
-            "share": False
+            "share": False,
+            # The embedded page plays a single video, there's nothing to defer:
+            "lazy_load": not embedded and self.is_lazy_load(),
+            "display_name": self.display_name,
         }
 
         if self.protection_type:
+            # The token is per user, it's put in after the (shared) player HTML is rendered:
             context.update({
-                "auth_token": self.verification_key,
+                "auth_token": PLAYBACK_TOKEN_PLACEHOLDER,
             })
 
         if self.share and not embedded:
@@ -229,6 +325,36 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
 
         return context
 
+    def is_lazy_load(self):
+        """
+        Whether the player is built on scroll: block's own setting or the site-wide default.
+        """
+        if self.lazy_load:
+            return self.lazy_load == 'on'
+        return getattr(settings, 'AMS_PLAYER_LAZY_LOAD', PLAYER_LAZY_LOAD)
+
+    def get_playback_token(self):
+        """
+        Return short-lived token the current user plays the protected video with.
+        """
+        return self.get_playback_token_and_expiry()[0]
+
+    def get_playback_token_and_expiry(self):
+        """
+        Return short-lived token the current user plays the protected video with and its expiration (UNIX time).
+
+        An empty token expiring right away is returned if the verification key is invalid.
+        """
+        try:
+            return get_token_service().get_token_and_expiry(
+                unicode(self.scope_ids.usage_id), self.runtime.user_id,
+                self.verification_key, self.token_issuer, self.token_scope
+            )
+        except InvalidSigningKey:
+            log.error("Invalid verification key (must be Base64 encoded): block [%s]", self.scope_ids.usage_id)
+            return '', time.time()
+
+    @measured('view')
     def student_view(self, context):
         """
         Student view of this component.
@@ -237,25 +363,56 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
         Returns: xblock.fragment.Fragment: XBlock HTML fragment
         """
         fragment = Fragment()
+        watch_heartbeat_interval = getattr(settings, 'AMS_WATCH_HEARTBEAT_INTERVAL', WATCH_HEARTBEAT_INTERVAL)
+        if not watch_heartbeat_interval:
+            self.complete_on_view()
 
-        context.update(self._get_context_for_template(context.get('embedded')))
-        fragment.add_content(loader.render_django_template('/templates/player.html', context))
+        template_context = self._get_context_for_template(context.get('embedded'))
+        context.update(template_context)
+        # The template context consists of the block settings and per-user share bits only, so
+        # the rendered player is shared by all the learners (and blocks) with the same settings;
+        # edits in Studio change the settings, hence the cache key:
+        content = loader.render_django_template_cached('/templates/player.html', context, template_context)
+        protection = None
+        if self.protection_type:
+            if self.runtime.user_id:
+                token, expires_at = self.get_playback_token_and_expiry()
+            else:
+                # Pages of anonymous users are shared (see `embed_player`), the player fetches its own token:
+                token, expires_at = '', time.time()
+            content = content.replace(PLAYBACK_TOKEN_PLACEHOLDER, token)
+            # The page may stay open longer than the token is valid, the player gets a fresh one then:
+            protection = {
+                'type': self.protection_type,
+                'src': self.video_url,
+                'expires_in': max(int(expires_at - time.time()), 0),
+            }
+        fragment.add_content(content)
 
         '''
         Note: DO NOT USE the "latest" folder in production, but specify a version
                 from https://aka.ms/ampchangelog . This allows us to run a test
                 pass prior to ingesting later versions.
         '''
-        fragment.add_javascript(loader.load_unicode('node_modules/videojs-vtt.js/lib/vttcue.js'))
+        bundle = self.get_asset_bundle_urls()
+        if bundle is None:
+            fragment.add_javascript(loader.load_unicode('node_modules/videojs-vtt.js/lib/vttcue.js'))
 
-        fragment.add_css_url('//amp.azure.net/libs/amp/2.1.5/skins/amp-default/azuremediaplayer.min.css')
-        fragment.add_javascript_url('//amp.azure.net/libs/amp/2.1.5/azuremediaplayer.min.js')
+        if not context['lazy_load']:
+            fragment.add_css_url(AMP_CSS_URL)
+            fragment.add_javascript_url(AMP_JS_URL)
 
-        fragment.add_javascript(loader.load_unicode('static/js/plugins/transcriptsAmpPlugin.js'))
-        fragment.add_javascript(loader.load_unicode('static/js/player.js'))
+        if bundle is not None:
+            # Same URL for all the blocks on the page, so the browser loads (and caches) it once:
+            fragment.add_javascript_url(bundle['js'])
+            fragment.add_css_url(bundle['css'])
+        else:
+            fragment.add_javascript(loader.load_unicode('static/js/transcript_sync.js'))
+            fragment.add_javascript(loader.load_unicode('static/js/plugins/transcriptsAmpPlugin.js'))
+            fragment.add_javascript(loader.load_unicode('static/js/player.js'))
 
-        fragment.add_css(loader.load_unicode('static/js/plugins/transcriptsAmpPlugin.css'))
-        fragment.add_css(loader.load_unicode('public/css/player.css'))
+            fragment.add_css(loader.load_unicode('static/js/plugins/transcriptsAmpPlugin.css'))
+            fragment.add_css(loader.load_unicode('public/css/player.css'))
 
         # @TODO: Make sure all fields are well structured/formatted, if it is not correct, then
         # print out an error msg in view rather than just silently failing
@@ -266,11 +423,62 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
                 'transcripts': self.captions,
                 'video_download_uri': context['download_url'],
                 'assets_download': self.assets_download in [AssetsMode.amp, AssetsMode.combined],
-                'user_is_authenticated': bool(self.runtime.user_id)
+                'user_is_authenticated': bool(self.runtime.user_id),
+                'transcript_prefetch': self.get_prefetched_transcript() if context['transcripts_enabled'] else None,
+                # AMP is loaded on demand once the block scrolls into view:
+                'lazy_load': context['lazy_load'],
+                'amp_urls': {'js': AMP_JS_URL, 'css': AMP_CSS_URL},
+                'protection': protection,
+                # Anonymous users have no state to keep progress in:
+                'watch_heartbeat_interval': watch_heartbeat_interval if self.runtime.user_id else 0,
             }
         )
         return fragment
 
+    def get_prefetched_transcript(self):
+        """
+        Return default-language transcript's compact cue index (`{'lang': ..., 'cues': ...}`) or None.
+
+        The index is embedded only if the transcript is already cached and the index fits
+        `AMS_TRANSCRIPT_PREFETCH_MAX_SIZE`: rendering never waits for the storage.
+        """
+        max_size = getattr(settings, 'AMS_TRANSCRIPT_PREFETCH_MAX_SIZE', TRANSCRIPT_PREFETCH_MAX_SIZE)
+        caption = self.get_default_caption()
+        if not max_size or not caption or not caption.get('src'):
+            return None
+
+        content = get_transcript_cache().get_cached_content(caption['src'], caption['srclang'])
+        if content is None:
+            return None
+        _digest, index_json = get_cue_index_json(content)
+        if len(index_json) > max_size:
+            return None
+        return {'lang': caption['srclang'], 'cues': json.loads(index_json)}
+
+    def get_default_caption(self):
+        """
+        Return caption in the user's language (or its base language) falling back to the first one.
+        """
+        if not self.captions:
+            return None
+        language = (get_language() or '').lower()
+        by_lang = {(caption.get('srclang') or '').lower(): caption for caption in self.captions}
+        return by_lang.get(language) or by_lang.get(language.split('-')[0]) or self.captions[0]
+
+    def get_asset_bundle_urls(self):
+        """
+        Return URLs of the player's JS/CSS bundle or None if the bundle is disabled or unavailable.
+        """
+        if not getattr(settings, 'AMS_USE_ASSET_BUNDLE', USE_ASSET_BUNDLE):
+            return None
+        manifest = get_bundle_manifest()
+        if manifest is None:
+            return None
+        try:
+            return {kind: self.runtime.local_resource_url(self, path) for kind, path in manifest.items()}
+        except NotImplementedError:
+            return None
+
     # xblock runtime navigation tab video image
     def get_icon_class(self):
         """
@@ -301,6 +509,61 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
             status__in=["file_complete", "file_encrypted"]
         ).order_by('-created', 'edx_video_id')
 
+    def get_stream_videos_page(self, search='', cursor=None, page_size=STREAM_VIDEOS_PAGE_SIZE):
+        """
+        Return a page of stream videos (only the columns the picker needs) along with the next page's cursor.
+
+        Pagination is keyset-based (on `created` and `edx_video_id`, the list's sort order), so
+        a page costs the same no matter how deep into the list it is.
+
+        :param search: case-insensitive substring of `client_video_id` or `edx_video_id`
+        :param cursor: opaque position returned along with the previous page
+        :raises ValueError: if the cursor is malformed
+        """
+        queryset = self.get_list_stream_videos()
+        if search:
+            queryset = queryset.filter(Q(client_video_id__icontains=search) | Q(edx_video_id__icontains=search))
+        if cursor:
+            created, edx_video_id = decode_cursor(cursor)
+            created = parse_datetime(created)
+            if created is None:
+                raise ValueError('Malformed cursor')
+            queryset = queryset.filter(
+                Q(created__lt=created) | Q(created=created, edx_video_id__gt=edx_video_id)
+            )
+
+        videos = list(queryset.values(*STREAM_VIDEO_FIELDS)[:page_size + 1])
+        next_cursor = None
+        if len(videos) > page_size:
+            videos = videos[:page_size]
+            next_cursor = encode_cursor([videos[-1]['created'].isoformat(), videos[-1]['edx_video_id']])
+        return [self._serialize_stream_video(video) for video in videos], next_cursor
+
+    def get_selected_stream_video(self):
+        if not self.edx_video_id:
+            return None
+        video = self.get_list_stream_videos().filter(
+            edx_video_id=self.edx_video_id
+        ).values(*STREAM_VIDEO_FIELDS).first()
+        return self._serialize_stream_video(video) if video else None
+
+    @staticmethod
+    def _serialize_stream_video(video):
+        return {'edx_video_id': video['edx_video_id'], 'client_video_id': video['client_video_id']}
+
+    def get_transcript_url(self, lang):
+        """
+        Return URL of the caption with `lang` source language (if any).
+        """
+        for caption in self.captions:
+            if caption.get('srclang') == lang:
+                return caption.get('src')
+        return None
+
+    @property
+    def metrics_tags(self):
+        return {'org': self.location.org}
+
     def drop_http_or_https(self, url):
         """
         In order to avoid mixing HTTP/HTTPS which can cause some warnings to appear in some browsers.
@@ -309,36 +572,88 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
 
     # Xblock handlers:
     @XBlock.json_handler
+    @measured('handler')
+    def list_stream_videos(self, data, _suffix=''):
+        """
+        Xblock handler to list the course's stream videos page by page.
+
+        :param data: optional `search` string, `cursor` (`next_cursor` of the previous page) and `page_size`
+        :param _suffix: not using
+        :return: videos (`edx_video_id`, `client_video_id`) and `next_cursor` (null on the last page);
+                 the first page also has currently `selected` video (if any), whether it matches the search or not
+        """
+        search = data.get('search') or ''
+        cursor = data.get('cursor')
+        max_page_size = getattr(settings, 'AMS_STREAM_VIDEOS_MAX_PAGE_SIZE', STREAM_VIDEOS_MAX_PAGE_SIZE)
+        try:
+            page_size = int(data.get('page_size') or getattr(
+                settings, 'AMS_STREAM_VIDEOS_PAGE_SIZE', STREAM_VIDEOS_PAGE_SIZE
+            ))
+        except (TypeError, ValueError):
+            return {'result': 'error', 'message': _('`page_size` must be an integer')}
+        page_size = min(max(page_size, 1), max_page_size)
+
+        try:
+            videos, next_cursor = self.get_stream_videos_page(search, cursor, page_size)
+        except (TypeError, ValueError):
+            return {'result': 'error', 'message': _('Malformed `cursor`')}
+
+        response = {'result': 'success', 'videos': videos, 'next_cursor': next_cursor}
+        if not cursor:
+            response['selected'] = self.get_selected_stream_video()
+        return response
+
+    @XBlock.json_handler
+    @measured('handler')
     def get_captions_and_video_info(self, data, suffix=''):
         edx_video_id = data.get('edx_video_id')
+        return get_video_info_cache().get_or_resolve(
+            self.location.org, edx_video_id, lambda: self.resolve_captions_and_video_info(edx_video_id)
+        )
 
+    def resolve_captions_and_video_info(self, edx_video_id, lookup_pool=None):
+        """
+        Look up captions and video info on Azure Media Services.
+
+        Asset lookups run on `lookup_pool` if given (see `lookup_asset`).
+
+        :return: tuple of the result and locators it's built from (to respect their expiration when caching),
+                 locators are None if some of the lookups have failed (the result shouldn't be cached).
+        """
         try:
             video = Video.objects.get(edx_video_id=edx_video_id)
         except Video.DoesNotExist:
             asset = None
         else:
-            media_service = get_media_service_client(self.location.org)
-            asset = media_service.get_input_asset_by_video_id(edx_video_id, 'ENCODED')
+            # Clients (and their access tokens) are reused across requests:
+            media_service = get_media_service_clients().get(
+                self.location.org, get_media_service_client, get_azure_config
+            )
+            asset = timed(
+                'upstream.get_input_asset_by_video_id', media_service.get_input_asset_by_video_id, self.metrics_tags
+            )(edx_video_id, 'ENCODED')
 
         error_message = _("Target Video is no longer available on Azure or is corrupted in some way.")
         captions = []
         video_info = {}
-        asset_files = None
+        locators = []
 
         if asset:
-            locator_on_demand = media_service.get_asset_locators(asset['Id'], LocatorTypes.OnDemandOrigin)
-            locator_sas = media_service.get_asset_locators(asset['Id'], LocatorTypes.SAS)
+            locator_on_demand, locator_sas, asset_files, errors = self.lookup_asset(
+                media_service, asset['Id'], lookup_pool
+            )
 
             if locator_on_demand:
                 error_message = ''
+                locators.append(locator_on_demand)
                 path_locator_on_demand = self.drop_http_or_https(locator_on_demand.get('Path'))
                 path_locator_sas = None
 
                 if locator_sas:
+                    locators.append(locator_sas)
                     path_locator_sas = self.drop_http_or_https(locator_sas.get('Path'))
                     captions = get_captions_info(video, path_locator_sas)
-                    asset_files = media_service.get_asset_files(asset['Id'])
-                else:
+                elif not errors:
                     error_message = _("To be able to use captions/transcripts auto-fetching, "
                                       "AMS Asset should be published properly "
                                       "(in addition to 'streaming' locator a 'progressive' "
@@ -346,24 +661,223 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
 
                 video_info = get_video_info(video, path_locator_on_demand, path_locator_sas, asset_files)
 
-        return {'error_message': error_message,
-                'video_info': video_info,
-                'captions': captions}
+            if any(isinstance(error, TimeoutError) for error in errors):
+                error_message = _("Azure Media Services didn't respond in time, some of the video info "
+                                  "may be missing. Please try again later.")
+            elif errors:
+                error_message = _("Azure Media Services lookups have failed, some of the video info "
+                                  "may be missing. Please check the asset and the Azure configuration.")
+            if errors:
+                locators = None
+
+        result = {'error_message': error_message,
+                  'video_info': video_info,
+                  'captions': captions}
+        return result, locators
+
+    def lookup_asset(self, media_service, asset_id, pool=None):
+        """
+        Look up asset's streaming and progressive locators and files concurrently.
+
+        Each lookup is limited by `AMS_LOOKUP_TIMEOUT`, a failed one doesn't affect the others;
+        files are only needed along with the progressive locator. Lookups run on the process-wide pool
+        unless a `pool` is given (e.g. by a management command running many of them at once). The process-wide
+        pool runs `AMS_LOOKUP_CONCURRENCY` asset lookups at once; timed out calls aren't cancelled, they hold
+        their threads until the upstream responds (or the client gives up).
+
+        :return: tuple of streaming locator, progressive locator, asset files and errors of the failed lookups
+                 (`multiprocessing.TimeoutError` for the timed out ones).
+        """
+        if pool is None:
+            pool = get_thread_pool(
+                'ams-lookups', getattr(settings, 'AMS_LOOKUP_CONCURRENCY', AMS_LOOKUP_CONCURRENCY) * LOOKUPS_PER_ASSET
+            )
+        lookups = ('locator_on_demand', 'locator_sas', 'asset_files')
+        get_asset_locators = timed('upstream.get_asset_locators', media_service.get_asset_locators, self.metrics_tags)
+        get_asset_files = timed('upstream.get_asset_files', media_service.get_asset_files, self.metrics_tags)
+        outcomes = run_concurrently(pool, [
+            (get_asset_locators, (asset_id, LocatorTypes.OnDemandOrigin)),
+            (get_asset_locators, (asset_id, LocatorTypes.SAS)),
+            (get_asset_files, (asset_id,)),
+        ], timeout=getattr(settings, 'AMS_LOOKUP_TIMEOUT', AMS_LOOKUP_TIMEOUT))
+
+        for lookup, outcome in zip(lookups, outcomes):
+            if not outcome.ok:
+                log.error("Azure Media Services lookup failure: asset [%s], %s: %r", asset_id, lookup, outcome.error)
+        log.info(
+            "Azure Media Services lookups: asset [%s], took %.3fs (%.3fs if run serially): %s",
+            asset_id,
+            max(outcome.duration for outcome in outcomes),
+            sum(outcome.duration for outcome in outcomes),
+            ', '.join('{} {:.3f}s'.format(lookup, outcome.duration) for lookup, outcome in zip(lookups, outcomes))
+        )
+
+        locator_on_demand, locator_sas, asset_files = [outcome.value for outcome in outcomes]
+        errors = [outcome.error for outcome in outcomes if not outcome.ok]
+        return locator_on_demand, locator_sas, asset_files if locator_sas else None, errors
+
+    @XBlock.handler
+    @measured('handler')
+    def playback_token(self, request, suffix=''):  # pylint: disable=unused-argument
+        """
+        Xblock handler to issue a fresh playback token (GET, never cached).
+
+        The token rendered into the page expires in a few minutes; the player gets a new one from here
+        when it's set up (or still idle) after that.
+
+        :param request: webob request
+        :param suffix: not using
+        :return: JSON with the `token` and the number of seconds it `expires_in`
+        """
+        if request.method != 'GET':
+            return Response(status=405, headerlist=[('Allow', 'GET')])
+        if not self.protection_type:
+            return Response(status=404)
+
+        token, expires_at = self.get_playback_token_and_expiry()
+        if not token:
+            return Response(status=503)
+        response = Response(json_body={'token': token, 'expires_in': max(int(expires_at - time.time()), 0)})
+        response.headers['Cache-Control'] = 'no-store'
+        return response
 
     @XBlock.json_handler
+    @measured('handler')
     def publish_event(self, data, suffix=''):
         try:
             event_type = data.pop('event_type')
         except KeyError:
             return {'result': 'error', 'message': _('Missing event_type in JSON data')}
 
+        self._publish_event(event_type, data)
+        return {'result': 'success'}
+
+    @XBlock.json_handler
+    @measured('handler')
+    def publish_events(self, data, suffix=''):
+        """
+        Xblock handler to publish a batch of player events at once.
+
+        :param data: ordered `events` list, each of them has `event_type`, `data` and client `timestamp`
+        :param suffix: not using
+        :return: number of published events and per-event errors
+        """
+        events = data.get('events')
+        if not isinstance(events, list):
+            return {'result': 'error', 'message': _('Missing events list in JSON data')}
+
+        max_batch_size = getattr(settings, 'AMS_EVENTS_BATCH_MAX_SIZE', EVENTS_BATCH_MAX_SIZE)
+        if len(events) > max_batch_size:
+            return {'result': 'error', 'message': _('Too many events in the batch, max: {}').format(max_batch_size)}
+
+        published = 0
+        errors = []
+        for position, event in enumerate(events):
+            event_type = event.get('event_type') if isinstance(event, dict) else None
+            event_data = event.get('data', {}) if isinstance(event, dict) else None
+            if not event_type or not isinstance(event_data, dict):
+                errors.append({'index': position, 'message': _('Missing event_type in JSON data')})
+                continue
+            if event.get('timestamp'):
+                # Preserve the moment the event has actually happened on the client:
+                event_data['client_timestamp'] = event['timestamp']
+            self._publish_event(event_type, event_data)
+            published += 1
+
+        return {'result': 'success', 'published': published, 'errors': errors}
+
+    def _publish_event(self, event_type, data):
+        """
+        Publish the event inline or queue it for the background worker (`AMS_EVENTS_PUBLISH_MODE = 'async'`).
+        """
         data['video_url'] = self.video_url
         data['user_id'] = self.scope_ids.user_id
 
-        self.runtime.publish(self, event_type, data)
-        return {'result': 'success'}
+        if is_async_publishing(event_type):
+            # Runtime and block are request bound, the queue holds what `runtime.publish` would log:
+            get_event_publisher().put(event_type, data, {
+                'user_id': self.scope_ids.user_id,
+                'course_id': unicode(self.location.course_key),
+                'org_id': self.location.org,
+                'asides': {},
+            })
+        else:
+            self.runtime.publish(self, event_type, data)
 
     @XBlock.json_handler
+    @measured('handler')
+    def watch_progress(self, data, _suffix=''):
+        """
+        Xblock handler to merge the intervals the learner has watched since the previous heartbeat.
+
+        :param data: `intervals` list of `[start, end]` (seconds) and video `duration` (seconds, if known)
+        :param _suffix: not using
+        :return: `percent` of the video watched (null while the duration is unknown) and whether it's `completed`
+        """
+        max_heartbeat_intervals = getattr(
+            settings, 'AMS_WATCH_HEARTBEAT_MAX_INTERVALS', WATCH_HEARTBEAT_MAX_INTERVALS
+        )
+        try:
+            duration = self.get_watch_duration(parse_duration(data.get('duration')))
+            intervals = clean_intervals(data.get('intervals'), duration, max_heartbeat_intervals)
+        except (TypeError, ValueError):
+            return {'result': 'error', 'message': _('Malformed watch progress data: `intervals` and `duration`')}
+
+        now = time.time()
+        allowance = get_heartbeat_allowance(
+            now - self.watch_heartbeat_at if self.watch_heartbeat_at else None,
+            getattr(settings, 'AMS_WATCH_HEARTBEAT_INTERVAL', WATCH_HEARTBEAT_INTERVAL),
+            getattr(settings, 'AMS_WATCH_MAX_PLAYBACK_RATE', WATCH_MAX_PLAYBACK_RATE),
+            getattr(settings, 'AMS_WATCH_HEARTBEAT_SLACK', WATCH_HEARTBEAT_SLACK),
+        )
+        self.watch_heartbeat_at = now
+        self.watched_duration = duration or 0.0
+        intervals = limit_intervals(intervals, allowance)
+        if intervals:
+            self.watched_intervals = merge_intervals(
+                self.watched_intervals, intervals, getattr(settings, 'AMS_WATCH_MAX_INTERVALS', WATCH_MAX_INTERVALS)
+            )
+
+        fraction = get_watched_fraction(self.watched_intervals, self.watched_duration)
+        threshold = getattr(settings, 'AMS_WATCH_COMPLETION_THRESHOLD', WATCH_COMPLETION_THRESHOLD)
+        if not self.watch_completed and fraction is not None and fraction >= threshold:
+            self.watch_completed = True
+            self.runtime.publish(self, 'completion', {'completion': 1.0})
+        return dict(self.get_watch_progress(), result='success')
+
+    def get_watch_duration(self, reported):
+        """
+        Return video duration watch progress is measured against (None while it's unknown).
+
+        The one known to edxval is used if there's any, otherwise the first duration reported by the player is kept:
+        later reports can only extend it, so the share watched can't be inflated by a shorter duration.
+        """
+        if self.edx_video_id:
+            duration = get_video_duration(self.edx_video_id)
+            if duration:
+                return duration
+        return max(self.watched_duration, reported or 0) or None
+
+    def complete_on_view(self):
+        """
+        Publish completion of the learner's first view: nothing else would complete the block without watch tracking.
+        """
+        if self.runtime.user_id and not self.watch_completed:
+            self.watch_completed = True
+            self.runtime.publish(self, 'completion', {'completion': 1.0})
+
+    def get_watch_progress(self):
+        """
+        Return `percent` of the video the learner has watched (None while its duration is unknown) and `completed`.
+        """
+        fraction = get_watched_fraction(self.watched_intervals, self.watched_duration)
+        return {
+            'percent': round(fraction * 100, 1) if fraction is not None else None,
+            'completed': self.watch_completed,
+        }
+
+    @XBlock.json_handler
+    @measured('handler')
     def fetch_transcript(self, data, _suffix=''):
         """
         Xblock handler to perform actual transcript content fetching.
@@ -380,12 +894,19 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
         except KeyError:
             return handler_response
 
+        return self._fetch_transcript_content(transcript_url, transcript_lang)
+
+    def _fetch_transcript_content(self, transcript_url, transcript_lang):
+        """
+        Fetch transcript's content and wrap it into handler response.
+        """
+        handler_response = {'result': 'error'}
         failure_message = "Transcript fetching failure: language [{}]".format(transcript_lang)
         try:
-            response = requests.get(transcript_url)
+            content = get_transcript_cache().get_content(transcript_url, transcript_lang, self.metrics_tags)
             return {
                 'result': 'success',
-                'content': response.content
+                'content': content
             }
         except IOError:
             log.exception(failure_message)
@@ -396,22 +917,287 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
             handler_response['message'] = _(failure_message)
             return handler_response
 
+    @XBlock.handler
+    @measured('handler')
+    def transcript(self, request, suffix=''):
+        """
+        Xblock handler to serve transcript's content with GET request.
+
+        Unlike `fetch_transcript` the response is cacheable by browsers and CDNs: it carries
+        `Cache-Control` and `ETag` headers and honours `If-None-Match`.
+
+        :param request: webob request
+        :param suffix: transcript language code
+        :return: transcript's content streamed (gzipped if accepted) chunk by chunk
+        """
+        if request.method not in ('GET', 'HEAD'):
+            return Response(status=405, headerlist=[('Allow', 'GET, HEAD')])
+
+        transcript_url = self.get_transcript_url(suffix)
+        if not transcript_url:
+            return Response(status=404)
+
+        failure_message = "Transcript fetching failure: language [{}]".format(suffix)
+        try:
+            stream = get_transcript_cache().open(transcript_url, suffix, self.metrics_tags)
+        except TranscriptTooLarge:
+            log.warning("Transcript is too large to be served: language [%s]", suffix)
+            return Response(status=502)
+        except IOError:
+            log.exception(failure_message)
+            return Response(status=502)
+
+        return self._make_transcript_response(request, stream)
+
+    @XBlock.handler
+    @measured('handler')
+    def transcript_cues(self, request, suffix=''):
+        """
+        Xblock handler to serve transcript parsed into compact cue index (GET, cacheable).
+
+        :param request: webob request
+        :param suffix: transcript language code
+        :return: JSON with parallel `start`, `end` (seconds, sorted by start) and `text` arrays
+        """
+        if request.method not in ('GET', 'HEAD'):
+            return Response(status=405, headerlist=[('Allow', 'GET, HEAD')])
+
+        transcript_url = self.get_transcript_url(suffix)
+        if not transcript_url:
+            return Response(status=404)
+
+        try:
+            content = get_transcript_cache().get_content(transcript_url, suffix, self.metrics_tags)
+        except IOError:
+            log.exception("Transcript fetching failure: language [{}]".format(suffix))
+            return Response(status=502)
+
+        digest, index_json = get_cue_index_json(content)
+        stream = TranscriptStream([index_json], etag='"{}"'.format(digest))
+        return self._make_transcript_response(request, stream, content_type='application/json')
+
+    @XBlock.handler
+    @measured('handler')
+    def transcript_cues_batch(self, request, suffix=''):  # pylint: disable=unused-argument
+        """
+        Xblock handler to serve cue indexes of several transcripts at once (GET, cacheable).
+
+        Transcripts are fetched concurrently (on a bounded thread pool), so the whole batch takes about
+        as long as the slowest transcript. A response with failed languages isn't cached.
+
+        :param request: webob request, `lang` query parameters (all the block's captions if there are none)
+        :param suffix: not using
+        :return: JSON with `transcripts` - cue indexes (as `transcript_cues` serves them) by language -
+                 and `errors` - messages by language
+        """
+        if request.method not in ('GET', 'HEAD'):
+            return Response(status=405, headerlist=[('Allow', 'GET, HEAD')])
+
+        langs = []
+        for lang in request.GET.getall('lang') or [caption.get('srclang') for caption in self.captions]:
+            if lang and lang not in langs:
+                langs.append(lang)
+        if len(langs) > getattr(settings, 'AMS_TRANSCRIPT_BATCH_MAX_SIZE', TRANSCRIPT_BATCH_MAX_SIZE):
+            return Response(status=400)
+
+        indexes, errors = self._get_cue_indexes_json(langs)
+        # Cue indexes are JSON already, they're put into the response as is rather than parsed and dumped again:
+        body = '{{"transcripts":{{{}}},"errors":{}}}'.format(
+            ','.join('{}:{}'.format(json.dumps(lang), index_json) for lang, (_digest, index_json) in indexes),
+            json.dumps(errors, sort_keys=True, separators=(',', ':'))
+        )
+        etag = None
+        if not errors:
+            etag = '"{}"'.format(hashlib.md5(
+                json.dumps([[lang, digest] for lang, (digest, _index_json) in indexes])
+            ).hexdigest())
+        response = self._make_transcript_response(
+            request, TranscriptStream([body], etag=etag), content_type='application/json'
+        )
+        if errors:
+            response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    def _get_cue_indexes_json(self, langs):
+        """
+        Fetch the transcripts and return their `[(lang, (digest, cue index JSON))]` along with `{lang: error}`.
+        """
+        errors = {}
+        calls = []
+        fetched_langs = []
+        for lang in langs:
+            transcript_url = self.get_transcript_url(lang)
+            if transcript_url:
+                calls.append((self._get_cue_index_json, (transcript_url, lang)))
+                fetched_langs.append(lang)
+            else:
+                errors[lang] = _('Transcript not found: language [{}]').format(lang)
+
+        pool = get_thread_pool(
+            'transcripts', getattr(settings, 'AMS_TRANSCRIPT_FETCH_WORKERS', TRANSCRIPT_FETCH_WORKERS)
+        )
+        indexes = []
+        for lang, outcome in zip(fetched_langs, run_concurrently(pool, calls)):
+            if outcome.ok:
+                indexes.append((lang, outcome.value))
+            else:
+                log.error("Transcript fetching failure: language [%s]: %r", lang, outcome.error)
+                errors[lang] = _('Transcript fetching failure: language [{}]').format(lang)
+        return indexes, errors
+
+    def _get_cue_index_json(self, transcript_url, lang):
+        return get_cue_index_json(get_transcript_cache().get_content(transcript_url, lang, self.metrics_tags))
+
+    @XBlock.json_handler
+    @measured('handler')
+    def search_transcripts(self, data, _suffix=''):
+        """
+        Xblock handler to search transcripts of all the course's videos.
+
+        :param data: `query` string, optional `lang` (caption language code) and `limit` (max number of blocks)
+        :param _suffix: not using
+        :return: matching blocks the user can access (`usage_id`, `display_name`, `lang`, `total`) with `matches`
+                 - cue `start` (seconds) and `text` - to seek the player to; `indexed` is false while the course
+                 is being indexed
+        """
+        if not is_search_enabled():
+            return {'result': 'error', 'message': _('Transcript search is disabled')}
+
+        query = data.get('query')
+        if not isinstance(query, basestring) or not query.strip():
+            return {'result': 'error', 'message': _('Missing required search data: `query`')}
+        try:
+            limit = int(data['limit']) if data.get('limit') else None
+        except (TypeError, ValueError):
+            return {'result': 'error', 'message': _('`limit` must be an integer')}
+
+        user = self.runtime.get_real_user(self.runtime.anonymous_student_id)
+        if user is None:
+            return {'result': 'error', 'message': _('Transcript search is available to signed in users only')}
+
+        results = search_course(self.location.course_key, query, user, lang=data.get('lang'), max_results=limit)
+        if results is None:
+            return {'result': 'success', 'results': [], 'indexed': False}
+        return {'result': 'success', 'results': results, 'indexed': True}
+
+    @staticmethod
+    def _make_transcript_response(request, stream, content_type='text/vtt'):
+        """
+        Build cacheable response for the transcript stream, answering 304 on revalidation.
+        """
+        gzipped = 'gzip' in request.accept_encoding
+        etag = stream.etag
+        if etag and gzipped and not etag.startswith('W/'):
+            # Compressed representation isn't byte-for-byte equal to the upstream one:
+            etag = 'W/' + etag
+
+        response = Response(content_type=content_type, charset='utf-8')
+        response.headers['Cache-Control'] = 'public, max-age={}'.format(
+            getattr(settings, 'AMS_TRANSCRIPT_HTTP_MAX_AGE', TRANSCRIPT_HTTP_MAX_AGE)
+        )
+        response.headers['Vary'] = 'Accept-Encoding'
+        if etag:
+            response.headers['ETag'] = etag
+
+        if etag and etag_matches(etag, request.headers.get('If-None-Match')):
+            stream.close()
+            response.status = 304
+            return response
+
+        if request.method == 'HEAD':
+            stream.close()
+            return response
+
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+            stream = TranscriptStream(gzip_chunks(stream), etag=etag, response=stream)
+        response.app_iter = stream
+        return response
+
 
 @ensure_valid_usage_key
 def embed_player(request, usage_key_string):
-    from lms.djangoapps.courseware.module_render import get_module_by_usage_id
-    from lms.djangoapps.courseware.views.views import render_xblock
+    return get_embed_player_response(request, usage_key_string)
+
 
+def get_embed_player_response(request, usage_key_string):
+    """
+    Render the block for embedding (if sharing is on).
+
+    Share decisions are cached per usage key, pages rendered for anonymous users are cached as well
+    (per host and language) and served with `ETag`/`Cache-Control`, so CDNs and browsers can cache and revalidate them.
+    Cached pages hold no per-visitor tokens: playback tokens aren't rendered for anonymous users,
+    CSRF tokens are replaced with the current visitor's ones (such pages are cached privately only).
+    """
     usage_key = UsageKey.from_string(usage_key_string)
-    usage_key = usage_key.replace(course_key=modulestore().fill_in_run(usage_key.course_key))
-    course_key = usage_key.course_key
-    with modulestore().bulk_operations(course_key):
-        block, _ = get_module_by_usage_id(
-            request, unicode(course_key), unicode(usage_key), disable_staff_debug_info=True,
+    embed_cache = get_embed_cache()
+    anonymous = not request.user.is_authenticated()
+
+    share = embed_cache.get_share(usage_key)
+    if share is False:
+        return HttpResponseBadRequest(loader.render_django_template('templates/404.html', {}))
+
+    if share and anonymous:
+        page = embed_cache.get_page(usage_key, request.get_host())
+        if page is not None:
+            return make_embed_response(request, *page)
+
+    response = render_embed_player(request, usage_key_string, usage_key, share)
+    if anonymous and response.status_code == 200 and not response.streaming:
+        content, _headers, etag = embed_cache.set_page(
+            usage_key, request.get_host(), strip_csrf_tokens(request, response.content), get_cacheable_headers(response)
         )
+        # The visitor gets the page rendered for them, along with its cookies and X-Frame-Options exemption:
+        patch_embed_response(response, etag, is_per_visitor(content))
+    return response
+
+
+def render_embed_player(request, usage_key_string, usage_key, share=None):
+    """
+    Render the block, resolving (and caching) its share decision unless `share` is already known.
+    """
+    from lms.djangoapps.courseware.module_render import get_module_by_usage_id
+    from lms.djangoapps.courseware.views.views import render_xblock
 
-    if block.share != 'off':
+    if share is None:
+        filled_usage_key = usage_key.replace(course_key=modulestore().fill_in_run(usage_key.course_key))
+        course_key = filled_usage_key.course_key
+        with modulestore().bulk_operations(course_key):
+            block, _ = get_module_by_usage_id(
+                request, unicode(course_key), unicode(filled_usage_key), disable_staff_debug_info=True,
+            )
+        share = block.share != 'off'
+        get_embed_cache().set_share(usage_key, share)
+
+    if share:
         return render_xblock(request, usage_key_string, check_if_enrolled=False)
 
     template = loader.render_django_template('templates/404.html', {})
     return HttpResponseBadRequest(template)
+
+
+def make_embed_response(request, content, headers, etag):
+    """
+    Serve cached page the way `render_xblock` would: framing allowed, CSRF token of the current visitor.
+    """
+    if etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(fill_csrf_tokens(request, content))
+        for name, value in headers:
+            response[name] = value
+    response.xframe_options_exempt = True
+    patch_embed_response(response, etag, is_per_visitor(content))
+    return response
+
+
+def patch_embed_response(response, etag, per_visitor):
+    """
+    Add caching headers, pages holding per-visitor tokens mustn't be cached by CDNs.
+    """
+    response['ETag'] = etag
+    if per_visitor:
+        patch_cache_control(response, private=True, max_age=get_embed_http_max_age())
+    else:
+        patch_cache_control(response, public=True, max_age=get_embed_http_max_age())
+    patch_vary_headers(response, ('Cookie', 'Accept-Language'))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Minified, content-hashed bundle of the player's JS/CSS served as xBlock's public resources.
+
+The bundle is built with `make bundle` (requires `rjsmin` and `rcssmin`) whenever any of the bundled
+sources changes; `student_view` falls back to inlining the sources if there's no (readable) bundle.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import pkg_resources
+
+BUNDLE_JS = (
+    'node_modules/videojs-vtt.js/lib/vttcue.js',
+    'static/js/transcript_sync.js',
+    'static/js/plugins/transcriptsAmpPlugin.js',
+    'static/js/player.js',
+)
+BUNDLE_CSS = (
+    'static/js/plugins/transcriptsAmpPlugin.css',
+    'public/css/player.css',
+)
+BUNDLE_DIR = 'public/bundle'
+MANIFEST_PATH = BUNDLE_DIR + '/manifest.json'
+
+JS_HEADER = (
+    u'/*! Azure Media Services xBlock player bundle. '
+    u'vttcue.js: Copyright 2013 vtt.js Contributors, Apache License 2.0. '
+    u'Other sources: Copyright (c) Microsoft Corporation, MIT license. */\n'
+)
+CSS_HEADER = u'/*! Azure Media Services xBlock player bundle. Copyright (c) Microsoft Corporation, MIT license. */\n'
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def read_source(resource_path):
+    return pkg_resources.resource_string(__name__, resource_path).decode('utf-8')
+
+
+def build_bundle():
+    """
+    Concatenate and minify the bundled sources.
+
+    :return: dict of `{'js': (file_name, content), 'css': (file_name, content)}`.
+    """
+    # Build time only dependencies:
+    import rcssmin
+    import rjsmin
+
+    # Each script is terminated explicitly, so concatenation doesn't change its meaning:
+    js = JS_HEADER + u'\n'.join(rjsmin.jsmin(read_source(path)) + u';' for path in BUNDLE_JS)
+    css = CSS_HEADER + u'\n'.join(rcssmin.cssmin(read_source(path)) for path in BUNDLE_CSS)
+    return {
+        'js': (hashed_name('player', 'js', js), js),
+        'css': (hashed_name('player', 'css', css), css),
+    }
+
+
+def hashed_name(name, extension, content):
+    return '{}.{}.min.{}'.format(name, hashlib.md5(content.encode('utf-8')).hexdigest()[:12], extension)
+
+
+def write_bundle(package_dir=None):
+    """
+    Build the bundle and write it along with the manifest (replacing the previous build).
+    """
+    package_dir = package_dir or os.path.dirname(os.path.abspath(__file__))
+    bundle_dir = os.path.join(package_dir, BUNDLE_DIR)
+    if not os.path.isdir(bundle_dir):
+        os.makedirs(bundle_dir)
+    for file_name in os.listdir(bundle_dir):
+        os.remove(os.path.join(bundle_dir, file_name))
+
+    manifest = {}
+    for kind, (file_name, content) in sorted(build_bundle().items()):
+        with open(os.path.join(bundle_dir, file_name), 'wb') as bundle_file:
+            bundle_file.write(content.encode('utf-8'))
+        manifest[kind] = '{}/{}'.format(BUNDLE_DIR, file_name)
+
+    with open(os.path.join(package_dir, MANIFEST_PATH), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, separators=(',', ': '), sort_keys=True)
+        manifest_file.write('\n')
+    return manifest
+
+
+def get_bundle_manifest():
+    """
+    Return `{'js': path, 'css': path}` of the built bundle (relative to the package) or None.
+    """
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                try:
+                    manifest = json.loads(read_source(MANIFEST_PATH))
+                    if not all(pkg_resources.resource_exists(__name__, manifest[kind]) for kind in ('js', 'css')):
+                        manifest = {}
+                except (IOError, OSError, ValueError, KeyError):
+                    manifest = {}
+                _manifest = manifest
+    return _manifest or None
+
+
+if __name__ == '__main__':
+    print(json.dumps(write_bundle(), indent=2, separators=(',', ': '), sort_keys=True))
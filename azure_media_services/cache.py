@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Caching primitives shared by the xBlock: a thread-safe in-process LRU and a two-tier
+cache which puts the LRU in front of a Django cache backend.
+"""
+from collections import namedtuple, OrderedDict
+import hashlib
+import threading
+import time
+import weakref
+
+from django.core.cache import caches
+
+_tiered_caches = weakref.WeakSet()
+
+
+def clear_local_caches():
+    """
+    Drop in-process tiers of all the two-tier caches (shared tiers are left intact).
+    """
+    for tiered_cache in list(_tiered_caches):
+        tiered_cache.local.clear()
+
+
+class LRUCache(object):
+    """
+    Thread-safe, size-bounded in-process cache with per-entry expiration.
+    """
+
+    def __init__(self, max_size=128, timeout=None):
+        """
+        Bound the cache with `max_size` entries living `timeout` seconds (forever if None).
+        """
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires_at = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires_at is not None and expires_at <= time.time():
+                return default
+            # Re-insert to mark the entry as the most recently used one:
+            self._data[key] = (value, expires_at)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        expires_at = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedEntry(namedtuple('SharedEntry', ['value', 'expires_at'])):
+    """
+    Value stored in the shared tier along with its expiration time (UNIX timestamp, None - never expires).
+    """
+
+
+class TieredCache(object):
+    """
+    Two-tier cache: in-process LRU in front of a (shared) Django cache backend.
+
+    Keys are hashed before hitting the Django backend, so arbitrary strings (e.g. URLs)
+    can be used as keys even with memcached. Shared entries carry their expiration time: an entry
+    copied into the local tier of another process lives there no longer than in the shared one.
+    """
+
+    def __init__(self, prefix, max_size=128, timeout=300, alias='default'):
+        """
+        Namespace keys with `prefix` and use Django cache `alias` as a shared tier.
+        """
+        self.prefix = prefix
+        self.timeout = timeout
+        self.alias = alias
+        self.local = LRUCache(max_size=max_size, timeout=timeout)
+        self._stats_lock = threading.Lock()
+        self._stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+        _tiered_caches.add(self)
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return '{}:{}'.format(self.prefix, hashlib.md5(key).hexdigest())
+
+    def get(self, key, default=None):
+        value = self.local.get(key)
+        if value is not None:
+            self._count('local_hits')
+            return value
+
+        entry = self.shared.get(self.make_key(key))
+        if isinstance(entry, SharedEntry):
+            remaining = entry.expires_at - time.time() if entry.expires_at is not None else self.local.timeout
+            if remaining is None or remaining > 0:
+                self._count('shared_hits')
+                self.local.set(key, entry.value, remaining)
+                return entry.value
+
+        self._count('misses')
+        return default
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        expires_at = time.time() + timeout if timeout is not None else None
+        self.local.set(key, value, timeout)
+        self.shared.set(self.make_key(key), SharedEntry(value, expires_at), timeout)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self.shared.delete(self.make_key(key))
+
+    def _count(self, counter, value=1):
+        with self._stats_lock:
+            self._stats[counter] = self._stats.get(counter, 0) + value
+
+    def stats(self):
+        """
+        Return a snapshot of the hit/miss counters along with the local tier size.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['local_size'] = len(self.local)
+        stats['local_max_size'] = self.local.max_size
+        return stats
+
+    def reset_stats(self):
+        with self._stats_lock:
+            for counter in self._stats:
+                self._stats[counter] = 0
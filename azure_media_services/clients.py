@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Process-wide cache of Azure Media Services clients, one per org.
+
+Building a client acquires an Azure AD access token, the largest fixed cost of a Studio lookup. Clients are
+reused until shortly before their token expires and rebuilt in the background ahead of that, so requests don't
+wait for tokens. An org's client is dropped as soon as its Azure config changes.
+"""
+from collections import namedtuple
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .executor import get_thread_pool
+
+log = logging.getLogger(__name__)
+
+# Defaults, each of them can be overridden in Django settings:
+# - how long (seconds) a client (its access token) is used for, Azure AD tokens are valid for an hour;
+MEDIA_SERVICE_CLIENT_TTL = 55 * 60
+# - how long (seconds) before expiry a client is rebuilt in the background.
+MEDIA_SERVICE_CLIENT_REFRESH_MARGIN = 10 * 60
+
+_media_service_clients = None
+_media_service_clients_lock = threading.Lock()
+
+
+class ClientEntry(namedtuple('ClientEntry', ['client', 'config_digest', 'created_at'])):
+    """
+    Cached client along with the digest of the Azure config it's been built with.
+    """
+
+
+def get_config_digest(config):
+    """
+    Digest of org's Azure config: it changes whenever any of the settings (credentials, endpoints) does.
+    """
+    data = json.dumps(config, sort_keys=True, default=repr)
+    return hashlib.md5(data.encode('utf-8')).hexdigest()
+
+
+class MediaServiceClients(object):
+    """
+    Media service clients keyed by org.
+
+    - concurrent requests of an org without a usable client wait for a single build;
+    - once a client is `ttl - refresh_margin` old, requests keep getting it while a new one is built
+      in the background; a client older than `ttl` is never returned;
+    - a client built with a different Azure config than the current one is dropped.
+    """
+
+    def __init__(self, ttl=MEDIA_SERVICE_CLIENT_TTL, refresh_margin=MEDIA_SERVICE_CLIENT_REFRESH_MARGIN):
+        """
+        Configure clients' lifetime and how long before its end they are refreshed.
+        """
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._org_locks = {}
+        self._refreshing = set()
+
+    def get(self, org, build, get_config):
+        """
+        Return org's client, building it with `build(org)` if there's no usable one.
+
+        :param get_config: function returning org's Azure config, to tell whether the cached client is outdated.
+        """
+        digest = get_config_digest(get_config(org))
+        entry = self._entries.get(org)
+        if entry is not None:
+            age = time.time() - entry.created_at
+            if entry.config_digest != digest:
+                log.info("Azure config of [%s] has changed, its media service client is dropped", org)
+            elif age < self.ttl:
+                if age >= self.ttl - self.refresh_margin:
+                    self._schedule_refresh(org, build, digest)
+                return entry.client
+        return self._build(org, build, digest)
+
+    def _get_org_lock(self, org):
+        with self._lock:
+            return self._org_locks.setdefault(org, threading.Lock())
+
+    def _build(self, org, build, digest):
+        with self._get_org_lock(org):
+            # Another request may have built it while this one was waiting:
+            entry = self._entries.get(org)
+            if entry is not None and entry.config_digest == digest and time.time() - entry.created_at < self.ttl:
+                return entry.client
+            client = build(org)
+            self._entries[org] = ClientEntry(client, digest, time.time())
+            return client
+
+    def _schedule_refresh(self, org, build, digest):
+        with self._lock:
+            if org in self._refreshing:
+                return
+            self._refreshing.add(org)
+        get_thread_pool('ams-clients', 1).apply_async(self._refresh, (org, build, digest))
+
+    def _refresh(self, org, build, digest):
+        """
+        Replace org's client with a new one (in a worker thread, which gets its own DB connection, closed afterwards).
+        """
+        try:
+            with self._get_org_lock(org):
+                client = build(org)
+                entry = self._entries.get(org)
+                # Don't overwrite a client built for a newer config meanwhile:
+                if entry is None or entry.config_digest == digest:
+                    self._entries[org] = ClientEntry(client, digest, time.time())
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Media service client of [%s] can't be refreshed, the current one is used till expiry", org)
+        finally:
+            with self._lock:
+                self._refreshing.discard(org)
+            connection.close()
+
+    def invalidate(self, org):
+        self._entries.pop(org, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def get_media_service_clients():
+    """
+    Return process-wide media service clients cache (created on first use).
+    """
+    global _media_service_clients
+    if _media_service_clients is None:
+        with _media_service_clients_lock:
+            if _media_service_clients is None:
+                _media_service_clients = MediaServiceClients(
+                    ttl=getattr(settings, 'AMS_MEDIA_SERVICE_CLIENT_TTL', MEDIA_SERVICE_CLIENT_TTL),
+                    refresh_margin=getattr(
+                        settings, 'AMS_MEDIA_SERVICE_CLIENT_REFRESH_MARGIN', MEDIA_SERVICE_CLIENT_REFRESH_MARGIN
+                    ),
+                )
+    return _media_service_clients
+
+
+def reset_media_service_clients():
+    """
+    Drop all the clients along with the cache itself, so the next lookup recreates it according to the settings.
+    """
+    global _media_service_clients
+    with _media_service_clients_lock:
+        _media_service_clients = None
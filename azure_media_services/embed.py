@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Cache of the embed player's share decisions and rendered (anonymous) pages.
+"""
+import hashlib
+import logging
+import re
+import threading
+
+from django.conf import settings
+from django.middleware import csrf
+from django.utils.translation import get_language
+from xmodule.modulestore.django import SignalHandler
+
+from .cache import TieredCache
+
+log = logging.getLogger(__name__)
+
+# Defaults, each of them can be overridden in Django settings:
+# - how long (seconds) per-block share decisions are cached;
+EMBED_SHARE_CACHE_TTL = 5 * 60
+# - how long (seconds) rendered embed pages are cached;
+EMBED_PAGE_CACHE_TTL = 5 * 60
+# - `max-age` (seconds) of the embed pages served to anonymous users.
+EMBED_HTTP_MAX_AGE = 5 * 60
+
+# CSRF tokens of the visitor a page has been rendered for are replaced with this one in the cached page:
+CSRF_TOKEN_PLACEHOLDER = b'__AMS_CSRF_TOKEN__'
+# Django>=1.10 masks each CSRF token it hands out with a random salt:
+MASKED_CSRF_TOKEN_RE = re.compile(br'\b[a-zA-Z0-9]{64}\b')
+# Headers a cached page isn't served with (they're set per response):
+UNCACHED_HEADERS = frozenset(
+    ['cache-control', 'content-length', 'date', 'etag', 'expires', 'last-modified', 'vary', 'x-frame-options']
+)
+
+_embed_cache = None
+_embed_cache_lock = threading.Lock()
+
+
+def get_course_family(course_key):
+    """
+    Course's org and number: they're the same for old-style and new-style (`course-v1`) keys.
+    """
+    return u'{}+{}'.format(course_key.org, course_key.course)
+
+
+class EmbedCache(object):
+    """
+    Share decisions and rendered pages of the embedded blocks keyed by usage key.
+
+    Entries of a course are dropped at once (a per-course generation is bumped) when the course is published.
+    """
+
+    def __init__(self, share_timeout=EMBED_SHARE_CACHE_TTL, page_timeout=EMBED_PAGE_CACHE_TTL):
+        """
+        Configure TTLs of share decisions and pages.
+        """
+        self.shares = TieredCache('ams-embed-share', timeout=share_timeout)
+        self.pages = TieredCache('ams-embed-page', max_size=64, timeout=page_timeout)
+
+    def generation_key(self, course_key):
+        return self.shares.make_key(u'generation:{}'.format(get_course_family(course_key)))
+
+    def make_key(self, usage_key):
+        generation = self.shares.shared.get(self.generation_key(usage_key.course_key), 0)
+        return u'{}:{}'.format(usage_key, generation)
+
+    def get_share(self, usage_key):
+        """
+        Return cached share decision: True, False or None if unknown.
+        """
+        return self.shares.get(self.make_key(usage_key))
+
+    def set_share(self, usage_key, share):
+        self.shares.set(self.make_key(usage_key), share)
+
+    def make_page_key(self, usage_key, host):
+        """
+        Pages are rendered per site (host) as well: themes, site configuration and absolute URLs differ.
+        """
+        return u'{}:{}:{}'.format(self.make_key(usage_key), host, get_language())
+
+    def get_page(self, usage_key, host):
+        """
+        Return cached `(content, headers, etag)` of the page rendered for anonymous users of the host or None.
+        """
+        return self.pages.get(self.make_page_key(usage_key, host))
+
+    def set_page(self, usage_key, host, content, headers):
+        """
+        Cache the page (its per-visitor CSRF tokens are to be replaced with placeholders already).
+
+        The ETag of a page holding CSRF tokens is weak: each visitor gets their own tokens in it.
+        """
+        etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        if is_per_visitor(content):
+            etag = 'W/' + etag
+        page = (content, headers, etag)
+        self.pages.set(self.make_page_key(usage_key, host), page)
+        return page
+
+    def invalidate_course(self, course_key):
+        generation_key = self.generation_key(course_key)
+        try:
+            self.shares.shared.incr(generation_key)
+        except ValueError:
+            self.shares.shared.set(generation_key, 1, None)
+
+
+def get_embed_cache():
+    """
+    Return process-wide embed cache (created on first use).
+    """
+    global _embed_cache
+    if _embed_cache is None:
+        with _embed_cache_lock:
+            if _embed_cache is None:
+                _embed_cache = EmbedCache(
+                    share_timeout=getattr(settings, 'AMS_EMBED_SHARE_CACHE_TTL', EMBED_SHARE_CACHE_TTL),
+                    page_timeout=getattr(settings, 'AMS_EMBED_PAGE_CACHE_TTL', EMBED_PAGE_CACHE_TTL),
+                )
+    return _embed_cache
+
+
+def strip_csrf_tokens(request, content):
+    """
+    Replace CSRF tokens issued to the request in the rendered page with `CSRF_TOKEN_PLACEHOLDER`.
+    """
+    cookie = request.META.get('CSRF_COOKIE')
+    if not cookie or not request.META.get('CSRF_COOKIE_USED'):
+        return content
+    # Django<1.10 hands the cookie value out as is:
+    content = content.replace(cookie.encode('ascii'), CSRF_TOKEN_PLACEHOLDER)
+    unsalt = getattr(csrf, '_unsalt_cipher_token', None)
+    if unsalt is None:
+        return content
+    # Django>=1.10 hands out the cookie's secret masked with a new salt each time:
+    secret = unsalt(cookie)
+
+    def replace(match):
+        return CSRF_TOKEN_PLACEHOLDER if unsalt(match.group(0).decode('ascii')) == secret else match.group(0)
+    return MASKED_CSRF_TOKEN_RE.sub(replace, content)
+
+
+def fill_csrf_tokens(request, content):
+    """
+    Put CSRF token of the request into the cached page (the middleware sets the cookie then).
+    """
+    if not is_per_visitor(content):
+        return content
+    return content.replace(CSRF_TOKEN_PLACEHOLDER, csrf.get_token(request).encode('ascii'))
+
+
+def is_per_visitor(content):
+    return CSRF_TOKEN_PLACEHOLDER in content
+
+
+def get_cacheable_headers(response):
+    """
+    Return `(name, value)` headers of the rendered page a cached copy is to be served with.
+    """
+    return [(name, value) for name, value in response.items() if name.lower() not in UNCACHED_HEADERS]
+
+
+def get_embed_http_max_age():
+    return getattr(settings, 'AMS_EMBED_HTTP_MAX_AGE', EMBED_HTTP_MAX_AGE)
+
+
+def invalidate_embed_cache_on_publish(sender, course_key, **kwargs):  # pylint: disable=unused-argument
+    """
+    Share setting (and the block itself) may change with each publish.
+    """
+    log.debug("Invalidating cached embed pages: course [%s]", course_key)
+    get_embed_cache().invalidate_course(course_key)
+
+
+SignalHandler.course_published.connect(invalidate_embed_cache_on_publish, dispatch_uid='ams_invalidate_embed_cache')
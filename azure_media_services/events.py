@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Asynchronous (queue-backed) publishing of player events.
+"""
+import atexit
+from datetime import datetime
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.utils.timezone import utc
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from .metrics import gauge, get_metrics_sink
+
+try:
+    from eventtracking import tracker
+except ImportError:
+    tracker = None
+
+try:
+    from crum import get_current_request
+    from track import shim as track_shim, views as track_views
+except ImportError:
+    get_current_request = track_shim = track_views = None
+
+log = logging.getLogger(__name__)
+
+SYNC = 'sync'
+ASYNC = 'async'
+
+DROP_OLDEST = 'drop_oldest'
+BLOCK = 'block'
+
+# Defaults, each of them can be overridden in Django settings:
+# - `sync` publishes events inline, `async` puts them on the queue drained by a background worker;
+EVENTS_PUBLISH_MODE = SYNC
+# - max number of events waiting in the queue;
+EVENTS_QUEUE_SIZE = 10000
+# - what to do when the queue is full: `drop_oldest` or `block` (for at most `EVENTS_QUEUE_BLOCK_TIMEOUT`);
+EVENTS_QUEUE_OVERFLOW = DROP_OLDEST
+EVENTS_QUEUE_BLOCK_TIMEOUT = 1.0
+# - max number of events the worker publishes in one go;
+EVENTS_PUBLISH_BATCH_SIZE = 100
+# - how long (seconds) the process waits for the queue to be drained at shutdown;
+EVENTS_FLUSH_TIMEOUT = 5.0
+# - how often (seconds) the worker reports the queue depth metric.
+EVENTS_QUEUE_DEPTH_INTERVAL = 10.0
+
+# Events the runtime handles itself rather than tracks (grading, completion), they're always published inline:
+RUNTIME_HANDLED_EVENTS = frozenset(['grade', 'completion', 'progress'])
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def is_async_publishing(event_type=None):
+    """
+    Whether events (of the type) are queued.
+
+    It takes LMS's tracking (`eventtracking` and `track`), events are published inline otherwise.
+    """
+    return (
+        tracker is not None and track_views is not None and event_type not in RUNTIME_HANDLED_EVENTS and
+        getattr(settings, 'AMS_EVENTS_PUBLISH_MODE', EVENTS_PUBLISH_MODE) == ASYNC
+    )
+
+
+def build_server_event(event_type, data, context):
+    """
+    Build the tracking log entry the way LMS's `track.views.server_track` does for `runtime.publish`.
+
+    Request and tracking context are only available in the request's thread: it has to be called there.
+
+    :param context: block's tracking context (`user_id`, `course_id`...) on top of the request's one.
+    """
+    request = get_current_request()
+    try:
+        username = request.user.username
+    except AttributeError:
+        username = 'anonymous'
+    try:
+        event_context = dict(tracker.get_tracker().resolve_context())
+    except Exception:  # pylint: disable=broad-except
+        event_context = {}
+    event_context.update(context or {})
+    event = {
+        'username': username,
+        'ip': track_views._get_request_ip(request),  # pylint: disable=protected-access
+        'referer': track_views._get_request_header(request, 'HTTP_REFERER'),  # pylint: disable=protected-access
+        'accept_language': track_views._get_request_header(  # pylint: disable=protected-access
+            request, 'HTTP_ACCEPT_LANGUAGE'
+        ),
+        'event_source': 'server',
+        'event_type': event_type,
+        'event': data,
+        'agent': track_views._get_request_header(request, 'HTTP_USER_AGENT'),  # pylint: disable=protected-access
+        'page': 'x_module',
+        'time': datetime.utcnow().replace(tzinfo=utc),
+        'host': track_views._get_request_header(request, 'SERVER_NAME'),  # pylint: disable=protected-access
+        'context': event_context,
+    }
+    # The fields duplicated in the context are dropped, as `server_track` does:
+    track_shim.remove_shim_context(event)
+    return event
+
+
+class AsyncEventPublisher(object):
+    """
+    Bounded in-process queue of events drained into LMS's tracking log by a background worker.
+
+    Runtime, block and request are request bound, so events are queued as the complete tracking log
+    entries `runtime.publish` would log (see `build_server_event`): the worker only sends them to
+    the tracking backends.
+
+    Dropped and failed events are counted in `events.dropped` and `events.failed` metrics, the worker
+    reports `events.queue_depth` every `depth_interval` seconds while busy (and once the queue is empty).
+    """
+
+    def __init__(self, max_size=EVENTS_QUEUE_SIZE, overflow=DROP_OLDEST, block_timeout=EVENTS_QUEUE_BLOCK_TIMEOUT,
+                 batch_size=EVENTS_PUBLISH_BATCH_SIZE, depth_interval=EVENTS_QUEUE_DEPTH_INTERVAL):
+        """
+        Configure the queue, the worker is started on the first event.
+        """
+        self.queue = queue.Queue(maxsize=max_size)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.batch_size = batch_size
+        self.depth_interval = depth_interval
+        self.reported_depth = None
+        self.reported_at = 0
+        self.published = 0
+        self.dropped = 0
+        self.failed = 0
+        self._stats_lock = threading.Lock()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def put(self, event_type, data, context=None):
+        """
+        Queue the event, return False if it has been dropped due to the overflow.
+
+        :param context: block's tracking context (`user_id`, `course_id`...) on top of the request's one.
+        """
+        self.start()
+        item = build_server_event(event_type, data, context)
+
+        if self.overflow == BLOCK:
+            try:
+                self.queue.put(item, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                self._count('dropped')
+                return False
+
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                    self._count('dropped')
+                except queue.Empty:
+                    pass
+
+    def start(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='ams-events-publisher')
+                self._worker.daemon = True
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for event in batch:
+                self._publish(event)
+                self.queue.task_done()
+            self._report_depth()
+
+    def _publish(self, event):
+        try:
+            track_views.log_event(event)
+            self._count('published')
+        except Exception:  # pylint: disable=broad-except
+            self._count('failed')
+            log.exception("Event publishing failure: event_type [%s]", event.get('event_type'))
+
+    def _report_depth(self):
+        depth = self.queue.qsize()
+        now = time.time()
+        if now - self.reported_at >= self.depth_interval or (depth == 0 and self.reported_depth != 0):
+            self.reported_depth = depth
+            self.reported_at = now
+            gauge(get_metrics_sink(), 'events.queue_depth', depth, {})
+
+    def flush(self, timeout=EVENTS_FLUSH_TIMEOUT):
+        """
+        Wait (at most `timeout` seconds) for the queued events to be published.
+
+        :return: True if the queue has been drained.
+        """
+        if self._worker is None or not self._worker.is_alive():
+            return self.queue.unfinished_tasks == 0
+        deadline = time.time() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.queue.all_tasks_done.wait(remaining)
+            return self.queue.unfinished_tasks == 0
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        if counter != 'published':
+            get_metrics_sink().increment('events.{}'.format(counter), {})
+
+    def stats(self):
+        """
+        Queue depth and counters of published, dropped and failed events.
+        """
+        return {
+            'queue_depth': self.queue.qsize(),
+            'published': self.published,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+def get_event_publisher():
+    """
+    Return process-wide asynchronous event publisher (created on first use).
+    """
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = AsyncEventPublisher(
+                    max_size=getattr(settings, 'AMS_EVENTS_QUEUE_SIZE', EVENTS_QUEUE_SIZE),
+                    overflow=getattr(settings, 'AMS_EVENTS_QUEUE_OVERFLOW', EVENTS_QUEUE_OVERFLOW),
+                    block_timeout=getattr(settings, 'AMS_EVENTS_QUEUE_BLOCK_TIMEOUT', EVENTS_QUEUE_BLOCK_TIMEOUT),
+                    batch_size=getattr(settings, 'AMS_EVENTS_PUBLISH_BATCH_SIZE', EVENTS_PUBLISH_BATCH_SIZE),
+                    depth_interval=getattr(settings, 'AMS_EVENTS_QUEUE_DEPTH_INTERVAL', EVENTS_QUEUE_DEPTH_INTERVAL),
+                )
+    return _publisher
+
+
+@atexit.register
+def flush_events_at_exit():
+    """
+    Gracefully publish the queued events at shutdown.
+    """
+    if _publisher is not None:
+        drained = _publisher.flush(getattr(settings, 'AMS_EVENTS_FLUSH_TIMEOUT', EVENTS_FLUSH_TIMEOUT))
+        if not drained:
+            log.warning("Events publishing queue isn't drained at shutdown: %s", _publisher.stats())
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Bounded thread pools to run independent (I/O bound) upstream calls concurrently.
+"""
+from collections import namedtuple
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class Outcome(namedtuple('Outcome', ['value', 'error', 'duration'])):
+    """
+    Result of a single call run by `run_concurrently`: either `value` or `error` (exception) is set.
+
+    `duration` is the call's wall time in seconds (time waited for it, if timed out).
+    """
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def get_thread_pool(name, size):
+    """
+    Return named process-wide thread pool (created on first use).
+    """
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = _pools[name] = ThreadPool(processes=size)
+    return pool
+
+
+def run_concurrently(pool, calls, timeout=None):
+    """
+    Run `calls` - list of `(func, args)` - on the `pool` and wait for all of them.
+
+    Each call gets at most `timeout` seconds counted from the submission (calls run in parallel), so time spent
+    queued for a free worker counts too: pools should be sized for the number of calls submitted at once.
+    A failed or timed out call doesn't affect the others; its error is `multiprocessing.TimeoutError` if it timed out.
+    A call that is still queued past the deadline is skipped, but a running one can't be cancelled: it keeps
+    its worker until it returns (upstream calls should have timeouts of their own).
+
+    :return: list of `Outcome` in the order of `calls`.
+    """
+    start = time.time()
+    deadline = start + timeout if timeout is not None else None
+    results = [pool.apply_async(_timed_call, (func, args, deadline)) for func, args in calls]
+
+    outcomes = []
+    for result in results:
+        try:
+            if deadline is None:
+                # `get` without timeout can't be interrupted in Python 2, so use a large one:
+                outcome = result.get(365 * 24 * 60 * 60)
+            else:
+                outcome = result.get(max(deadline - time.time(), 0))
+        except TimeoutError as error:
+            outcome = Outcome(None, error, time.time() - start)
+        outcomes.append(outcome)
+    return outcomes
+
+
+def _timed_call(func, args, deadline=None):
+    start = time.time()
+    if deadline is not None and start >= deadline:
+        # Nobody waits for the result anymore:
+        return Outcome(None, TimeoutError('Skipped: queued past the deadline'), 0.0)
+    try:
+        value = func(*args)
+    except Exception as error:  # pylint: disable=broad-except
+        return Outcome(None, error, time.time() - start)
+    return Outcome(value, None, time.time() - start)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Pooled HTTP session all outbound xBlock requests go through.
+"""
+import threading
+
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+# Defaults, each of them can be overridden in Django settings:
+# - number of per-host connection pools to keep;
+HTTP_POOL_CONNECTIONS = 10
+# - max number of kept-alive connections per host;
+HTTP_POOL_MAXSIZE = 10
+# - connect/read timeouts (seconds);
+HTTP_CONNECT_TIMEOUT = 3.05
+HTTP_READ_TIMEOUT = 10
+# - retries on connection errors and 5xx responses with exponential backoff.
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.3
+HTTP_RETRY_STATUSES = (500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_http_session():
+    """
+    Create keep-alive session with bounded connection pools and retries.
+    """
+    retries = Retry(
+        total=getattr(settings, 'AMS_HTTP_MAX_RETRIES', HTTP_MAX_RETRIES),
+        backoff_factor=getattr(settings, 'AMS_HTTP_BACKOFF_FACTOR', HTTP_BACKOFF_FACTOR),
+        status_forcelist=getattr(settings, 'AMS_HTTP_RETRY_STATUSES', HTTP_RETRY_STATUSES),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=getattr(settings, 'AMS_HTTP_POOL_CONNECTIONS', HTTP_POOL_CONNECTIONS),
+        pool_maxsize=getattr(settings, 'AMS_HTTP_POOL_MAXSIZE', HTTP_POOL_MAXSIZE),
+        max_retries=retries,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_http_session():
+    """
+    Return process-wide HTTP session (created on first use).
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_http_session()
+    return _session
+
+
+def get_timeout():
+    return (
+        getattr(settings, 'AMS_HTTP_CONNECT_TIMEOUT', HTTP_CONNECT_TIMEOUT),
+        getattr(settings, 'AMS_HTTP_READ_TIMEOUT', HTTP_READ_TIMEOUT),
+    )
+
+
+def http_get(url, **kwargs):
+    """
+    Perform GET request through the pooled session, applying default timeouts.
+
+    Transcript URLs are often stored scheme-relative (`//host/path`), HTTPS is assumed for them.
+    """
+    if url.startswith('//'):
+        url = 'https:' + url
+    kwargs.setdefault('timeout', get_timeout())
+    return get_http_session().get(url, **kwargs)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Build (or bring up to date) the transcript search index of a course.
+
+Courses are indexed in the background on each publish; the command indexes one right away, e.g. after
+a course import or a cache flush:
+
+    ./manage.py cms build_ams_transcript_index course-v1:Org+Course+Run
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import CourseKey
+
+from azure_media_services.search import update_course_index
+
+
+class Command(BaseCommand):
+    """
+    Index captions of all the AMS xBlocks in a course for the transcript search.
+    """
+
+    help = "Build (incrementally) the transcript search index of all the AMS xBlocks' captions in a course."
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', help="Course key, e.g. course-v1:Org+Course+Run")
+
+    def handle(self, *args, **options):
+        try:
+            course_key = CourseKey.from_string(options['course_id'])
+        except InvalidKeyError:
+            raise CommandError("Invalid course key: {}".format(options['course_id']))
+
+        start = time.time()
+        stats = update_course_index(course_key)
+        self.stdout.write("Indexed {} transcripts ({} unchanged) of {} in {:.2f}s".format(
+            stats['indexed'], stats['unchanged'], course_key, time.time() - start
+        ))
+        if stats['failed']:
+            self.stdout.write("Failed ({}):".format(len(stats['failed'])))
+            for segment_id in stats['failed']:
+                self.stdout.write("  {}".format(segment_id))
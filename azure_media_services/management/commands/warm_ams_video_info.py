@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Pre-resolve captions and video info of all the AMS xBlocks in a course and put them into the shared cache.
+
+Usage (e.g. as a pre-launch step after a course import or re-run):
+
+    ./manage.py cms warm_ams_video_info course-v1:Org+Course+Run --workers 4 --ttl 86400
+
+Warmed entries are kept for `--ttl` seconds (`AMS_VIDEO_INFO_WARM_TTL` by default), but never longer
+than the locators their URLs are built from are valid (minus `AMS_VIDEO_INFO_LOCATOR_EXPIRY_MARGIN`).
+"""
+import math
+from multiprocessing.pool import ThreadPool
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import CourseKey
+from xmodule.modulestore.django import modulestore
+
+from azure_media_services.ams import LOOKUPS_PER_ASSET
+from azure_media_services.executor import run_concurrently
+from azure_media_services.video_info import get_video_info_cache, VIDEO_INFO_WARM_TTL
+
+BLOCK_CATEGORY = 'azure_media_services'
+
+
+def resolve_video_info(block, edx_video_id, lookup_pool):
+    """
+    Resolve video info in a worker thread (which gets its own DB connection, closed afterwards).
+    """
+    try:
+        return block.resolve_captions_and_video_info(edx_video_id, lookup_pool)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    """
+    Warm AMS video info cache up for a course.
+    """
+
+    help = "Resolve captions and video info of all the AMS xBlocks in a course and put them into the shared cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', help="Course key, e.g. course-v1:Org+Course+Run")
+        parser.add_argument(
+            '--workers', type=int, default=4, help="Number of videos resolved concurrently (default: 4)."
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60, help="Seconds a single video is waited for (default: 60)."
+        )
+        parser.add_argument(
+            '--ttl', type=int, default=None,
+            help="Seconds warmed entries are cached for, capped by locators expiration (default: {}).".format(
+                getattr(settings, 'AMS_VIDEO_INFO_WARM_TTL', VIDEO_INFO_WARM_TTL)
+            )
+        )
+
+    def handle(self, *args, **options):
+        try:
+            course_key = CourseKey.from_string(options['course_id'])
+        except InvalidKeyError:
+            raise CommandError("Invalid course key: {}".format(options['course_id']))
+        if options['workers'] < 1:
+            raise CommandError("--workers must be positive")
+        ttl = options['ttl'] or getattr(settings, 'AMS_VIDEO_INFO_WARM_TTL', VIDEO_INFO_WARM_TTL)
+        if ttl < 1:
+            raise CommandError("--ttl must be positive")
+
+        store = modulestore()
+        with store.bulk_operations(course_key):
+            blocks = store.get_items(course_key, qualifiers={'category': BLOCK_CATEGORY})
+            # One block per video is enough, several blocks may play the same video:
+            blocks_by_video = {}
+            for block in blocks:
+                if block.edx_video_id:
+                    blocks_by_video.setdefault(block.edx_video_id, block)
+
+        self.stdout.write("Found {} AMS blocks, {} distinct videos in {}".format(
+            len(blocks), len(blocks_by_video), course_key
+        ))
+        if not blocks_by_video:
+            return
+
+        edx_video_ids = sorted(blocks_by_video)
+        pool = ThreadPool(processes=options['workers'])
+        # Asset lookups get a pool of their own: the process-wide one is sized for web requests,
+        # the workers' lookups would queue up there (and time out, their deadline includes queueing):
+        lookup_pool = ThreadPool(processes=options['workers'] * LOOKUPS_PER_ASSET)
+        # Videos are queued on the pool, so the deadline is counted in "rounds" of workers:
+        timeout = options['timeout'] * int(math.ceil(len(edx_video_ids) / float(options['workers'])))
+        start = time.time()
+        try:
+            outcomes = run_concurrently(pool, [
+                (resolve_video_info, (blocks_by_video[edx_video_id], edx_video_id, lookup_pool))
+                for edx_video_id in edx_video_ids
+            ], timeout=timeout)
+        finally:
+            pool.terminate()
+            lookup_pool.terminate()
+        elapsed = time.time() - start
+
+        self.report(course_key.org, edx_video_ids, outcomes, elapsed, ttl)
+
+    def report(self, org, edx_video_ids, outcomes, elapsed, ttl):
+        """
+        Cache the resolved results for `ttl` seconds (if locators allow) and print what has (not) been warmed up.
+        """
+        video_info_cache = get_video_info_cache()
+        cached, shorter, failed, missing, missing_sas = [], [], [], [], []
+        for edx_video_id, outcome in zip(edx_video_ids, outcomes):
+            if not outcome.ok:
+                failed.append((edx_video_id, repr(outcome.error)))
+                continue
+            result, locators = outcome.value
+            if locators is None:
+                failed.append((edx_video_id, result['error_message']))
+                continue
+            if not result['video_info']:
+                missing.append(edx_video_id)
+            elif len(locators) < 2:
+                missing_sas.append(edx_video_id)
+            applied = video_info_cache.store(org, edx_video_id, result, locators, ttl)
+            if applied:
+                cached.append(edx_video_id)
+                if applied < ttl:
+                    shorter.append((edx_video_id, applied))
+
+        self.stdout.write("Resolved {} videos in {:.2f}s ({:.2f}s if run serially), cached: {} for {}s".format(
+            len(edx_video_ids), elapsed, sum(outcome.duration for outcome in outcomes), len(cached), ttl
+        ))
+        self._write_list(
+            "Cached for less (locators expire sooner, missing videos)",
+            ["{}: {}s".format(*entry) for entry in shorter]
+        )
+        self._write_list("Failed", ["{}: {}".format(*failure) for failure in failed])
+        self._write_list("Missing on Azure Media Services", missing)
+        self._write_list("Missing progressive (SAS) locator, no captions auto-fetching", missing_sas)
+
+    def _write_list(self, title, items):
+        if items:
+            self.stdout.write("{} ({}):".format(title, len(items)))
+            for item in items:
+                self.stdout.write("  {}".format(item))
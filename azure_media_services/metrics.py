@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Timings and counters of the xBlock's views, handlers and upstream calls.
+
+Metrics are tagged by `org` and `outcome` and go to a pluggable sink: statsd (DogStatsD-style tags)
+or a Django signal. They're off by default: instrumented code then costs a single attribute check.
+"""
+import functools
+import importlib
+import logging
+import socket
+import threading
+import timeit
+
+from django.conf import settings
+from django.dispatch import Signal
+
+log = logging.getLogger(__name__)
+
+# Defaults, each of them can be overridden in Django settings:
+# - metrics sink: None (disabled), 'statsd', 'signal' or a dotted path of a sink class;
+METRICS_SINK = None
+# - statsd daemon address;
+METRICS_STATSD_HOST = 'localhost'
+METRICS_STATSD_PORT = 8125
+# - prefix of the metric names sent to statsd.
+METRICS_PREFIX = 'ams'
+
+# Sent by `SignalSink` for each metric, `kind` is 'timing' (value in milliseconds), 'counter' or 'gauge':
+metric_recorded = Signal(providing_args=['kind', 'name', 'value', 'tags'])
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+class NullSink(object):
+    """
+    Discards everything: metrics are disabled.
+    """
+
+    enabled = False
+
+    def timing(self, name, value, tags):
+        pass
+
+    def increment(self, name, tags, value=1):
+        pass
+
+    def gauge(self, name, value, tags):
+        pass
+
+
+class StatsdSink(object):
+    """
+    Sends metrics over UDP to statsd (fire and forget, failures are ignored).
+    """
+
+    enabled = True
+
+    def __init__(self, host=METRICS_STATSD_HOST, port=METRICS_STATSD_PORT, prefix=METRICS_PREFIX):
+        """
+        Create the socket, the host name is resolved once.
+        """
+        self.address = (socket.gethostbyname(host), port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def timing(self, name, value, tags):
+        self.send(name, '{:.3f}|ms'.format(value), tags)
+
+    def increment(self, name, tags, value=1):
+        self.send(name, '{}|c'.format(value), tags)
+
+    def gauge(self, name, value, tags):
+        self.send(name, '{}|g'.format(value), tags)
+
+    def send(self, name, value, tags):
+        line = '{}.{}:{}'.format(self.prefix, name, value) if self.prefix else '{}:{}'.format(name, value)
+        if tags:
+            line += '|#' + ','.join('{}:{}'.format(tag, tag_value) for tag, tag_value in sorted(tags.items()))
+        try:
+            self.socket.sendto(line.encode('utf-8'), self.address)
+        except socket.error:
+            pass
+
+
+class SignalSink(object):
+    """
+    Sends `metric_recorded` Django signal, receivers forward metrics wherever they need to.
+    """
+
+    enabled = True
+
+    def timing(self, name, value, tags):
+        metric_recorded.send(sender=self.__class__, kind='timing', name=name, value=value, tags=tags)
+
+    def increment(self, name, tags, value=1):
+        metric_recorded.send(sender=self.__class__, kind='counter', name=name, value=value, tags=tags)
+
+    def gauge(self, name, value, tags):
+        metric_recorded.send(sender=self.__class__, kind='gauge', name=name, value=value, tags=tags)
+
+
+def build_metrics_sink():
+    """
+    Create the sink configured with `AMS_METRICS_SINK`, falling back to `NullSink` if it can't be created.
+    """
+    sink = getattr(settings, 'AMS_METRICS_SINK', METRICS_SINK)
+    try:
+        if not sink:
+            return NullSink()
+        if sink == 'statsd':
+            return StatsdSink(
+                host=getattr(settings, 'AMS_METRICS_STATSD_HOST', METRICS_STATSD_HOST),
+                port=getattr(settings, 'AMS_METRICS_STATSD_PORT', METRICS_STATSD_PORT),
+                prefix=getattr(settings, 'AMS_METRICS_PREFIX', METRICS_PREFIX),
+            )
+        if sink == 'signal':
+            return SignalSink()
+        module_name, class_name = sink.rsplit('.', 1)
+        return getattr(importlib.import_module(module_name), class_name)()
+    except (ImportError, AttributeError, ValueError, socket.error):
+        log.exception("Metrics sink can't be created, metrics are disabled: %s", sink)
+        return NullSink()
+
+
+def get_metrics_sink():
+    """
+    Return process-wide metrics sink (created on first use).
+    """
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = build_metrics_sink()
+    return _sink
+
+
+def reset_metrics_sink():
+    """
+    Drop the sink, so the next metric recreates it according to the (changed) settings.
+    """
+    global _sink
+    with _sink_lock:
+        _sink = None
+
+
+def record(sink, name, started, outcome, tags):
+    tags = dict(tags, outcome=outcome)
+    sink.timing(name, (timeit.default_timer() - started) * 1000, tags)
+    sink.increment(name, tags)
+
+
+def gauge(sink, name, value, tags):
+    """
+    Record current `value` of a level (e.g. a queue depth), custom sinks may not support gauges.
+    """
+    record_gauge = getattr(sink, 'gauge', None)
+    if record_gauge is not None:
+        record_gauge(name, value, tags)
+
+
+def get_outcome(result):
+    """
+    Outcome of a view or handler judging by its result.
+    """
+    if isinstance(result, dict):
+        if result.get('result') == 'error' or result.get('error_message'):
+            return 'error'
+    elif getattr(result, 'status_code', 200) >= 400:
+        return 'error'
+    return 'success'
+
+
+def measured(kind):
+    """
+    Decorate xBlock's view or handler to record its timing and outcome as `<kind>.<method name>`.
+
+    For JSON handlers it should be applied first (below `XBlock.json_handler`) to see the result data.
+    """
+    def decorator(method):
+        name = '{}.{}'.format(kind, method.__name__)
+
+        @functools.wraps(method)
+        def wrapper(block, *args, **kwargs):
+            sink = get_metrics_sink()
+            if not sink.enabled:
+                return method(block, *args, **kwargs)
+
+            tags = {'org': block.location.org}
+            started = timeit.default_timer()
+            try:
+                result = method(block, *args, **kwargs)
+            except Exception:
+                record(sink, name, started, 'exception', tags)
+                raise
+            record(sink, name, started, get_outcome(result), tags)
+            return result
+
+        return wrapper
+    return decorator
+
+
+def get_upstream_outcome(result):
+    return 'success' if result else 'not_found'
+
+
+def timed(name, func, tags, outcome=get_upstream_outcome):
+    """
+    Return `func` wrapped to record its timing and outcome (`error` if it raises, `outcome(result)` otherwise).
+
+    `func` itself is returned if metrics are disabled.
+    """
+    sink = get_metrics_sink()
+    if not sink.enabled:
+        return func
+
+    def wrapper(*args, **kwargs):
+        started = timeit.default_timer()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            record(sink, name, started, 'error', tags)
+            raise
+        record(sink, name, started, outcome(result), tags)
+        return result
+
+    return wrapper
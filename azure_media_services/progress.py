@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Per-learner watch progress: the parts of the video a learner has watched, kept as sorted, disjoint intervals.
+
+Intervals reported by the player's heartbeats are merged into the stored ones, so the structure grows with
+the number of distinct watched parts rather than with watching time, and it's capped: past the cap the closest
+intervals are coalesced. Reports are client-side data, so a heartbeat is credited no more seconds than could have
+been watched since the previous one.
+"""
+from bisect import bisect_left
+import math
+
+# Defaults, each of them can be overridden in Django settings:
+# - how often (seconds) the player reports watched intervals, 0 disables tracking;
+WATCH_HEARTBEAT_INTERVAL = 15
+# - max number of intervals a heartbeat may carry;
+WATCH_HEARTBEAT_MAX_INTERVALS = 50
+# - max number of intervals stored per learner and block;
+WATCH_MAX_INTERVALS = 64
+# - share of the video to be watched for the block to be completed;
+WATCH_COMPLETION_THRESHOLD = 0.95
+# - max playback rate: a heartbeat is credited at most this many seconds per second elapsed since the previous one;
+WATCH_MAX_PLAYBACK_RATE = 2.0
+# - seconds credited to a heartbeat on top of that (timers' and network jitter).
+WATCH_HEARTBEAT_SLACK = 5
+
+# Intervals closer than this (seconds) are merged: the player reports the position only every ~250ms:
+MERGE_GAP = 1.0
+# Reported positions may slightly overshoot the duration:
+DURATION_TOLERANCE = 1.0
+
+
+def is_finite(value):
+    return not (math.isnan(value) or math.isinf(value))
+
+
+def parse_duration(value):
+    """
+    Return video duration reported by the player (seconds) or None if it's unknown yet.
+
+    :raises ValueError: if the value is not a number.
+    :raises TypeError: if the value is not a number or a string.
+    """
+    if value is None:
+        return None
+    duration = float(value)
+    if not is_finite(duration) or duration <= 0:
+        return None
+    return duration
+
+
+def clean_intervals(raw, duration=None, max_count=WATCH_HEARTBEAT_MAX_INTERVALS):
+    """
+    Validate intervals reported by the player: list of `[start, end]` seconds, clamped to the duration if it's known.
+
+    :raises ValueError: if the intervals are malformed or there are too many of them.
+    :raises TypeError: if the bounds are not numbers.
+    """
+    if not isinstance(raw, list) or len(raw) > max_count:
+        raise ValueError('`intervals` must be a list of at most {} items'.format(max_count))
+    intervals = []
+    for interval in raw:
+        if not isinstance(interval, list) or len(interval) != 2:
+            raise ValueError('Each interval must be a `[start, end]` pair')
+        start, end = float(interval[0]), float(interval[1])
+        if not all(is_finite(value) for value in (start, end)) or start < 0 or end < start:
+            raise ValueError('Malformed interval: {!r}'.format(interval))
+        if duration:
+            if start > duration + DURATION_TOLERANCE:
+                raise ValueError('Interval is past the video end: {!r}'.format(interval))
+            end = min(end, duration)
+        if end > start:
+            intervals.append([start, end])
+    return intervals
+
+
+def get_heartbeat_allowance(elapsed, heartbeat_interval, max_rate=WATCH_MAX_PLAYBACK_RATE,
+                            slack=WATCH_HEARTBEAT_SLACK):
+    """
+    Return max seconds of the video a heartbeat may be credited.
+
+    The player sends what's been played at most `heartbeat_interval` after the previous heartbeat, so the elapsed
+    wall-clock time (None for the first heartbeat) is capped by it as well.
+    """
+    if elapsed is None:
+        elapsed = heartbeat_interval
+    return max(min(elapsed, heartbeat_interval), 0) * max_rate + slack
+
+
+def limit_intervals(intervals, max_seconds):
+    """
+    Return the intervals truncated to `max_seconds` in total (the ones past it are dropped).
+    """
+    limited = []
+    for start, end in intervals:
+        if max_seconds <= 0:
+            break
+        end = min(end, start + max_seconds)
+        max_seconds -= end - start
+        limited.append([start, end])
+    return limited
+
+
+def merge_interval(intervals, start, end, gap=MERGE_GAP):
+    """
+    Merge `[start, end]` into sorted, disjoint intervals (in place), joining the ones it overlaps or nearly touches.
+    """
+    position = bisect_left(intervals, [start, end])
+    if position > 0 and intervals[position - 1][1] + gap >= start:
+        position -= 1
+    last = position
+    while last < len(intervals) and intervals[last][0] - gap <= end:
+        start = min(start, intervals[last][0])
+        end = max(end, intervals[last][1])
+        last += 1
+    intervals[position:last] = [[start, end]]
+
+
+def coalesce(intervals, max_count):
+    """
+    Join the closest neighbours (in place) until there are at most `max_count` intervals.
+
+    The gaps joined are the shortest ones, so coverage is overestimated by as little as possible.
+    """
+    while len(intervals) > max(max_count, 1):
+        position = min(range(len(intervals) - 1), key=lambda i: intervals[i + 1][0] - intervals[i][1])
+        intervals[position:position + 2] = [[intervals[position][0], intervals[position + 1][1]]]
+
+
+def merge_intervals(stored, new, max_count=WATCH_MAX_INTERVALS):
+    """
+    Return stored intervals with the new ones merged in (rounded to 0.1s to keep the stored state compact).
+    """
+    intervals = [list(interval) for interval in stored]
+    for start, end in new:
+        merge_interval(intervals, round(start, 1), round(end, 1))
+    coalesce(intervals, max_count)
+    return intervals
+
+
+def get_watched_seconds(intervals):
+    return sum(end - start for start, end in intervals)
+
+
+def get_watched_fraction(intervals, duration):
+    """
+    Return watched share of the video (0..1) or None if its duration is unknown.
+    """
+    if not duration:
+        return None
+    # Parts past the end (watched while the duration was unknown) don't count:
+    watched = get_watched_seconds([start, min(end, duration)] for start, end in intervals if start < duration)
+    return min(watched / float(duration), 1.0)
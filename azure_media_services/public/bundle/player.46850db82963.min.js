@@ -0,0 +1,72 @@
+/*! Azure Media Services xBlock player bundle. vttcue.js: Copyright 2013 vtt.js Contributors, Apache License 2.0. Other sources: Copyright (c) Microsoft Corporation, MIT license. */
+var autoKeyword="auto";var directionSetting={"":true,"lr":true,"rl":true};var alignSetting={"start":true,"middle":true,"end":true,"left":true,"right":true};function findDirectionSetting(value){if(typeof value!=="string"){return false;}
+var dir=directionSetting[value.toLowerCase()];return dir?value.toLowerCase():false;}
+function findAlignSetting(value){if(typeof value!=="string"){return false;}
+var align=alignSetting[value.toLowerCase()];return align?value.toLowerCase():false;}
+function extend(obj){var i=1;for(;i<arguments.length;i++){var cobj=arguments[i];for(var p in cobj){obj[p]=cobj[p];}}
+return obj;}
+function VTTCue(startTime,endTime,text){var cue=this;var isIE8=(/MSIE\s8\.0/).test(navigator.userAgent);var baseObj={};if(isIE8){cue=document.createElement('custom');}else{baseObj.enumerable=true;}
+cue.hasBeenReset=false;var _id="";var _pauseOnExit=false;var _startTime=startTime;var _endTime=endTime;var _text=text;var _region=null;var _vertical="";var _snapToLines=true;var _line="auto";var _lineAlign="start";var _position=50;var _positionAlign="middle";var _size=50;var _align="middle";Object.defineProperty(cue,"id",extend({},baseObj,{get:function(){return _id;},set:function(value){_id=""+value;}}));Object.defineProperty(cue,"pauseOnExit",extend({},baseObj,{get:function(){return _pauseOnExit;},set:function(value){_pauseOnExit=!!value;}}));Object.defineProperty(cue,"startTime",extend({},baseObj,{get:function(){return _startTime;},set:function(value){if(typeof value!=="number"){throw new TypeError("Start time must be set to a number.");}
+_startTime=value;this.hasBeenReset=true;}}));Object.defineProperty(cue,"endTime",extend({},baseObj,{get:function(){return _endTime;},set:function(value){if(typeof value!=="number"){throw new TypeError("End time must be set to a number.");}
+_endTime=value;this.hasBeenReset=true;}}));Object.defineProperty(cue,"text",extend({},baseObj,{get:function(){return _text;},set:function(value){_text=""+value;this.hasBeenReset=true;}}));Object.defineProperty(cue,"region",extend({},baseObj,{get:function(){return _region;},set:function(value){_region=value;this.hasBeenReset=true;}}));Object.defineProperty(cue,"vertical",extend({},baseObj,{get:function(){return _vertical;},set:function(value){var setting=findDirectionSetting(value);if(setting===false){throw new SyntaxError("An invalid or illegal string was specified.");}
+_vertical=setting;this.hasBeenReset=true;}}));Object.defineProperty(cue,"snapToLines",extend({},baseObj,{get:function(){return _snapToLines;},set:function(value){_snapToLines=!!value;this.hasBeenReset=true;}}));Object.defineProperty(cue,"line",extend({},baseObj,{get:function(){return _line;},set:function(value){if(typeof value!=="number"&&value!==autoKeyword){throw new SyntaxError("An invalid number or illegal string was specified.");}
+_line=value;this.hasBeenReset=true;}}));Object.defineProperty(cue,"lineAlign",extend({},baseObj,{get:function(){return _lineAlign;},set:function(value){var setting=findAlignSetting(value);if(!setting){throw new SyntaxError("An invalid or illegal string was specified.");}
+_lineAlign=setting;this.hasBeenReset=true;}}));Object.defineProperty(cue,"position",extend({},baseObj,{get:function(){return _position;},set:function(value){if(value<0||value>100){throw new Error("Position must be between 0 and 100.");}
+_position=value;this.hasBeenReset=true;}}));Object.defineProperty(cue,"positionAlign",extend({},baseObj,{get:function(){return _positionAlign;},set:function(value){var setting=findAlignSetting(value);if(!setting){throw new SyntaxError("An invalid or illegal string was specified.");}
+_positionAlign=setting;this.hasBeenReset=true;}}));Object.defineProperty(cue,"size",extend({},baseObj,{get:function(){return _size;},set:function(value){if(value<0||value>100){throw new Error("Size must be between 0 and 100.");}
+_size=value;this.hasBeenReset=true;}}));Object.defineProperty(cue,"align",extend({},baseObj,{get:function(){return _align;},set:function(value){var setting=findAlignSetting(value);if(!setting){throw new SyntaxError("An invalid or illegal string was specified.");}
+_align=setting;this.hasBeenReset=true;}}));cue.displayState=undefined;if(isIE8){return cue;}}
+VTTCue.prototype.getCueAsHTML=function(){return WebVTT.convertCueToDOMTree(window,this.text);};;
+function TranscriptSync(options){'use strict';var i;this.starts=[];this.ends=[];for(i=0;i<options.cues.length;i++){this.starts.push(options.cues[i].startTime);this.ends.push(options.cues[i].endTime);}
+this.items=options.items;this.container=options.container;this.requestFrame=options.requestFrame||TranscriptSync.requestFrame;this.activeIndex=-1;this.scrollScheduled=false;}
+TranscriptSync.findCue=function(starts,ends,time){'use strict';var middle;var low=0;var high=starts.length-1;var found=-1;while(low<=high){middle=(low+high)>>1;if(starts[middle]<=time){found=middle;low=middle+1;}else{high=middle-1;}}
+return(found!==-1&&time<ends[found])?found:-1;};TranscriptSync.requestFrame=function(callback){'use strict';return(window.requestAnimationFrame||function(cb){return window.setTimeout(cb,16);})(callback);};TranscriptSync.prototype.update=function(time){'use strict';var index=TranscriptSync.findCue(this.starts,this.ends,time);if(index===this.activeIndex){return false;}
+if(this.activeIndex!==-1){this.items[this.activeIndex].classList.remove('current');}
+this.activeIndex=index;if(index!==-1){this.items[index].classList.add('current');this.scheduleScroll();}
+return true;};TranscriptSync.prototype.scheduleScroll=function(){'use strict';var self=this;if(this.scrollScheduled){return;}
+this.scrollScheduled=true;this.requestFrame(function(){var scrollTop;self.scrollScheduled=false;if(self.activeIndex===-1||!self.container){return;}
+scrollTop=self.items[self.activeIndex].offsetTop-self.items[0].offsetTop;if($.fn.scrollTo){$(self.container).scrollTo(scrollTop,1000);}else{self.container.scrollTop=scrollTop;}});};;
+function registerTranscriptsAmpPlugin(){'use strict';if(!registerTranscriptsAmpPlugin.isRegistered){registerTranscriptsAmpPlugin.isRegistered=true;defineTranscriptsAmpPlugin();}}
+function defineTranscriptsAmpPlugin(){'use strict';var Component=amp.getComponent('Component');var MenuItem=amp.getComponent('MenuItem');var MenuButton=amp.getComponent('MenuButton');var TranscriptsMenuItem=amp.extend(MenuItem,{constructor:function(){var player=arguments[0];var options=arguments[1];this.track=options.track;this.cues=[];options.label=options.label||this.track.label||'Unknown';MenuItem.apply(this,arguments);},handleClick:function(evt){var player=this.player();var track=this.track;var $wrapper=$('div.tc-wrapper');var $transcriptContainer=$('div.tc-container');this.options_.parent.items.forEach(function(item){item.selected(false);});this.selected(true);if(this.options_.identity==='off'){$wrapper.addClass('closed');}else{loadCues(player,this.track).done(function(cues){player.transcriptSync=initTranscript(player,$transcriptContainer,cues,track.language);player.transcriptSync.update(player.currentTime());});$wrapper.removeClass('closed');}}});var TranscriptsMenuButton=amp.extend(MenuButton,{constructor:function(){MenuButton.apply(this,arguments);this.addClass('vjs-transcripts-button');this.addClass('fa');this.addClass('fa-quote-left');},createItems:function(){var player=this.player();var items=[];var menuButton=this;var tracks=player.textTracks();if(!tracks){return items;}
+items.push(new TranscriptsMenuItem(player,{identity:'off',label:'Off',parent:menuButton,selectable:true,selected:true}));items=items.concat(tracks.tracks_.map(function(track){return new TranscriptsMenuItem(player,{identity:'item',parent:menuButton,selectable:true,track:track});}));return items;}});var MainContainer=amp.extend(Component,{constructor:function(){Component.apply(this,arguments);this.addClass('tc-wrapper');this.addClass('video');this.addClass('closed');}});var TranscriptContainer=amp.extend(Component,{constructor:function(){Component.apply(this,arguments);},createEl:function(){return $('<div class="tc-container"><ul class="subtitles-menu"></ul></div>').get(0);}});var CueItem=amp.extend(MenuItem,{constructor:function(){var player=arguments[0];var options=arguments[1];this.text=options.text;this.startTime=options.startTime;this.endTime=options.endTime;MenuItem.apply(this,arguments);},createEl:function(){return Component.prototype.createEl('li',{tabIndex:-1,role:'link',className:'transcript-cue',innerHTML:$('<span>').text(this.options_.text).html()},{'data-cue-start':this.options_.startTime});}});amp.registerComponent('TranscriptsMenuButton',TranscriptsMenuButton);amp.plugin('transcriptsAmpPlugin',function(options){var player=this;var $vidParent=$(player.el()).parent().parent();var tcButton=new TranscriptsMenuButton(player,{title:'TRANSCRIPTS'});var mainContainer=new MainContainer(player,{});var transcriptContainer=new TranscriptContainer(player,{});var syncTranscript=function(){if(player.transcriptSync){player.transcriptSync.update(player.currentTime());}};player.transcriptCuesUrl=options.cuesUrl;player.transcriptCueIndexes={};if(options.prefetched){player.transcriptCueIndexes[options.prefetched.lang]=cuesFromIndex(options.prefetched.cues);}
+this.addEventListener('loadeddata',function(){$vidParent.wrap(mainContainer.el());$vidParent.parent().append(transcriptContainer.el());if(!options.hidden){player.getChild('controlBar').getChild('controlBarIconsRight').addChild(tcButton);}});this.addEventListener(amp.eventName.timeupdate,syncTranscript);this.addEventListener(amp.eventName.seeked,syncTranscript);});function cuesFromIndex(index){var cues=[];for(var i=0;i<index.start.length;i++){cues.push({startTime:index.start[i],endTime:index.end[i],text:index.text[i]});}
+return cues;}
+function loadCues(player,track){var deferred=$.Deferred();var indexes=player.transcriptCueIndexes;var fallback=function(){deferred.resolve(Array.prototype.slice.call(track.cues||[]).sort(function(a,b){return a.startTime-b.startTime;}));};if(indexes&&indexes[track.language]){deferred.resolve(indexes[track.language]);}else if(player.transcriptCuesUrl){$.getJSON(player.transcriptCuesUrl(track.language)).done(function(index){indexes[track.language]=cuesFromIndex(index);deferred.resolve(indexes[track.language]);}).fail(fallback);}else{fallback();}
+return deferred.promise();}
+function initTranscript(player,$transcriptElement,cues,language){var cue;var cueComponent;var startTime;var $transcriptItems;var sync;var $html=$('<ul class="subtitles-menu"></ul>');if(language==='ar'){$html=$('<ul class="subtitles-menu" style="text-align:right;"></ul>');}
+for(var i=0;i<cues.length;i++){cue=cues[i];cueComponent=new CueItem(player,{text:cue.text,startTime:cue.startTime,endTime:cue.endTime});$html.append(cueComponent.el());}
+$transcriptElement.html($html);$transcriptItems=$transcriptElement.find('.transcript-cue');sync=new TranscriptSync({cues:cues,items:$transcriptItems.get(),container:$transcriptElement.get(0)});$transcriptItems.on('click keypress',function(evt){var KeyCode=(evt.type==='keydown'&&evt.keyCode?evt.keyCode:evt.which);if(evt.type!=='click'&&(KeyCode!==32&&KeyCode!==13)){return;}
+if(KeyCode===32){evt.preventDefault();}
+startTime=parseFloat($(evt.target).data('cue-start'));player.currentTime(startTime);sync.update(startTime);});return sync;}}
+if(typeof amp!=='undefined'){registerTranscriptsAmpPlugin();};
+var LAZY_LOAD_ROOT_MARGIN='200px';var PLAYBACK_TOKEN_REFRESH_LEAD=60;var PLAYBACK_TOKEN_RETRY_DELAY=15;var events={PLAYED:'edx.video.played',PAUSED:'edx.video.paused',STOPPED:'edx.video.stopped',POSITION_CHANGED:'edx.video.position.changed',TRANSCRIPT_SHOWN:'edx.video.transcript.show',TRANSCRIPTS_HIDDEN:'edx.video.transcript.hidden',VIDEO_LOADED:'edx.video.loaded',CAPTIONS_SHOWN:'edx.video.closed_captions.shown',CAPTIONS_HIDDEN:'edx.video.closed_captions.hidden'};function PlayerEventsQueue(send,options){'use strict';this.send=send;this.maxSize=options.maxSize||20;this.flushInterval=options.flushInterval||3000;this.batch=[];this.timer=null;}
+PlayerEventsQueue.prototype.push=function(name,data){'use strict';var self=this;this.batch.push({event_type:name,data:data||{},timestamp:new Date().toISOString()});if(this.batch.length>=this.maxSize){this.flush(false);}else if(this.timer===null){this.timer=setTimeout(function(){self.flush(false);},this.flushInterval);}};PlayerEventsQueue.prototype.flush=function(isUnloading){'use strict';var batch=this.batch;if(this.timer!==null){clearTimeout(this.timer);this.timer=null;}
+if(batch.length){this.batch=[];this.send(batch,!!isUnloading);}};function WatchTracker(send,options){'use strict';this.send=send;this.interval=options.interval;this.maxStep=options.maxStep||2;this.pending=[];this.current=null;this.timer=null;}
+WatchTracker.prototype.update=function(time){'use strict';var self=this;if(this.current&&time>=this.current[1]&&time-this.current[1]<=this.maxStep){this.current[1]=time;}else{this.stop();this.current=[time,time];}
+if(this.timer===null){this.timer=setTimeout(function(){self.flush(false);},this.interval);}};WatchTracker.prototype.stop=function(){'use strict';if(this.current&&this.current[1]>this.current[0]){this.pending.push(this.current);}
+this.current=null;};WatchTracker.prototype.flush=function(isUnloading){'use strict';var intervals=this.pending;if(this.timer!==null){clearTimeout(this.timer);this.timer=null;}
+if(this.current&&this.current[1]>this.current[0]){intervals.push(this.current);this.current=[this.current[1],this.current[1]];}
+this.pending=[];if(intervals.length){this.send(intervals,!!isUnloading);}};function PlaybackTokenRefresher(fetch,apply,expiresIn){'use strict';this.fetch=fetch;this.apply=apply;this.refreshAt=PlaybackTokenRefresher.getRefreshTime(expiresIn);this.timer=null;this.isStopped=false;}
+PlaybackTokenRefresher.getRefreshTime=function(expiresIn){'use strict';return Date.now()+Math.max((expiresIn||0)-PLAYBACK_TOKEN_REFRESH_LEAD,0)*1000;};PlaybackTokenRefresher.prototype.start=function(onReady){'use strict';if(Date.now()>=this.refreshAt){this.refresh(onReady);}else{this.schedule(this.refreshAt-Date.now());onReady();}};PlaybackTokenRefresher.prototype.refresh=function(onDone){'use strict';var self=this;this.timer=null;this.fetch().done(function(response){if(!self.isStopped){self.apply(response.token);self.refreshAt=PlaybackTokenRefresher.getRefreshTime(response.expires_in);self.schedule(self.refreshAt-Date.now());}}).fail(function(){self.schedule(PLAYBACK_TOKEN_RETRY_DELAY*1000);}).always(function(){if(onDone){onDone();}});};PlaybackTokenRefresher.prototype.schedule=function(delay){'use strict';var self=this;if(this.isStopped)return;clearTimeout(this.timer);this.timer=setTimeout(function(){self.refresh();},Math.max(delay,0));};PlaybackTokenRefresher.prototype.stop=function(){'use strict';this.isStopped=true;clearTimeout(this.timer);this.timer=null;};function getCsrfToken(){'use strict';var match=document.cookie.match(/(?:^|;\s*)csrftoken=([^;]*)/);return match?decodeURIComponent(match[1]):'';}
+function postToHandler(url,data,isUnloading){'use strict';var payload=JSON.stringify(data);if(isUnloading&&window.fetch){window.fetch(url,{method:'POST',body:payload,keepalive:true,credentials:'same-origin',headers:{'Content-Type':'application/json','X-CSRFToken':getCsrfToken()}});return;}
+$.ajax({type:'POST',url:url,data:payload});}
+function sendPlayerEvents(eventsPostUrl,batch,isUnloading){'use strict';postToHandler(eventsPostUrl,{events:batch},isUnloading);}
+function getTranscripts(runtime,container,transcripts){'use strict';return transcripts.map(function(transcript){return $.extend({},transcript,{src:runtime.handlerUrl(container,'transcript',transcript.srclang)});});}
+function getDeepLinkedTime(hash,usageId){'use strict';var params={};var time;(hash||'').replace(/^#/,'').split('&').forEach(function(pair){var parts=pair.split('=');try{params[decodeURIComponent(parts[0])]=decodeURIComponent(parts.slice(1).join('='));}catch(error){}});if(!usageId||params.block!==usageId){return null;}
+time=parseFloat(params.t);return isNaN(time)||time<0?null:time;}
+function loadAzureMediaPlayer(urls){'use strict';if(!loadAzureMediaPlayer.promise){if(typeof amp!=='undefined'){loadAzureMediaPlayer.promise=$.Deferred().resolve().promise();}else{$('<link rel="stylesheet" type="text/css">').attr('href',urls.css).appendTo('head');loadAzureMediaPlayer.promise=$.ajax({url:urls.js,dataType:'script',cache:true}).fail(function(){loadAzureMediaPlayer.promise=null;});}}
+return loadAzureMediaPlayer.promise;}
+function observeViewport(element,callback){'use strict';var observer;if(typeof window.IntersectionObserver==='undefined'){callback();return function(){};}
+observer=new window.IntersectionObserver(function(entries){var isIntersecting=entries.some(function(entry){return entry.isIntersecting;});if(isIntersecting){observer.disconnect();callback();}},{rootMargin:LAZY_LOAD_ROOT_MARGIN});observer.observe(element);return function(){observer.disconnect();};}
+function AzureMediaServicesBlock(runtime,container,jsonArgs){'use strict';var $sharePopup=$(container).find('.js-share-popup');var $ddlSizeEmbed=$(container).find('#ddlSizeEmbed');var $txtContentEmbed=$(container).find('#txtContentEmbed');var $video=$(container).find('.xblock-video-amp');var $placeholder=$(container).find('.js-amp-placeholder');var transcripts=getTranscripts(runtime,container,jsonArgs.transcripts);var eventsPostUrl=runtime.handlerUrl(container,'publish_events');var eventsQueue=new PlayerEventsQueue(function(batch,isUnloading){sendPlayerEvents(eventsPostUrl,batch,isUnloading);},{});var watchProgressUrl=runtime.handlerUrl(container,'watch_progress');var watchTracker=null;var deepLinkedTime=getDeepLinkedTime(window.location.hash,$(container).attr('data-usage-id'));var isStarted=false;var isPlayRequested=false;var stopObserving;function sendPlayerEvent(name,data){if(jsonArgs.user_is_authenticated){eventsQueue.push(name,data);}}
+function getContentEmbed(){var embedUrl=$txtContentEmbed.data('url');var width=$ddlSizeEmbed.find('option:selected').data('width');var height=$ddlSizeEmbed.find('option:selected').data('height');var iframeEmbed=_.template('<iframe src="<%= embedUrl %>" width="<%= width %>" height="<%= height %>" '+'allowFullScreen frameBorder="0"></iframe>')({embedUrl:embedUrl,width:width,height:height});return iframeEmbed;}
+function initPlayer(){var downloadMediaList=[];var langSource;var player;registerTranscriptsAmpPlugin();player=amp($video[0],$video.data('lazy-setup')||null,function(){var ampPlayer=this;var subtitleEls;var languageName;var tokenRefresher=null;function onSourceReady(){if(deepLinkedTime!==null){ampPlayer.currentTime(deepLinkedTime);}
+if(isPlayRequested){ampPlayer.play();}}
+if(jsonArgs.protection){tokenRefresher=new PlaybackTokenRefresher(function(){return $.ajax({url:runtime.handlerUrl(container,'playback_token'),dataType:'json'});},function(token){ampPlayer.src([{src:jsonArgs.protection.src,type:'application/vnd.ms-sstr+xml',protectionInfo:[{type:jsonArgs.protection.type,authenticationToken:'Bearer='+token}]}]);if(deepLinkedTime!==null){ampPlayer.currentTime(deepLinkedTime);}},jsonArgs.protection.expires_in);this.addEventListener(amp.eventName.play,function(){tokenRefresher.stop();});tokenRefresher.start(onSourceReady);}else{onSourceReady();}
+if(jsonArgs.watch_heartbeat_interval){watchTracker=new WatchTracker(function(intervals,isUnloading){postToHandler(watchProgressUrl,{intervals:intervals,duration:ampPlayer.duration()},isUnloading);},{interval:jsonArgs.watch_heartbeat_interval*1000});this.addEventListener(amp.eventName.timeupdate,function(){if(!ampPlayer.paused()&&!ampPlayer.seeking()){watchTracker.update(ampPlayer.currentTime());}});this.addEventListener(amp.eventName.seeking,function(){watchTracker.stop();});this.addEventListener(amp.eventName.pause,function(){watchTracker.stop();watchTracker.flush(false);});}
+this.addEventListener(amp.eventName.pause,function(){sendPlayerEvent(events.PAUSED,{});});this.addEventListener(amp.eventName.play,function(){sendPlayerEvent(events.PLAYED,{});});this.addEventListener(amp.eventName.loadeddata,function(){sendPlayerEvent(events.VIDEO_LOADED,{});});this.addEventListener(amp.eventName.seeked,function(){sendPlayerEvent(events.POSITION_CHANGED,{});});this.addEventListener(amp.eventName.ended,function(){sendPlayerEvent(events.STOPPED,{});});subtitleEls=$(container).find('.vjs-subtitles-button .vjs-menu-item');subtitleEls.mousedown(function(evt){var reportEvent=events.CAPTIONS_SHOWN;languageName=$(evt.target).html();if(languageName==='Off'){reportEvent=events.CAPTIONS_HIDDEN;languageName='';}
+sendPlayerEvent(reportEvent,{language_name:languageName});});});player.transcriptsAmpPlugin({hidden:!jsonArgs.transcripts_enabled,cuesUrl:function(language){return runtime.handlerUrl(container,'transcript_cues',language);},prefetched:jsonArgs.transcript_prefetch});if(!jsonArgs.assets_download)return;if(jsonArgs.transcripts_enabled){for(var i=0;i<transcripts.length;i++){downloadMediaList.push({lang:transcripts[i].srclang,type:amp.downloadableMediaType.transcript,uri:transcripts[i].src});}}
+langSource=downloadMediaList.length?downloadMediaList.slice():[{lang:player.language()}];langSource.forEach(function(media){downloadMediaList.push({lang:media.lang,type:amp.downloadableMediaType.video,uri:jsonArgs.video_download_uri});});player.downloadableMedia(downloadMediaList);}
+function startLazyPlayer(){if(isStarted)return;isStarted=true;if(stopObserving){stopObserving();}
+$placeholder.addClass('is-loading');loadAzureMediaPlayer(jsonArgs.amp_urls).done(function(){$placeholder.remove();$video.removeClass('amp-lazy-pending');initPlayer();}).fail(function(){isStarted=false;$placeholder.removeClass('is-loading');});}
+$(window).on('pagehide',function(){eventsQueue.flush(true);if(watchTracker){watchTracker.flush(true);}});$video.find('track').each(function(){$(this).attr('src',runtime.handlerUrl(container,'transcript',$(this).attr('srclang')));});$(container).find('.js-share-button').on('click',function(event){event.preventDefault();$sharePopup.toggleClass('is-hidden');if(!$txtContentEmbed.val()){$txtContentEmbed.val(getContentEmbed());}});$ddlSizeEmbed.on('change',function(){$txtContentEmbed.val(getContentEmbed());});if(jsonArgs.lazy_load){$placeholder.on('click',function(event){event.preventDefault();isPlayRequested=true;startLazyPlayer();});stopObserving=observeViewport(container,startLazyPlayer);}else{initPlayer();}};
\ No newline at end of file
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Process-wide cache of static resources and compiled templates the xBlock views are built from.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import django
+from django.conf import settings
+from django.template import Context, Engine, Template
+from django.utils.translation import get_language
+import pkg_resources
+from xblockutils.resources import ResourceLoader
+
+from .cache import TieredCache
+
+TEMPLATE_LIBRARIES = {
+    'i18n': 'xblockutils.templatetags.i18n',
+}
+
+# Defaults, can be overridden in Django settings:
+# - how long (seconds) rendered fragments are cached;
+FRAGMENT_CACHE_TTL = 5 * 60
+# - how many rendered fragments are kept in the in-process LRU tier.
+FRAGMENT_CACHE_SIZE = 256
+
+
+class CachedResourceLoader(ResourceLoader):
+    """
+    `ResourceLoader` which reads each resource and compiles each template only once per process.
+
+    Both caches are populated lazily. In debug mode (`AMS_RESOURCES_AUTO_RELOAD`, `DEBUG` by default)
+    entries are reloaded whenever the file's mtime changes.
+    """
+
+    def __init__(self, module_name):
+        """
+        Load resources relative to the module named `module_name`.
+        """
+        super(CachedResourceLoader, self).__init__(module_name)
+        self._resources = {}
+        self._templates = {}
+        self._engine = None
+        self._fragment_cache = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def auto_reload():
+        return getattr(settings, 'AMS_RESOURCES_AUTO_RELOAD', settings.DEBUG)
+
+    def get_mtime(self, resource_path):
+        try:
+            return os.path.getmtime(pkg_resources.resource_filename(self.module_name, resource_path))
+        except (OSError, NotImplementedError):
+            # E.g. the resource is packed in a zip archive:
+            return None
+
+    def _get_cached(self, cache, resource_path, load):
+        auto_reload = self.auto_reload()
+        entry = cache.get(resource_path)
+        mtime = self.get_mtime(resource_path) if auto_reload else None
+        if entry is not None and (not auto_reload or entry[0] == mtime):
+            return entry[1]
+
+        value = load(resource_path)
+        with self._lock:
+            cache[resource_path] = (mtime, value)
+        return value
+
+    def load_unicode(self, resource_path):
+        """
+        Get the content of a resource.
+        """
+        return self._get_cached(
+            self._resources, resource_path, super(CachedResourceLoader, self).load_unicode
+        )
+
+    def get_engine(self):
+        if self._engine is None:
+            # Load the extra templatetag libraries along with the installed ones (as `ResourceLoader` does):
+            from django.template.backends.django import get_installed_libraries
+            libraries = get_installed_libraries()
+            libraries.update(TEMPLATE_LIBRARIES)
+            self._engine = Engine(libraries=libraries)
+        return self._engine
+
+    def get_template(self, template_path):
+        """
+        Get compiled Django template.
+        """
+        return self._get_cached(
+            self._templates,
+            template_path,
+            lambda path: Template(super(CachedResourceLoader, self).load_unicode(path), engine=self.get_engine()),
+        )
+
+    def render_django_template(self, template_path, context=None, i18n_service=None):
+        """
+        Evaluate a Django template by resource path, applying the provided context.
+        """
+        if django.VERSION[:2] == (1, 8):
+            # Django 1.8 requires the templatetag libraries to be patched in around each render:
+            return super(CachedResourceLoader, self).render_django_template(template_path, context, i18n_service)
+
+        context = context or {}
+        context['_i18n_service'] = i18n_service
+        return self.get_template(template_path).render(Context(context))
+
+    def get_fragment_cache(self):
+        if self._fragment_cache is None:
+            self._fragment_cache = TieredCache(
+                'ams-fragment',
+                max_size=getattr(settings, 'AMS_FRAGMENT_CACHE_SIZE', FRAGMENT_CACHE_SIZE),
+                timeout=getattr(settings, 'AMS_FRAGMENT_CACHE_TTL', FRAGMENT_CACHE_TTL),
+            )
+        return self._fragment_cache
+
+    def render_django_template_cached(self, template_path, context, variant):
+        """
+        Render a Django template, caching the result by `variant`.
+
+        :param variant: JSON serializable data which (along with the active language) fully determines
+                        the rendered output, e.g. block settings the template uses and per-user bits.
+        """
+        if self.auto_reload():
+            # Templates may change at any moment:
+            return self.render_django_template(template_path, context)
+
+        key = hashlib.md5(json.dumps(
+            [template_path, get_language(), variant], sort_keys=True, separators=(',', ':')
+        ).encode('utf-8')).hexdigest()
+        cache = self.get_fragment_cache()
+        rendered = cache.get(key)
+        if rendered is None:
+            rendered = self.render_django_template(template_path, context)
+            cache.set(key, rendered)
+        return rendered
+
+    def clear(self):
+        with self._lock:
+            self._resources.clear()
+            self._templates.clear()
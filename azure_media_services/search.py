@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Course-wide transcript search: an inverted index over the cues of all the AMS xBlocks' captions in a course.
+
+The index is made of segments (one per block and caption language) stored in the shared cache along with
+a per-course manifest listing them. Segments are keyed on the caption's version (including its content's digest),
+so a course publish rebuilds only the ones whose captions changed. Queries run against an in-process index merged
+from the course's segments, which is rebuilt only when the manifest's revision changes.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import uuid
+
+from django.conf import settings
+from xmodule.modulestore import ModuleStoreEnum
+from xmodule.modulestore.django import modulestore, SignalHandler
+
+from .cache import LRUCache, TieredCache
+from .executor import get_thread_pool
+from .transcripts import get_transcript_cache
+from .webvtt import parse_webvtt
+
+log = logging.getLogger(__name__)
+
+# Defaults, each of them can be overridden in Django settings:
+# - whether courses are (re)indexed on publish and `search_transcripts` handler answers;
+TRANSCRIPT_SEARCH_ENABLED = True
+# - how long (seconds) index segments and manifests are kept in the shared cache (None - until evicted);
+TRANSCRIPT_SEARCH_CACHE_TTL = 30 * 24 * 60 * 60
+# - Django cache alias the index is stored in (it has to be shared by CMS and LMS);
+TRANSCRIPT_SEARCH_CACHE_ALIAS = 'default'
+# - how many merged course indexes are kept in memory;
+TRANSCRIPT_SEARCH_COURSE_INDEX_SIZE = 16
+# - how long (seconds) and for how many users and courses the blocks a user can access are kept in memory;
+TRANSCRIPT_SEARCH_ACCESS_CACHE_TTL = 60
+TRANSCRIPT_SEARCH_ACCESS_CACHE_SIZE = 1024
+# - max number of blocks and of matching cues per block a query returns.
+TRANSCRIPT_SEARCH_MAX_RESULTS = 20
+TRANSCRIPT_SEARCH_MAX_MATCHES = 10
+
+BLOCK_CATEGORY = 'azure_media_services'
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+# Shorter terms are too common to narrow anything down:
+MIN_TERM_LENGTH = 2
+
+_search_index = None
+_search_index_lock = threading.Lock()
+# Courses whose index update is queued or running:
+_pending_updates = set()
+_pending_updates_lock = threading.Lock()
+
+
+def tokenize(text):
+    """
+    Return lowercased terms of the text.
+    """
+    return [term for term in TERM_RE.findall(text.lower()) if len(term) >= MIN_TERM_LENGTH]
+
+
+def get_segment_id(usage_id, lang):
+    return u'{}:{}'.format(usage_id, lang)
+
+
+def get_segment_version(caption, display_name, content):
+    """
+    Version of the segment built from the caption: it changes along with anything the segment keeps.
+
+    The content's digest is a part of it, so a transcript re-uploaded to the same URL is indexed again.
+    """
+    data = json.dumps([caption.get('src'), caption.get('srclang'), display_name, hashlib.md5(content).hexdigest()])
+    return hashlib.md5(data.encode('utf-8')).hexdigest()
+
+
+def build_segment(usage_id, display_name, lang, content):
+    """
+    Index the transcript's cues: `terms` maps each term to positions of the cues it occurs in.
+    """
+    cue_index = parse_webvtt(content)
+    terms = {}
+    for position, text in enumerate(cue_index.texts):
+        for term in set(tokenize(text)):
+            terms.setdefault(term, []).append(position)
+    return {
+        'usage_id': usage_id,
+        'display_name': display_name,
+        'lang': lang,
+        'starts': [round(start, 3) for start in cue_index.starts],
+        'texts': cue_index.texts,
+        'terms': terms,
+    }
+
+
+class CourseIndex(object):
+    """
+    Segments of a course merged into postings: `{term: {segment number: [cue positions]}}`.
+    """
+
+    def __init__(self, segments):
+        """
+        Merge the segments' terms.
+        """
+        self.segments = segments
+        self.postings = {}
+        for number, segment in enumerate(segments):
+            for term, positions in segment['terms'].items():
+                self.postings.setdefault(term, {})[number] = positions
+
+    def search(self, query, lang=None, max_results=TRANSCRIPT_SEARCH_MAX_RESULTS,
+               max_matches=TRANSCRIPT_SEARCH_MAX_MATCHES, usage_ids=None):
+        """
+        Return blocks whose cues contain all the query's terms, the ones with more matching cues first.
+
+        Each result lists (up to `max_matches`) matching cues with their start times and the total number of them.
+        Only the blocks listed in `usage_ids` (if given) are searched.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        # Intersect starting with the rarest term, so the candidates set is as small as possible:
+        postings = sorted((self.postings.get(term, {}) for term in terms), key=len)
+        if not postings[0]:
+            return []
+
+        found = []
+        for number, positions in postings[0].items():
+            segment = self.segments[number]
+            if lang and segment['lang'] != lang:
+                continue
+            if usage_ids is not None and segment['usage_id'] not in usage_ids:
+                continue
+            matched = set(positions)
+            for term_postings in postings[1:]:
+                matched.intersection_update(term_postings.get(number, ()))
+                if not matched:
+                    break
+            if matched:
+                found.append((number, sorted(matched)))
+
+        found.sort(key=lambda item: (-len(item[1]), item[0]))
+        results = []
+        for number, positions in found[:max_results]:
+            segment = self.segments[number]
+            results.append({
+                'usage_id': segment['usage_id'],
+                'display_name': segment['display_name'],
+                'lang': segment['lang'],
+                'total': len(positions),
+                'matches': [
+                    {'start': segment['starts'][position], 'text': segment['texts'][position]}
+                    for position in positions[:max_matches]
+                ],
+            })
+        return results
+
+
+class TranscriptSearchIndex(object):
+    """
+    Per-course transcript indexes: segments and manifests in the shared cache, merged indexes in memory.
+    """
+
+    def __init__(self, timeout=TRANSCRIPT_SEARCH_CACHE_TTL, alias=TRANSCRIPT_SEARCH_CACHE_ALIAS,
+                 course_index_size=TRANSCRIPT_SEARCH_COURSE_INDEX_SIZE, access_ttl=TRANSCRIPT_SEARCH_ACCESS_CACHE_TTL,
+                 access_cache_size=TRANSCRIPT_SEARCH_ACCESS_CACHE_SIZE):
+        """
+        Configure how long the index is stored, where, and how many merged course indexes are kept.
+
+        Blocks users can access are kept for `access_ttl` seconds (see `get_accessible_usage_ids`).
+        """
+        self.segments = TieredCache('ams-search', max_size=64, timeout=timeout, alias=alias)
+        self.course_indexes = LRUCache(max_size=course_index_size)
+        self.accessible_usage_ids = LRUCache(max_size=access_cache_size, timeout=access_ttl)
+        self._update_lock = threading.Lock()
+
+    def manifest_key(self, course_key):
+        return self.segments.make_key(u'manifest:{}'.format(course_key))
+
+    def get_manifest(self, course_key):
+        """
+        Return `{'revision': token, 'segments': [[segment id, version], ...]}` of the course or None if not indexed.
+
+        Revision is a random token rather than a counter, so a manifest rebuilt after a cache flush never
+        matches a merged index built before it.
+
+        It's read from the shared tier directly: CMS updates it, LMS workers have to see the change at once.
+        """
+        return self.segments.shared.get(self.manifest_key(course_key))
+
+    @staticmethod
+    def segment_key(segment_id, version):
+        return u'segment:{}:{}'.format(segment_id, version)
+
+    def get_course_index(self, course_key):
+        """
+        Return `CourseIndex` of the course or None if the course hasn't been indexed yet.
+        """
+        manifest = self.get_manifest(course_key)
+        if manifest is None:
+            return None
+        key = (unicode(course_key), manifest['revision'])
+        course_index = self.course_indexes.get(key)
+        if course_index is None:
+            segments = []
+            for segment_id, version in manifest['segments']:
+                segment = self.segments.get(self.segment_key(segment_id, version))
+                if segment is None:
+                    log.warning("Transcript search segment is missing (evicted?): %s", segment_id)
+                    continue
+                segments.append(segment)
+            course_index = CourseIndex(segments)
+            self.course_indexes.set(key, course_index)
+        return course_index
+
+    def update_course(self, course_key, blocks):
+        """
+        Bring the course's index in line with its blocks' captions, (re)indexing changed captions only.
+
+        :return: `{'indexed': n, 'unchanged': n, 'failed': [segment ids]}`
+        """
+        stats = {'indexed': 0, 'unchanged': 0, 'failed': []}
+        with self._update_lock:
+            manifest = self.get_manifest(course_key) or {'revision': None, 'segments': []}
+            known = dict(manifest['segments'])
+            segments = []
+            for block in blocks:
+                usage_id = unicode(block.location)
+                for caption in block.captions or []:
+                    lang = caption.get('srclang')
+                    if not lang or not caption.get('src'):
+                        continue
+                    segment_id = get_segment_id(usage_id, lang)
+                    version = self.update_segment(segment_id, usage_id, block.display_name, caption,
+                                                  known.get(segment_id), stats)
+                    if version is not None:
+                        segments.append([segment_id, version])
+
+            if segments != manifest['segments'] or stats['indexed']:
+                self.segments.shared.set(self.manifest_key(course_key), {
+                    'revision': uuid.uuid4().hex,
+                    'segments': segments,
+                }, self.segments.timeout)
+        return stats
+
+    def update_segment(self, segment_id, usage_id, display_name, caption, known_version, stats):
+        """
+        (Re)index the caption unless its segment is up to date, return the segment's version (None if there's none).
+
+        If the transcript can't be fetched, the segment indexed before (if any) is kept: the failure may be transient.
+        """
+        try:
+            # Transcripts cache revalidates the content with the storage, so it's cheap if unchanged:
+            content = get_transcript_cache().get_content(caption['src'], caption['srclang'])
+        except IOError:
+            log.exception("Transcript can't be indexed: %s", segment_id)
+            stats['failed'].append(segment_id)
+            if known_version and self.segments.get(self.segment_key(segment_id, known_version)) is not None:
+                return known_version
+            return None
+
+        version = get_segment_version(caption, display_name, content)
+        key = self.segment_key(segment_id, version)
+        if version == known_version and self.segments.get(key) is not None:
+            stats['unchanged'] += 1
+        else:
+            self.segments.set(key, build_segment(usage_id, display_name, caption['srclang'], content))
+            stats['indexed'] += 1
+        return version
+
+
+def get_search_index():
+    """
+    Return process-wide transcript search index (created on first use).
+    """
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                _search_index = TranscriptSearchIndex(
+                    timeout=getattr(settings, 'AMS_TRANSCRIPT_SEARCH_CACHE_TTL', TRANSCRIPT_SEARCH_CACHE_TTL),
+                    alias=getattr(settings, 'AMS_TRANSCRIPT_SEARCH_CACHE_ALIAS', TRANSCRIPT_SEARCH_CACHE_ALIAS),
+                    course_index_size=getattr(
+                        settings, 'AMS_TRANSCRIPT_SEARCH_COURSE_INDEX_SIZE', TRANSCRIPT_SEARCH_COURSE_INDEX_SIZE
+                    ),
+                    access_ttl=getattr(
+                        settings, 'AMS_TRANSCRIPT_SEARCH_ACCESS_CACHE_TTL', TRANSCRIPT_SEARCH_ACCESS_CACHE_TTL
+                    ),
+                    access_cache_size=getattr(
+                        settings, 'AMS_TRANSCRIPT_SEARCH_ACCESS_CACHE_SIZE', TRANSCRIPT_SEARCH_ACCESS_CACHE_SIZE
+                    ),
+                )
+    return _search_index
+
+
+def is_search_enabled():
+    return getattr(settings, 'AMS_TRANSCRIPT_SEARCH_ENABLED', TRANSCRIPT_SEARCH_ENABLED)
+
+
+def update_course_index(course_key):
+    """
+    Index (incrementally) captions of all the AMS xBlocks in the course, as published (it runs in CMS).
+    """
+    store = modulestore()
+    with store.bulk_operations(course_key), store.branch_setting(ModuleStoreEnum.Branch.published_only, course_key):
+        blocks = store.get_items(course_key, qualifiers={'category': BLOCK_CATEGORY})
+        stats = get_search_index().update_course(course_key, blocks)
+    log.info("Transcript search index of %s is updated: %s", course_key, stats)
+    return stats
+
+
+def schedule_course_index_update(course_key):
+    """
+    Update the course's index in the background: it downloads transcripts, which mustn't hold the request.
+
+    An update already queued for the course isn't queued again.
+    """
+    with _pending_updates_lock:
+        if course_key in _pending_updates:
+            return False
+        _pending_updates.add(course_key)
+    get_thread_pool('ams-search', 1).apply_async(_update_course_index_safely, (course_key,))
+    return True
+
+
+def _update_course_index_safely(course_key):
+    with _pending_updates_lock:
+        _pending_updates.discard(course_key)
+    try:
+        update_course_index(course_key)
+    except Exception:  # pylint: disable=broad-except
+        log.exception("Transcript search index of %s can't be updated", course_key)
+
+
+def update_search_index_on_publish(sender, course_key, **kwargs):  # pylint: disable=unused-argument
+    """
+    Captions may change with each publish.
+    """
+    if is_search_enabled():
+        schedule_course_index_update(course_key)
+
+
+SignalHandler.course_published.connect(update_search_index_on_publish, dispatch_uid='ams_update_search_index')
+
+
+def get_accessible_usage_ids(user, course_key):
+    """
+    Return usage ids of the course's blocks the user can access.
+
+    Course blocks API applies the same rules as the courseware (visibility, release dates, cohorts, etc.).
+    It's costly, so the result is kept per user and published course version for a short time: changes
+    which don't publish the course (e.g. a cohort or a release date passing) take up to the TTL to apply.
+    """
+    from lms.djangoapps.course_blocks.api import get_course_blocks
+
+    store = modulestore()
+    course = store.get_course(course_key, depth=0)
+    key = (user.id, unicode(course_key), unicode(getattr(course, 'course_version', None)))
+    accessible_usage_ids = get_search_index().accessible_usage_ids
+    usage_ids = accessible_usage_ids.get(key)
+    if usage_ids is None:
+        blocks = get_course_blocks(user, store.make_course_usage_key(course_key))
+        usage_ids = frozenset(unicode(usage_key) for usage_key in blocks)
+        accessible_usage_ids.set(key, usage_ids)
+    return usage_ids
+
+
+def search_course(course_key, query, user, lang=None, max_results=None):
+    """
+    Search transcripts of the course's blocks the user can access.
+
+    :return: list of results or None if the course isn't indexed yet (its indexing is scheduled then).
+    """
+    course_index = get_search_index().get_course_index(course_key)
+    if course_index is None:
+        schedule_course_index_update(course_key)
+        return None
+    max_allowed = getattr(settings, 'AMS_TRANSCRIPT_SEARCH_MAX_RESULTS', TRANSCRIPT_SEARCH_MAX_RESULTS)
+    return course_index.search(
+        query,
+        lang=lang,
+        max_results=min(max(max_results, 1), max_allowed) if max_results else max_allowed,
+        max_matches=getattr(settings, 'AMS_TRANSCRIPT_SEARCH_MAX_MATCHES', TRANSCRIPT_SEARCH_MAX_MATCHES),
+        usage_ids=get_accessible_usage_ids(user, course_key),
+    )
@@ -1,9 +1,15 @@
 // Copyright (c) Microsoft Corporation. All Rights Reserved.
 // Licensed under the MIT license. See LICENSE file on the project webpage for details.
 
-/* global _ amp gettext runtime */
+/* global _ amp gettext registerTranscriptsAmpPlugin runtime */
 
 
+// Lazily initialized players start loading a bit before they scroll into view:
+var LAZY_LOAD_ROOT_MARGIN = '200px';
+// Playback tokens are replaced this long (seconds) before they expire, and retried this often on failure:
+var PLAYBACK_TOKEN_REFRESH_LEAD = 60;
+var PLAYBACK_TOKEN_RETRY_DELAY = 15;
+
 var events = {
     PLAYED: 'edx.video.played',
     PAUSED: 'edx.video.paused',
@@ -18,22 +24,352 @@ var events = {
 
 
 /**
- * Send events back to server-side xBlock
- * @param eventPostUrl
+ * Buffer of player events which are sent back to server-side xBlock in batches.
+ * The buffer is flushed on a short interval, as soon as `maxSize` events are buffered and on page hide.
+ * @param send function(batch, isUnloading) performing the actual sending
+ * @param options {Object} `maxSize`, `flushInterval` (ms)
+ * @constructor
+ */
+function PlayerEventsQueue(send, options) {
+    'use strict';
+    this.send = send;
+    this.maxSize = options.maxSize || 20;
+    this.flushInterval = options.flushInterval || 3000;
+    this.batch = [];
+    this.timer = null;
+}
+
+/**
+ * Buffer an event along with its client timestamp.
  * @param name
  * @param data
- * @param userIsAuthenticated
  */
-function sendPlayerEvent(eventPostUrl, name, data, userIsAuthenticated) {
+PlayerEventsQueue.prototype.push = function(name, data) {
+    'use strict';
+    var self = this;
+    this.batch.push({event_type: name, data: data || {}, timestamp: new Date().toISOString()});
+    if (this.batch.length >= this.maxSize) {
+        this.flush(false);
+    } else if (this.timer === null) {
+        this.timer = setTimeout(function() { self.flush(false); }, this.flushInterval);
+    }
+};
+
+/**
+ * Send all the buffered events.
+ * @param isUnloading whether the page is going away
+ */
+PlayerEventsQueue.prototype.flush = function(isUnloading) {
     'use strict';
-    if (userIsAuthenticated) {
-        data.event_type = name;  // eslint-disable-line no-param-reassign
-        $.ajax({
-            type: 'POST',
-            url: eventPostUrl,
-            data: JSON.stringify(data)
+    var batch = this.batch;
+    if (this.timer !== null) {
+        clearTimeout(this.timer);
+        this.timer = null;
+    }
+    if (batch.length) {
+        this.batch = [];
+        this.send(batch, !!isUnloading);
+    }
+};
+
+
+/**
+ * Tracker of the parts of the video watched: contiguous playback is collected into `[start, end]` intervals
+ * (seconds) which are sent back to server-side xBlock every `interval` ms while playing and on pause.
+ * @param send function(intervals, isUnloading) performing the actual sending
+ * @param options {Object} `interval` (ms), `maxStep` (s) - larger position changes are seeks, not playback
+ * @constructor
+ */
+function WatchTracker(send, options) {
+    'use strict';
+    this.send = send;
+    this.interval = options.interval;
+    this.maxStep = options.maxStep || 2;
+    this.pending = [];
+    this.current = null;
+    this.timer = null;
+}
+
+/**
+ * Record playback position (called on `timeupdate` while playing).
+ * @param time
+ */
+WatchTracker.prototype.update = function(time) {
+    'use strict';
+    var self = this;
+    if (this.current && time >= this.current[1] && time - this.current[1] <= this.maxStep) {
+        this.current[1] = time;
+    } else {
+        this.stop();
+        this.current = [time, time];
+    }
+    if (this.timer === null) {
+        this.timer = setTimeout(function() { self.flush(false); }, this.interval);
+    }
+};
+
+/**
+ * Close the interval being watched (on pause, seek or end).
+ */
+WatchTracker.prototype.stop = function() {
+    'use strict';
+    if (this.current && this.current[1] > this.current[0]) {
+        this.pending.push(this.current);
+    }
+    this.current = null;
+};
+
+/**
+ * Send the intervals watched since the previous flush.
+ * @param isUnloading whether the page is going away
+ */
+WatchTracker.prototype.flush = function(isUnloading) {
+    'use strict';
+    var intervals = this.pending;
+    if (this.timer !== null) {
+        clearTimeout(this.timer);
+        this.timer = null;
+    }
+    if (this.current && this.current[1] > this.current[0]) {
+        intervals.push(this.current);
+        // Playback goes on from where the sent interval ends:
+        this.current = [this.current[1], this.current[1]];
+    }
+    this.pending = [];
+    if (intervals.length) {
+        this.send(intervals, !!isUnloading);
+    }
+};
+
+
+/**
+ * Keeper of protected player's playback token: until the playback starts, the token is replaced with
+ * a fresh one (from `fetch`) shortly before it expires, so a page left open for a while still plays.
+ * @param fetch function() returning a jQuery promise of `{token, expires_in}` (seconds)
+ * @param apply function(token) setting the player's source up with the token
+ * @param expiresIn seconds the token rendered into the page is valid for (0 if there's none)
+ * @constructor
+ */
+function PlaybackTokenRefresher(fetch, apply, expiresIn) {
+    'use strict';
+    this.fetch = fetch;
+    this.apply = apply;
+    this.refreshAt = PlaybackTokenRefresher.getRefreshTime(expiresIn);
+    this.timer = null;
+    this.isStopped = false;
+}
+
+/**
+ * Time (ms since the epoch) a token valid for `expiresIn` seconds from now is to be replaced at.
+ * @param expiresIn
+ * @returns {Number}
+ */
+PlaybackTokenRefresher.getRefreshTime = function(expiresIn) {
+    'use strict';
+    return Date.now() + Math.max((expiresIn || 0) - PLAYBACK_TOKEN_REFRESH_LEAD, 0) * 1000;
+};
+
+/**
+ * Start keeping the token fresh (once the player is built).
+ * @param onReady function() called as soon as the player has a usable token (or fetching one has failed)
+ */
+PlaybackTokenRefresher.prototype.start = function(onReady) {
+    'use strict';
+    if (Date.now() >= this.refreshAt) {
+        this.refresh(onReady);
+    } else {
+        this.schedule(this.refreshAt - Date.now());
+        onReady();
+    }
+};
+
+/**
+ * Replace the token with a fresh one.
+ * @param onDone optional function() called once the attempt is over
+ */
+PlaybackTokenRefresher.prototype.refresh = function(onDone) {
+    'use strict';
+    var self = this;
+    this.timer = null;
+    this.fetch()
+        .done(function(response) {
+            if (!self.isStopped) {
+                self.apply(response.token);
+                self.refreshAt = PlaybackTokenRefresher.getRefreshTime(response.expires_in);
+                self.schedule(self.refreshAt - Date.now());
+            }
+        })
+        .fail(function() {
+            self.schedule(PLAYBACK_TOKEN_RETRY_DELAY * 1000);
+        })
+        .always(function() {
+            if (onDone) {
+                onDone();
+            }
+        });
+};
+
+PlaybackTokenRefresher.prototype.schedule = function(delay) {
+    'use strict';
+    var self = this;
+    if (this.isStopped) return;
+    clearTimeout(this.timer);
+    this.timer = setTimeout(function() { self.refresh(); }, Math.max(delay, 0));
+};
+
+/**
+ * Stop replacing the token: the playback has started with the current one.
+ */
+PlaybackTokenRefresher.prototype.stop = function() {
+    'use strict';
+    this.isStopped = true;
+    clearTimeout(this.timer);
+    this.timer = null;
+};
+
+
+/**
+ * Return CSRF token from the cookie LMS sets it in (as LMS's own scripts do)
+ * @returns {string}
+ */
+function getCsrfToken() {
+    'use strict';
+    var match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]*)/);
+    return match ? decodeURIComponent(match[1]) : '';
+}
+
+
+/**
+ * POST JSON data to server-side xBlock handler
+ * @param url
+ * @param data
+ * @param isUnloading whether the page is going away
+ */
+function postToHandler(url, data, isUnloading) {
+    'use strict';
+    var payload = JSON.stringify(data);
+    // Regular XHR may be cancelled when the page is being unloaded, `keepalive` requests are delivered anyway.
+    // Unlike XHR, they don't get the CSRF header from `$.ajaxSetup`, so it's set here:
+    if (isUnloading && window.fetch) {
+        window.fetch(url, {
+            method: 'POST',
+            body: payload,
+            keepalive: true,
+            credentials: 'same-origin',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': getCsrfToken()}
         });
+        return;
+    }
+    $.ajax({
+        type: 'POST',
+        url: url,
+        data: payload
+    });
+}
+
+
+/**
+ * Send batch of events back to server-side xBlock
+ * @param eventsPostUrl
+ * @param batch
+ * @param isUnloading
+ */
+function sendPlayerEvents(eventsPostUrl, batch, isUnloading) {
+    'use strict';
+    postToHandler(eventsPostUrl, {events: batch}, isUnloading);
+}
+
+
+/**
+ * Get transcripts served by xBlock's `transcript` handler instead of the storage.
+ * @param runtime
+ * @param container
+ * @param transcripts
+ * @returns {Array}
+ */
+function getTranscripts(runtime, container, transcripts) {
+    'use strict';
+    return transcripts.map(function(transcript) {
+        return $.extend({}, transcript, {src: runtime.handlerUrl(container, 'transcript', transcript.srclang)});
+    });
+}
+
+
+/**
+ * Get start time deep-linked to the block with `#t=<seconds>&block=<usage id>` URL hash
+ * (e.g. by a transcript search result).
+ * @param hash location hash
+ * @param usageId the block's usage id
+ * @returns {Number|null} seconds or null if the hash doesn't link to the block
+ */
+function getDeepLinkedTime(hash, usageId) {
+    'use strict';
+    var params = {};
+    var time;
+    (hash || '').replace(/^#/, '').split('&').forEach(function(pair) {
+        var parts = pair.split('=');
+        try {
+            params[decodeURIComponent(parts[0])] = decodeURIComponent(parts.slice(1).join('='));
+        } catch (error) {
+            // Malformed escapes aren't ours anyway.
+        }
+    });
+    if (!usageId || params.block !== usageId) {
+        return null;
     }
+    time = parseFloat(params.t);
+    return isNaN(time) || time < 0 ? null : time;
+}
+
+
+/**
+ * Load Azure Media Player's script and stylesheet, once per page: all the blocks share the promise.
+ * @param urls {Object} `js` and `css` URLs
+ * @returns {Promise} resolved once `amp` is available
+ */
+function loadAzureMediaPlayer(urls) {
+    'use strict';
+    if (!loadAzureMediaPlayer.promise) {
+        if (typeof amp !== 'undefined') {
+            loadAzureMediaPlayer.promise = $.Deferred().resolve().promise();
+        } else {
+            $('<link rel="stylesheet" type="text/css">').attr('href', urls.css).appendTo('head');
+            loadAzureMediaPlayer.promise = $.ajax({url: urls.js, dataType: 'script', cache: true})
+                .fail(function() {
+                    // Let the next attempt (e.g. a click on the placeholder) retry:
+                    loadAzureMediaPlayer.promise = null;
+                });
+        }
+    }
+    return loadAzureMediaPlayer.promise;
+}
+
+
+/**
+ * Call `callback` once, as soon as the element is about to scroll into view.
+ * Without IntersectionObserver support it's called right away.
+ * @param element
+ * @param callback
+ * @returns {Function} stops observing
+ */
+function observeViewport(element, callback) {
+    'use strict';
+    var observer;
+    if (typeof window.IntersectionObserver === 'undefined') {
+        callback();
+        return function() {};
+    }
+    observer = new window.IntersectionObserver(function(entries) {
+        var isIntersecting = entries.some(function(entry) { return entry.isIntersecting; });
+        if (isIntersecting) {
+            observer.disconnect();
+            callback();
+        }
+    }, {rootMargin: LAZY_LOAD_ROOT_MARGIN});
+    observer.observe(element);
+    return function() {
+        observer.disconnect();
+    };
 }
 
 
@@ -49,70 +385,35 @@ function AzureMediaServicesBlock(runtime, container, jsonArgs) {
     // IMPORTANT: We pass the <video> DOM element instead of its class or id. This mitigates
     //  a bug when switching units. Changing units triggers a "partial navigation" which
     //  entirely removes the xblock markup from the DOM.
-    var downloadMediaList = [];
-    var langSource;
     var $sharePopup = $(container).find('.js-share-popup');
     var $ddlSizeEmbed = $(container).find('#ddlSizeEmbed');
     var $txtContentEmbed = $(container).find('#txtContentEmbed');
+    var $video = $(container).find('.xblock-video-amp');
+    var $placeholder = $(container).find('.js-amp-placeholder');
+    var transcripts = getTranscripts(runtime, container, jsonArgs.transcripts);
+    var eventsPostUrl = runtime.handlerUrl(container, 'publish_events');
+    var eventsQueue = new PlayerEventsQueue(function(batch, isUnloading) {
+        sendPlayerEvents(eventsPostUrl, batch, isUnloading);
+    }, {});
+    var watchProgressUrl = runtime.handlerUrl(container, 'watch_progress');
+    var watchTracker = null;
+    var deepLinkedTime = getDeepLinkedTime(window.location.hash, $(container).attr('data-usage-id'));
+    var isStarted = false;
+    var isPlayRequested = false;
+    var stopObserving;
 
-    var player = amp($(container).find('.xblock-video-amp')[0], null, function() { // eslint-disable-line no-unused-vars
-        var subtitleEls;
-        var languageName;
-        var eventPostUrl = runtime.handlerUrl(container, 'publish_event');
-        var userIsAuthenticated = jsonArgs.user_is_authenticated;
-
-        // Add event handlers:
-        this.addEventListener(amp.eventName.pause,
-            function() {
-                sendPlayerEvent(eventPostUrl, events.PAUSED, {}, userIsAuthenticated);
-            }
-        );
-
-        this.addEventListener(amp.eventName.play,
-            function() {
-                sendPlayerEvent(eventPostUrl, events.PLAYED, {}, userIsAuthenticated);
-            }
-        );
-
-        this.addEventListener(amp.eventName.loadeddata,
-            function() {
-                sendPlayerEvent(eventPostUrl, events.VIDEO_LOADED, {}, userIsAuthenticated);
-            }
-        );
-
-        this.addEventListener(amp.eventName.seeked,
-            function() {
-                sendPlayerEvent(eventPostUrl, events.POSITION_CHANGED, {}, userIsAuthenticated);
-            }
-        );
-
-        this.addEventListener(amp.eventName.ended,
-            function() {
-                sendPlayerEvent(eventPostUrl, events.STOPPED, {}, userIsAuthenticated);
-            }
-        );
-
-        // Log when closed captions (subtitles) are toggled.
-        // NOTE we use classes from Azure Media Player which may change.
-        subtitleEls = $(container).find('.vjs-subtitles-button .vjs-menu-item');
-
-        subtitleEls.mousedown(function(evt) {
-            var reportEvent = events.CAPTIONS_SHOWN;
-            // TODO: we should attach to a different event.
-            // For example, this can also be toggled via keyboard.
-            languageName = $(evt.target).html();
-            if (languageName === 'Off') {
-                reportEvent = events.CAPTIONS_HIDDEN;
-                languageName = '';
-            }
-
-            sendPlayerEvent(eventPostUrl, reportEvent, {language_name: languageName}, userIsAuthenticated);
-        });
-    });
-
-    player.transcriptsAmpPlugin({hidden: !jsonArgs.transcripts_enabled});
+    /**
+     * Queue event to be sent back to server-side xBlock
+     * @param name
+     * @param data
+     */
+    function sendPlayerEvent(name, data) {
+        if (jsonArgs.user_is_authenticated) {
+            eventsQueue.push(name, data);
+        }
+    }
 
-     /**
+    /**
      * Create a value for the txtContentEmbed field
      */
     function getContentEmbed() {
@@ -131,6 +432,205 @@ function AzureMediaServicesBlock(runtime, container, jsonArgs) {
         return iframeEmbed;
     }
 
+    /**
+     * Build Azure Media Player instance along with its plugins and downloadable media.
+     */
+    function initPlayer() {
+        var downloadMediaList = [];
+        var langSource;
+        var player;
+
+        // AMP may have been loaded after the plugin's code (lazily or by another block):
+        registerTranscriptsAmpPlugin();
+
+        player = amp($video[0], $video.data('lazy-setup') || null, function() {
+            var ampPlayer = this;
+            var subtitleEls;
+            var languageName;
+            var tokenRefresher = null;
+
+            function onSourceReady() {
+                if (deepLinkedTime !== null) {
+                    ampPlayer.currentTime(deepLinkedTime);
+                }
+                // The learner has clicked the placeholder, don't make them click again:
+                if (isPlayRequested) {
+                    ampPlayer.play();
+                }
+            }
+
+            if (jsonArgs.protection) {
+                tokenRefresher = new PlaybackTokenRefresher(
+                    function() {
+                        return $.ajax({url: runtime.handlerUrl(container, 'playback_token'), dataType: 'json'});
+                    },
+                    function(token) {
+                        ampPlayer.src([{
+                            src: jsonArgs.protection.src,
+                            type: 'application/vnd.ms-sstr+xml',
+                            protectionInfo: [{
+                                type: jsonArgs.protection.type,
+                                authenticationToken: 'Bearer=' + token
+                            }]
+                        }]);
+                        if (deepLinkedTime !== null) {
+                            ampPlayer.currentTime(deepLinkedTime);
+                        }
+                    },
+                    jsonArgs.protection.expires_in
+                );
+                this.addEventListener(amp.eventName.play, function() {
+                    tokenRefresher.stop();
+                });
+                // The token rendered into the page may have expired by now (e.g. lazy player):
+                tokenRefresher.start(onSourceReady);
+            } else {
+                onSourceReady();
+            }
+
+            if (jsonArgs.watch_heartbeat_interval) {
+                watchTracker = new WatchTracker(function(intervals, isUnloading) {
+                    postToHandler(watchProgressUrl, {
+                        intervals: intervals,
+                        duration: ampPlayer.duration()
+                    }, isUnloading);
+                }, {interval: jsonArgs.watch_heartbeat_interval * 1000});
+                this.addEventListener(amp.eventName.timeupdate, function() {
+                    if (!ampPlayer.paused() && !ampPlayer.seeking()) {
+                        watchTracker.update(ampPlayer.currentTime());
+                    }
+                });
+                this.addEventListener(amp.eventName.seeking, function() {
+                    watchTracker.stop();
+                });
+                this.addEventListener(amp.eventName.pause, function() {
+                    watchTracker.stop();
+                    watchTracker.flush(false);
+                });
+            }
+
+            // Add event handlers:
+            this.addEventListener(amp.eventName.pause,
+                function() {
+                    sendPlayerEvent(events.PAUSED, {});
+                }
+            );
+
+            this.addEventListener(amp.eventName.play,
+                function() {
+                    sendPlayerEvent(events.PLAYED, {});
+                }
+            );
+
+            this.addEventListener(amp.eventName.loadeddata,
+                function() {
+                    sendPlayerEvent(events.VIDEO_LOADED, {});
+                }
+            );
+
+            this.addEventListener(amp.eventName.seeked,
+                function() {
+                    sendPlayerEvent(events.POSITION_CHANGED, {});
+                }
+            );
+
+            this.addEventListener(amp.eventName.ended,
+                function() {
+                    sendPlayerEvent(events.STOPPED, {});
+                }
+            );
+
+            // Log when closed captions (subtitles) are toggled.
+            // NOTE we use classes from Azure Media Player which may change.
+            subtitleEls = $(container).find('.vjs-subtitles-button .vjs-menu-item');
+
+            subtitleEls.mousedown(function(evt) {
+                var reportEvent = events.CAPTIONS_SHOWN;
+                // TODO: we should attach to a different event.
+                // For example, this can also be toggled via keyboard.
+                languageName = $(evt.target).html();
+                if (languageName === 'Off') {
+                    reportEvent = events.CAPTIONS_HIDDEN;
+                    languageName = '';
+                }
+
+                sendPlayerEvent(reportEvent, {language_name: languageName});
+            });
+        });
+
+        player.transcriptsAmpPlugin({
+            hidden: !jsonArgs.transcripts_enabled,
+            cuesUrl: function(language) {
+                return runtime.handlerUrl(container, 'transcript_cues', language);
+            },
+            prefetched: jsonArgs.transcript_prefetch
+        });
+
+        // Do not perform further media download processing if disabled:
+        if (!jsonArgs.assets_download) return;
+
+        // xBlock's Studio editor has switch control for transcripts download button:
+        if (jsonArgs.transcripts_enabled) {
+            for (var i = 0; i < transcripts.length; i++) { // eslint-disable-line vars-on-top
+                downloadMediaList.push({
+                    lang: transcripts[i].srclang,
+                    type: amp.downloadableMediaType.transcript,
+                    uri: transcripts[i].src
+                });
+            }
+        }
+
+        langSource = downloadMediaList.length
+            ? downloadMediaList.slice()
+            : [{lang: player.language()}];
+
+        // Here we take care video download is available for all presented locales:
+        langSource.forEach(function(media) {
+            downloadMediaList.push({
+                lang: media.lang,
+                type: amp.downloadableMediaType.video,
+                uri: jsonArgs.video_download_uri
+            });
+        });
+
+        player.downloadableMedia(downloadMediaList);
+    }
+
+    /**
+     * Load AMP (unless it's on the page already) and swap the placeholder for the player.
+     */
+    function startLazyPlayer() {
+        if (isStarted) return;
+        isStarted = true;
+        // Not assigned yet if the viewport can't be observed and the player is started right away:
+        if (stopObserving) {
+            stopObserving();
+        }
+        $placeholder.addClass('is-loading');
+        loadAzureMediaPlayer(jsonArgs.amp_urls)
+            .done(function() {
+                $placeholder.remove();
+                $video.removeClass('amp-lazy-pending');
+                initPlayer();
+            })
+            .fail(function() {
+                isStarted = false;
+                $placeholder.removeClass('is-loading');
+            });
+    }
+
+    $(window).on('pagehide', function() {
+        eventsQueue.flush(true);
+        if (watchTracker) {
+            watchTracker.flush(true);
+        }
+    });
+
+    // Point text tracks to the xBlock's transcript endpoint (cacheable, same origin) before the player reads them:
+    $video.find('track').each(function() {
+        $(this).attr('src', runtime.handlerUrl(container, 'transcript', $(this).attr('srclang')));
+    });
+
     $(container).find('.js-share-button').on('click', function(event) {
         event.preventDefault();
         $sharePopup.toggleClass('is-hidden');
@@ -143,32 +643,15 @@ function AzureMediaServicesBlock(runtime, container, jsonArgs) {
         $txtContentEmbed.val(getContentEmbed());
     });
 
-    // Do not perform further media download processing if disabled:
-    if (!jsonArgs.assets_download) return;
-
-    // xBlock's Studio editor has switch control for transcripts download button:
-    if (jsonArgs.transcripts_enabled) {
-        for (var i = 0; i < jsonArgs.transcripts.length; i++) { // eslint-disable-line vars-on-top
-            downloadMediaList.push({
-                lang: jsonArgs.transcripts[i].srclang,
-                type: amp.downloadableMediaType.transcript,
-                uri: jsonArgs.transcripts[i].src
-            });
-        }
-    }
-
-    langSource = downloadMediaList.length
-        ? downloadMediaList.slice()
-        : [{lang: player.language()}];
-
-    // Here we take care video download is available for all presented locales:
-    langSource.forEach(function(media) {
-        downloadMediaList.push({
-            lang: media.lang,
-            type: amp.downloadableMediaType.video,
-            uri: jsonArgs.video_download_uri
+    if (jsonArgs.lazy_load) {
+        // Player is built once the block is about to scroll into view or the learner clicks the placeholder:
+        $placeholder.on('click', function(event) {
+            event.preventDefault();
+            isPlayRequested = true;
+            startLazyPlayer();
         });
-    });
-
-    player.downloadableMedia(downloadMediaList);
+        stopObserving = observeViewport(container, startLazyPlayer);
+    } else {
+        initPlayer();
+    }
 }
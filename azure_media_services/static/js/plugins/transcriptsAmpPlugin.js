@@ -1,12 +1,25 @@
 // Copyright (c) Microsoft Corporation. All Rights Reserved.
 // Licensed under the MIT license. See LICENSE file on the project webpage for details.
 
-/* global _ amp gettext */
+/* global _ amp gettext TranscriptSync */
 
-(function() {
+/**
+ * Register the transcripts plugin with Azure Media Player, once.
+ * AMP may be loaded lazily, after this file: the player calls it before building each player.
+ */
+function registerTranscriptsAmpPlugin() {
     'use strict';
+    if (!registerTranscriptsAmpPlugin.isRegistered) {
+        registerTranscriptsAmpPlugin.isRegistered = true;
+        defineTranscriptsAmpPlugin();  // eslint-disable-line no-use-before-define
+    }
+}
 
-    var transcriptCues = null;
+/**
+ * Define the plugin's components and the plugin itself (`amp` has to be loaded).
+ */
+function defineTranscriptsAmpPlugin() {
+    'use strict';
 
     var Component = amp.getComponent('Component');
     var MenuItem = amp.getComponent('MenuItem');
@@ -23,6 +36,7 @@
         },
         handleClick: function(evt) {  // eslint-disable-line no-unused-vars
             var player = this.player();
+            var track = this.track;
             var $wrapper = $('div.tc-wrapper');
             var $transcriptContainer = $('div.tc-container');
 
@@ -34,9 +48,12 @@
             if (this.options_.identity === 'off') {  // eslint-disable-line no-underscore-dangle
                 $wrapper.addClass('closed');
             } else {
-                transcriptCues = initTranscript(  // eslint-disable-line no-use-before-define
-                    player, $transcriptContainer, this.track
-                );
+                loadCues(player, this.track).done(function(cues) {  // eslint-disable-line no-use-before-define
+                    player.transcriptSync = initTranscript(  // eslint-disable-line no-use-before-define
+                        player, $transcriptContainer, cues, track.language
+                    );
+                    player.transcriptSync.update(player.currentTime());
+                });
                 $wrapper.removeClass('closed');
             }
         }
@@ -122,12 +139,23 @@
     amp.registerComponent('TranscriptsMenuButton', TranscriptsMenuButton);
     amp.plugin('transcriptsAmpPlugin', function(options) {
         var player = this;
-        var timeHandler = null;
         var $vidParent = $(player.el()).parent().parent();
         var tcButton = new TranscriptsMenuButton(player, {title: 'TRANSCRIPTS'});
         var mainContainer = new MainContainer(player, {});
         var transcriptContainer = new TranscriptContainer(player, {});
-        var $transcriptContainerEl = $(transcriptContainer.el());
+        var syncTranscript = function() {
+            if (player.transcriptSync) {
+                player.transcriptSync.update(player.currentTime());
+            }
+        };
+
+        // Ready-to-use cue indexes parsed server-side, see `loadCues`:
+        player.transcriptCuesUrl = options.cuesUrl;
+        player.transcriptCueIndexes = {};
+        // Default-language cue index embedded into the page (if it's been cached server-side) saves a request:
+        if (options.prefetched) {
+            player.transcriptCueIndexes[options.prefetched.lang] = cuesFromIndex(options.prefetched.cues);
+        }
 
         this.addEventListener('loadeddata', function() {
             $vidParent.wrap(mainContainer.el());
@@ -140,88 +168,70 @@
                     .addChild(tcButton);
             }
         });
-        this.addEventListener(amp.eventName.play, function(evt) {  // eslint-disable-line no-unused-vars
-            timeHandler = setInterval(function() {
-                syncTimer(player, transcriptCues, $transcriptContainerEl);  // eslint-disable-line no-use-before-define
-            },
-            100
-            );
-        });
-        this.addEventListener(amp.eventName.pause, function(evt) {  // eslint-disable-line no-unused-vars
-            if (timeHandler !== null) {
-                clearInterval(timeHandler);
-            }
-        });
-        this.addEventListener(amp.eventName.ended, function(evt) {  // eslint-disable-line no-unused-vars
-            if (timeHandler !== null) {
-                clearInterval(timeHandler);
-            }
-        });
+        // Highlighting follows the playback position, no polling is needed:
+        this.addEventListener(amp.eventName.timeupdate, syncTranscript);
+        this.addEventListener(amp.eventName.seeked, syncTranscript);
     });
 
-     /**
-     * This is called regularly while the video plays
-     * so that we can correctly highlight the transcript elements
-     * based on the current position of the video playback
-     * @param player
-     * @param trackCues
-     * @param $transcriptElement
-     * @private
+    /**
+     * Convert compact cue index (parallel `start`, `end` and `text` arrays) into list of cues.
+     * @param index
+     * @returns {Array}
      */
-    function syncTimer(player, trackCues, $transcriptElement) {
-        // Gather each transcript phrase (each pseudo-hyperlink in transcript).
-        var cue;
-        var isActive;
-        var $targetElement;
-        var scrollUpSize;
-        var $transcriptItems = $transcriptElement.find('.transcript-cue');
-        var currentTime = player.currentTime();
-
-        if (trackCues === null || !$transcriptElement.length) {
-            return;
+    function cuesFromIndex(index) {
+        var cues = [];
+        for (var i = 0; i < index.start.length; i++) {  // eslint-disable-line vars-on-top
+            cues.push({startTime: index.start[i], endTime: index.end[i], text: index.text[i]});
         }
+        return cues;
+    }
 
-        // Simple linear search.
-        for (var i = 0; i < trackCues.length; i++) {  // eslint-disable-line vars-on-top
-            cue = trackCues[i];
-
-            if (currentTime >= cue.startTime && currentTime < cue.endTime) {
-                $targetElement = $transcriptItems.eq(i);
-
-                isActive = $targetElement.hasClass('current');
-                if (!isActive) {
-                    // Highlight the correct one
-                    $transcriptItems.removeClass('current');
-                    $targetElement.addClass('current');
+    /**
+     * Load track's cues: prefer the index parsed server-side, fall back to the cues parsed by the player.
+     * @param player
+     * @param track
+     * @returns {Promise}
+     */
+    function loadCues(player, track) {
+        var deferred = $.Deferred();
+        var indexes = player.transcriptCueIndexes;
+        var fallback = function() {
+            deferred.resolve(Array.prototype.slice.call(track.cues || []).sort(function(a, b) {
+                return a.startTime - b.startTime;
+            }));
+        };
 
-                    // Autoscroll.
-                    scrollUpSize = Math.abs(
-                        $transcriptElement.offset().top - $transcriptItems.first().offset().top
-                    ) + (
-                        $targetElement.offset().top - $transcriptElement.offset().top
-                    );
-                    $transcriptElement.scrollTo(scrollUpSize, 1000);
-                }
-                return;
-            }
+        if (indexes && indexes[track.language]) {
+            deferred.resolve(indexes[track.language]);
+        } else if (player.transcriptCuesUrl) {
+            $.getJSON(player.transcriptCuesUrl(track.language))
+                .done(function(index) {
+                    indexes[track.language] = cuesFromIndex(index);
+                    deferred.resolve(indexes[track.language]);
+                })
+                .fail(fallback);
+        } else {
+            fallback();
         }
+        return deferred.promise();
     }
 
     /**
      * Transcripts creating.
      * @param player
      * @param $transcriptElement
-     * @param track
-     * @returns {Array}
+     * @param cues
+     * @param language
+     * @returns {TranscriptSync}
      */
-    function initTranscript(player, $transcriptElement, track) {
+    function initTranscript(player, $transcriptElement, cues, language) {
         var cue;
         var cueComponent;
         var startTime;
         var $transcriptItems;
-        var cues = track.cues;
+        var sync;
         var $html = $('<ul class="subtitles-menu"></ul>');
-        if (track.language === 'ar') {
+        if (language === 'ar') {
             $html = $('<ul class="subtitles-menu" style="text-align:right;"></ul>');
         }
         for (var i = 0; i < cues.length; i++) { // eslint-disable-line vars-on-top
@@ -235,8 +245,13 @@
         }
         $transcriptElement.html($html);
 
-        // Gather each transcript phrase (each pseudo-hyperlink in transcript).
+        // Gather each transcript phrase (each pseudo-hyperlink in transcript) once.
         $transcriptItems = $transcriptElement.find('.transcript-cue');
+        sync = new TranscriptSync({
+            cues: cues,
+            items: $transcriptItems.get(),
+            container: $transcriptElement.get(0)
+        });
 
         // Handle events when user clicks on transcripts
         $transcriptItems.on('click keypress', function(evt) {
@@ -248,17 +263,16 @@
                 evt.preventDefault();
             }
 
-            // Clear all active
-            $transcriptItems.removeClass('current');
-
-            // Highlight the one the user clicked.
-            $(evt.target).addClass('current');
-
-            // Set the player to match the transcript time
+            // Set the player to match the transcript time and highlight the clicked cue
             startTime = parseFloat($(evt.target).data('cue-start'));
             player.currentTime(startTime);
+            sync.update(startTime);
         });
 
-        return cues;
+        return sync;
     }
-}).call(this);
+}
+
+if (typeof amp !== 'undefined') {
+    registerTranscriptsAmpPlugin();
+}
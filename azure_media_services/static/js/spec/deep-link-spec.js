@@ -0,0 +1,26 @@
+/**
+ * Tests for deep links into the player
+ */
+/* global getDeepLinkedTime */
+
+describe('getDeepLinkedTime', function() {
+    'use strict';
+
+    var usageId = 'block-v1:org+course+run+type@azure_media_services+block@video';
+
+    it('returns time linked to the block', function() {
+        expect(getDeepLinkedTime('#t=42.5&block=' + encodeURIComponent(usageId), usageId)).toEqual(42.5);
+        expect(getDeepLinkedTime('#block=' + usageId + '&t=7', usageId)).toEqual(7);
+    });
+
+    it('ignores links to other blocks', function() {
+        expect(getDeepLinkedTime('#t=42&block=other', usageId)).toBe(null);
+        expect(getDeepLinkedTime('#t=42', usageId)).toBe(null);
+        expect(getDeepLinkedTime('', usageId)).toBe(null);
+    });
+
+    it('ignores malformed time', function() {
+        expect(getDeepLinkedTime('#t=soon&block=' + usageId, usageId)).toBe(null);
+        expect(getDeepLinkedTime('#t=-1&block=' + usageId, usageId)).toBe(null);
+    });
+});
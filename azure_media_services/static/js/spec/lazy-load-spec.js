@@ -0,0 +1,55 @@
+/**
+ * Tests for lazy player initialization
+ */
+/* global observeViewport */
+
+describe('observeViewport', function() {
+    'use strict';
+
+    var originalObserver = window.IntersectionObserver;
+    var observers;
+
+    function FakeObserver(callback, options) {
+        this.callback = callback;
+        this.options = options;
+        this.disconnected = false;
+        observers.push(this);
+    }
+    FakeObserver.prototype.observe = function(element) {
+        this.element = element;
+    };
+    FakeObserver.prototype.disconnect = function() {
+        this.disconnected = true;
+    };
+
+    beforeEach(function() {
+        observers = [];
+    });
+
+    afterEach(function() {
+        window.IntersectionObserver = originalObserver;
+    });
+
+    it('calls back once the element is about to scroll into view', function() {
+        var element = {};
+        var calls = 0;
+        window.IntersectionObserver = FakeObserver;
+
+        observeViewport(element, function() { calls += 1; });
+        expect(observers[0].element).toBe(element);
+        observers[0].callback([{isIntersecting: false}]);
+        expect(calls).toEqual(0);
+
+        observers[0].callback([{isIntersecting: true}]);
+        expect(calls).toEqual(1);
+        expect(observers[0].disconnected).toBe(true);
+    });
+
+    it('calls back right away without IntersectionObserver', function() {
+        var calls = 0;
+        window.IntersectionObserver = undefined;
+
+        observeViewport({}, function() { calls += 1; });
+        expect(calls).toEqual(1);
+    });
+});
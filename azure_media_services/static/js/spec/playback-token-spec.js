@@ -0,0 +1,105 @@
+/**
+ * Tests for PlaybackTokenRefresher
+ */
+/* global PlaybackTokenRefresher */
+
+describe('PlaybackTokenRefresher', function() {
+    'use strict';
+
+    var applied;
+    var fetches;
+
+    // Stand-in for jqXHR, settled synchronously:
+    function settled(isSuccessful, response) {
+        var promise = {
+            done: function(callback) {
+                if (isSuccessful) callback(response);
+                return promise;
+            },
+            fail: function(callback) {
+                if (!isSuccessful) callback();
+                return promise;
+            },
+            always: function(callback) {
+                callback();
+                return promise;
+            }
+        };
+        return promise;
+    }
+
+    function fetchSucceeding() {
+        fetches += 1;
+        return settled(true, {token: 'token-' + fetches, expires_in: 3600});
+    }
+
+    function apply(token) {
+        applied.push(token);
+    }
+
+    beforeEach(function() {
+        applied = [];
+        fetches = 0;
+        jasmine.clock().install();
+        jasmine.clock().mockDate(new Date(2018, 0, 1));
+    });
+
+    afterEach(function() {
+        jasmine.clock().uninstall();
+    });
+
+    it('keeps the rendered token until shortly before it expires', function() {
+        var readyCalls = 0;
+        var refresher = new PlaybackTokenRefresher(fetchSucceeding, apply, 600);
+
+        refresher.start(function() { readyCalls += 1; });
+        expect(readyCalls).toEqual(1);
+        expect(fetches).toEqual(0);
+
+        jasmine.clock().tick(539 * 1000);
+        expect(fetches).toEqual(0);
+        jasmine.clock().tick(1000);
+        expect(applied).toEqual(['token-1']);
+
+        jasmine.clock().tick(3540 * 1000);
+        expect(applied).toEqual(['token-1', 'token-2']);
+    });
+
+    it('fetches a token before calling back if the rendered one is about to expire', function() {
+        var readyCalls = 0;
+        var refresher = new PlaybackTokenRefresher(fetchSucceeding, apply, 30);
+
+        refresher.start(function() {
+            readyCalls += 1;
+            expect(applied).toEqual(['token-1']);
+        });
+        expect(readyCalls).toEqual(1);
+    });
+
+    it('retries failed fetches', function() {
+        var isFailing = true;
+        var refresher = new PlaybackTokenRefresher(function() {
+            fetches += 1;
+            return settled(!isFailing, {token: 'fresh', expires_in: 3600});
+        }, apply, 0);
+
+        refresher.start(function() {});
+        expect(fetches).toEqual(1);
+        expect(applied).toEqual([]);
+
+        isFailing = false;
+        jasmine.clock().tick(15 * 1000);
+        expect(fetches).toEqual(2);
+        expect(applied).toEqual(['fresh']);
+    });
+
+    it('leaves the token alone once stopped', function() {
+        var refresher = new PlaybackTokenRefresher(fetchSucceeding, apply, 600);
+
+        refresher.start(function() {});
+        refresher.stop();
+        jasmine.clock().tick(3600 * 1000);
+        expect(fetches).toEqual(0);
+        expect(applied).toEqual([]);
+    });
+});
@@ -0,0 +1,54 @@
+/**
+ * Tests for player events batching
+ */
+/* global PlayerEventsQueue */
+
+describe('PlayerEventsQueue', function() {
+    'use strict';
+
+    var sent;
+    var queue;
+
+    beforeEach(function() {
+        jasmine.clock().install();
+        sent = [];
+        queue = new PlayerEventsQueue(function(batch, isUnloading) {
+            sent.push({batch: batch, isUnloading: isUnloading});
+        }, {maxSize: 3, flushInterval: 1000});
+    });
+
+    afterEach(function() {
+        jasmine.clock().uninstall();
+    });
+
+    it('flushes on interval', function() {
+        queue.push('edx.video.played', {});
+        queue.push('edx.video.paused', {});
+        expect(sent.length).toEqual(0);
+
+        jasmine.clock().tick(1001);
+        expect(sent.length).toEqual(1);
+        expect(sent[0].batch.map(function(event) { return event.event_type; }))
+            .toEqual(['edx.video.played', 'edx.video.paused']);
+        expect(sent[0].batch[0].timestamp).toBeDefined();
+    });
+
+    it('flushes on count threshold', function() {
+        queue.push('edx.video.position.changed', {});
+        queue.push('edx.video.position.changed', {});
+        queue.push('edx.video.position.changed', {});
+        expect(sent.length).toEqual(1);
+        expect(sent[0].batch.length).toEqual(3);
+
+        jasmine.clock().tick(1001);
+        expect(sent.length).toEqual(1);
+    });
+
+    it('flushes on page hide', function() {
+        queue.push('edx.video.paused', {});
+        queue.flush(true);
+        queue.flush(true);
+        expect(sent.length).toEqual(1);
+        expect(sent[0].isUnloading).toBe(true);
+    });
+});
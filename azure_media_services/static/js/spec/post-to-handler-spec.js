@@ -0,0 +1,54 @@
+/**
+ * Tests for posting to xBlock handlers
+ */
+/* global postToHandler */
+
+describe('postToHandler', function() {
+    'use strict';
+
+    var originalFetch;
+    var originalJQuery;
+    var ajaxCalls;
+    var fetchCalls;
+
+    beforeEach(function() {
+        originalFetch = window.fetch;
+        originalJQuery = window.$;
+        ajaxCalls = [];
+        fetchCalls = [];
+        window.$ = {ajax: function(options) { ajaxCalls.push(options); }};
+        window.fetch = function(url, options) { fetchCalls.push({url: url, options: options}); };
+        document.cookie = 'csrftoken=csrf-token';
+    });
+
+    afterEach(function() {
+        window.fetch = originalFetch;
+        window.$ = originalJQuery;
+    });
+
+    it('posts with XHR while the page stays', function() {
+        postToHandler('/handler/watch_progress', {intervals: [[0, 1]]}, false);
+
+        expect(fetchCalls.length).toEqual(0);
+        expect(ajaxCalls).toEqual([{type: 'POST', url: '/handler/watch_progress', data: '{"intervals":[[0,1]]}'}]);
+    });
+
+    it('posts a keepalive request with CSRF token when the page is unloading', function() {
+        postToHandler('/handler/publish_events', {events: []}, true);
+
+        expect(ajaxCalls.length).toEqual(0);
+        expect(fetchCalls.length).toEqual(1);
+        expect(fetchCalls[0].url).toEqual('/handler/publish_events');
+        expect(fetchCalls[0].options.keepalive).toBe(true);
+        expect(fetchCalls[0].options.body).toEqual('{"events":[]}');
+        expect(fetchCalls[0].options.headers['X-CSRFToken']).toEqual('csrf-token');
+    });
+
+    it('falls back to XHR without fetch', function() {
+        window.fetch = undefined;
+
+        postToHandler('/handler/publish_events', {events: []}, true);
+
+        expect(ajaxCalls.length).toEqual(1);
+    });
+});
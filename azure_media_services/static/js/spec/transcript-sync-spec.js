@@ -0,0 +1,108 @@
+/**
+ * Tests for the transcript highlighting sync engine
+ */
+/* global TranscriptSync */
+
+describe('TranscriptSync', function() {
+    'use strict';
+
+    var CUES_COUNT = 20000;  // ~3 hours lecture with 0.5s cues
+
+    /**
+     * Make sorted cues with gaps between them along with their DOM elements.
+     * @param count
+     * @returns {{cues: Array, items: Array}}
+     */
+    function makeCues(count) {
+        var i;
+        var cues = [];
+        var items = [];
+        for (i = 0; i < count; i++) {
+            cues.push({startTime: i * 0.5, endTime: i * 0.5 + 0.4});
+            items.push(document.createElement('li'));
+        }
+        return {cues: cues, items: items};
+    }
+
+    /**
+     * Wrap array into array-like object counting reads of its items.
+     * @param array
+     * @returns {{length: Number, reads: Number}}
+     */
+    function countingArray(array) {
+        var wrapper = {length: array.length, reads: 0};
+        array.forEach(function(value, index) {
+            Object.defineProperty(wrapper, index, {
+                get: function() {
+                    wrapper.reads++;
+                    return value;
+                }
+            });
+        });
+        return wrapper;
+    }
+
+    it('finds active cue with binary search', function() {
+        var starts = [0, 1, 2, 5];
+        var ends = [1, 2, 3, 6];
+        expect(TranscriptSync.findCue(starts, ends, -1)).toEqual(-1);
+        expect(TranscriptSync.findCue(starts, ends, 0)).toEqual(0);
+        expect(TranscriptSync.findCue(starts, ends, 1.5)).toEqual(1);
+        expect(TranscriptSync.findCue(starts, ends, 4)).toEqual(-1);
+        expect(TranscriptSync.findCue(starts, ends, 5.9)).toEqual(3);
+        expect(TranscriptSync.findCue(starts, ends, 6)).toEqual(-1);
+        expect(TranscriptSync.findCue([], [], 1)).toEqual(-1);
+    });
+
+    it('highlights active cue and skips work while it is unchanged', function() {
+        var data = makeCues(10);
+        var frames = [];
+        var sync = new TranscriptSync({
+            cues: data.cues,
+            items: data.items,
+            container: null,
+            requestFrame: function(callback) { frames.push(callback); }
+        });
+
+        expect(sync.update(1.1)).toBe(true);
+        expect(data.items[2].classList.contains('current')).toBe(true);
+        expect(sync.update(1.2)).toBe(false);
+        expect(sync.update(1.6)).toBe(true);
+        expect(data.items[2].classList.contains('current')).toBe(false);
+        expect(data.items[3].classList.contains('current')).toBe(true);
+        // Scroll requests are batched until the next animation frame:
+        expect(frames.length).toEqual(1);
+    });
+
+    it('looks up a logarithmic number of cues on long transcripts', function() {
+        var data = makeCues(CUES_COUNT);
+        var starts = countingArray(data.cues.map(function(cue) { return cue.startTime; }));
+        var ends = countingArray(data.cues.map(function(cue) { return cue.endTime; }));
+        var maxReads = Math.ceil(Math.log(CUES_COUNT) / Math.LN2) + 1;
+
+        // Playback near the end of the lecture, where a linear scan would read ~16000 cues:
+        expect(TranscriptSync.findCue(starts, ends, CUES_COUNT * 0.4 + 0.1)).toEqual(CUES_COUNT * 0.8);
+        expect(starts.reads).not.toBeGreaterThan(maxReads);
+        expect(ends.reads).toEqual(1);
+    });
+
+    it('leaves the DOM alone while the active cue is unchanged', function() {
+        var i;
+        var data = makeCues(CUES_COUNT);
+        var sync = new TranscriptSync({
+            cues: data.cues,
+            items: data.items,
+            container: null,
+            requestFrame: function() {}
+        });
+        var changes = 0;
+
+        // A timeupdate every ~250ms: each 0.5s cue is highlighted once, whatever the number of ticks:
+        for (i = 0; i < 2000; i++) {
+            if (sync.update(CUES_COUNT * 0.4 + i * 0.25)) {
+                changes++;
+            }
+        }
+        expect(changes).toEqual(1000);
+    });
+});
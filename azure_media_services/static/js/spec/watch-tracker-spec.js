@@ -0,0 +1,56 @@
+/**
+ * Tests for watch progress tracking
+ */
+/* global WatchTracker */
+
+describe('WatchTracker', function() {
+    'use strict';
+
+    var sent;
+    var tracker;
+
+    beforeEach(function() {
+        jasmine.clock().install();
+        sent = [];
+        tracker = new WatchTracker(function(intervals, isUnloading) {
+            sent.push({intervals: intervals, isUnloading: isUnloading});
+        }, {interval: 15000});
+    });
+
+    afterEach(function() {
+        jasmine.clock().uninstall();
+    });
+
+    it('collects contiguous playback into intervals', function() {
+        tracker.update(10);
+        tracker.update(10.25);
+        tracker.update(11);
+        // Seek forward:
+        tracker.update(60);
+        tracker.update(61.5);
+        tracker.flush(false);
+
+        expect(sent).toEqual([{intervals: [[10, 11], [60, 61.5]], isUnloading: false}]);
+    });
+
+    it('sends intervals on heartbeat while playing', function() {
+        tracker.update(0);
+        tracker.update(1);
+        jasmine.clock().tick(15001);
+        expect(sent.length).toEqual(1);
+        expect(sent[0].intervals).toEqual([[0, 1]]);
+
+        // Playback goes on from where the sent interval ends:
+        tracker.update(1.25);
+        tracker.stop();
+        tracker.flush(true);
+        expect(sent[1]).toEqual({intervals: [[1, 1.25]], isUnloading: true});
+    });
+
+    it('sends nothing if nothing has been watched', function() {
+        tracker.update(5);
+        tracker.stop();
+        tracker.flush(false);
+        expect(sent.length).toEqual(0);
+    });
+});
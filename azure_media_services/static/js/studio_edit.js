@@ -20,6 +20,27 @@ function StudioEditableXBlockMixin(runtime, element) {
     var $inputVideoUrl = $(element).find('[data-field-name = "video_url"] input');
     var $textareaCaptions = $(element).find('[data-field-name = "captions"] textarea');
     var $textareaCaptionIds = $(element).find('[data-field-name = "caption_ids"] textarea');
+    var handlerUrlListStreamVideos = runtime.handlerUrl(element, 'list_stream_videos');
+    var $streamVideos = $(element).find('.js-stream-videos');
+    var $streamVideosSearch = $(element).find('.js-stream-videos-search');
+    var $streamVideosEmpty = $(element).find('.js-stream-videos-empty');
+    var streamVideoTemplate = _.template(
+        '<li><input id="radio-stream-video-<%= id %>" type="radio" name="stream_video" ' +
+        'value="<%- edxVideoId %>" <% if (checked) { %> checked <% } %>/>' +
+        '<label for="radio-stream-video-<%= id %>"><span class="media-file-name"><%- clientVideoId %></span>' +
+        '<div class="media-source">(<%- edxVideoId %>)</div></label></li><hr/>'
+    );
+    // Stream videos picker state (pages are loaded lazily):
+    var streamVideos = {
+        search: '',
+        cursor: null,
+        hasMore: true,
+        request: null,
+        rendered: {},
+        counter: 0,
+        searchTimer: null,
+        started: false
+    };
 
     $(element).find('.field-data-control').each(function() {
         var $field = $(this);
@@ -337,6 +358,99 @@ function StudioEditableXBlockMixin(runtime, element) {
         }).fail(showErrorFail);
     }
 
+    /**
+     * Append stream video to the picker (unless it's already there).
+     * @param video
+     */
+    function renderStreamVideo(video) {
+        if (streamVideos.rendered[video.edx_video_id]) {
+            return;
+        }
+        streamVideos.rendered[video.edx_video_id] = true;
+        streamVideos.counter += 1;
+        $streamVideos.append(streamVideoTemplate({
+            id: streamVideos.counter,
+            edxVideoId: video.edx_video_id,
+            clientVideoId: video.client_video_id,
+            checked: video.edx_video_id === $inputEdxVideoId.val()
+        }));
+    }
+
+    /**
+     * Load the next page of stream videos (or the first one if `reset`).
+     * @param reset
+     */
+    function loadStreamVideos(reset) {
+        if (reset) {
+            streamVideos.started = true;
+            if (streamVideos.request) {
+                streamVideos.request.abort();
+                streamVideos.request = null;
+            }
+            streamVideos.cursor = null;
+            streamVideos.hasMore = true;
+            streamVideos.rendered = {};
+            $streamVideos.empty();
+            $streamVideosEmpty.addClass('is-hidden');
+        }
+        if (streamVideos.request || !streamVideos.hasMore) {
+            return;
+        }
+        streamVideos.request = $.ajax({
+            type: 'POST',
+            url: handlerUrlListStreamVideos,
+            data: JSON.stringify({search: streamVideos.search, cursor: streamVideos.cursor}),
+            dataType: 'json',
+            success: function(data) {
+                var i;
+                if (data.result !== 'success') {
+                    streamVideos.hasMore = false;
+                    return;
+                }
+                // The selected video is pinned to the top of the list:
+                if (data.selected) {
+                    renderStreamVideo(data.selected);
+                }
+                for (i = 0; i < data.videos.length; i++) {
+                    renderStreamVideo(data.videos[i]);
+                }
+                streamVideos.cursor = data.next_cursor;
+                streamVideos.hasMore = Boolean(data.next_cursor);
+                $streamVideosEmpty.toggleClass('is-hidden', !$.isEmptyObject(streamVideos.rendered));
+            }
+        }).fail(function(jqXHR, textStatus) {
+            if (textStatus !== 'abort') {
+                showErrorFail(jqXHR);
+            }
+        }).always(function() {
+            streamVideos.request = null;
+        }).done(function() {
+            // Keep loading until the list is scrollable:
+            if (streamVideos.hasMore && $streamVideos.prop('scrollHeight') <= $streamVideos.innerHeight()) {
+                loadStreamVideos(false);
+            }
+        });
+    }
+
+    $streamVideos.on('scroll', function() {
+        var threshold = 100;  // px from the bottom to start loading the next page at
+        var scrollBottom = $streamVideos.scrollTop() + $streamVideos.innerHeight();
+        if (scrollBottom >= $streamVideos.prop('scrollHeight') - threshold) {
+            loadStreamVideos(false);
+        }
+    });
+
+    $streamVideosSearch.on('input', function() {
+        clearTimeout(streamVideos.searchTimer);
+        streamVideos.searchTimer = setTimeout(function() {
+            var search = $.trim($streamVideosSearch.val());
+            if (search !== streamVideos.search) {
+                streamVideos.search = search;
+                loadStreamVideos(true);
+            }
+        }, 300);
+    });
+
     $(element).find('.js-header-tab').on('click', function(e) {
         var $currentTarget = $(e.currentTarget);
         var dataTab = $currentTarget.data('tab');
@@ -349,9 +463,12 @@ function StudioEditableXBlockMixin(runtime, element) {
         if ($inputEdxVideoId.val() && !$containerCaptions.hasClass('render_captions')) {
             getCaptionsAndVideoInfo($inputEdxVideoId.val(), false);
         }
+        if ($streamVideos.length && dataTab === 'tab-advanced' && !streamVideos.started) {
+            loadStreamVideos(true);
+        }
     });
 
-    $(element).find('[name = "stream_video"]').on('change', function(e) {
+    $streamVideos.on('change', '[name = "stream_video"]', function(e) {
         var $currentTarget = $(e.currentTarget);
         var edxVideoID = $currentTarget.val();
         resetCaptionsField();
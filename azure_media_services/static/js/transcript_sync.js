@@ -0,0 +1,110 @@
+// Copyright (c) Microsoft Corporation. All Rights Reserved.
+// Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+/**
+ * Keeps the interactive transcript highlighting in sync with the playback position.
+ *
+ * Cue boundaries are cached in arrays sorted by start time, so the active cue is found with a
+ * binary search; cue elements are referenced directly (no DOM queries) and nothing is touched
+ * while the active cue stays the same. Scrolling is batched through `requestAnimationFrame`.
+ *
+ * @param options {Object}
+ *   - cues: [{startTime, endTime}] sorted by start time;
+ *   - items: cue DOM elements in the same order;
+ *   - container: scrollable transcript DOM element;
+ *   - requestFrame: (optional) `requestAnimationFrame` replacement.
+ * @constructor
+ */
+function TranscriptSync(options) {
+    'use strict';
+    var i;
+    this.starts = [];
+    this.ends = [];
+    for (i = 0; i < options.cues.length; i++) {
+        this.starts.push(options.cues[i].startTime);
+        this.ends.push(options.cues[i].endTime);
+    }
+    this.items = options.items;
+    this.container = options.container;
+    this.requestFrame = options.requestFrame || TranscriptSync.requestFrame;
+    this.activeIndex = -1;
+    this.scrollScheduled = false;
+}
+
+/**
+ * Return index of the (latest started) cue active at `time` or -1.
+ * @param starts
+ * @param ends
+ * @param time
+ * @returns {number}
+ */
+TranscriptSync.findCue = function(starts, ends, time) {
+    'use strict';
+    var middle;
+    var low = 0;
+    var high = starts.length - 1;
+    var found = -1;
+    // Find the last cue started at or before `time`:
+    while (low <= high) {
+        middle = (low + high) >> 1;  // eslint-disable-line no-bitwise
+        if (starts[middle] <= time) {
+            found = middle;
+            low = middle + 1;
+        } else {
+            high = middle - 1;
+        }
+    }
+    return (found !== -1 && time < ends[found]) ? found : -1;
+};
+
+TranscriptSync.requestFrame = function(callback) {
+    'use strict';
+    return (window.requestAnimationFrame || function(cb) { return window.setTimeout(cb, 16); })(callback);
+};
+
+/**
+ * Highlight the cue active at `time`.
+ * @param time
+ * @returns {boolean} whether the active cue has changed
+ */
+TranscriptSync.prototype.update = function(time) {
+    'use strict';
+    var index = TranscriptSync.findCue(this.starts, this.ends, time);
+    if (index === this.activeIndex) {
+        return false;
+    }
+    if (this.activeIndex !== -1) {
+        this.items[this.activeIndex].classList.remove('current');
+    }
+    this.activeIndex = index;
+    if (index !== -1) {
+        this.items[index].classList.add('current');
+        this.scheduleScroll();
+    }
+    return true;
+};
+
+/**
+ * Scroll the active cue to the top of the container on the next animation frame.
+ */
+TranscriptSync.prototype.scheduleScroll = function() {
+    'use strict';
+    var self = this;
+    if (this.scrollScheduled) {
+        return;
+    }
+    this.scrollScheduled = true;
+    this.requestFrame(function() {
+        var scrollTop;
+        self.scrollScheduled = false;
+        if (self.activeIndex === -1 || !self.container) {
+            return;
+        }
+        scrollTop = self.items[self.activeIndex].offsetTop - self.items[0].offsetTop;
+        if ($.fn.scrollTo) {
+            $(self.container).scrollTo(scrollTop, 1000);
+        } else {
+            self.container.scrollTop = scrollTop;
+        }
+    });
+};
@@ -0,0 +1,58 @@
+"""
+Per-render cost of `student_view` and `studio_view` with the resource/template cache cold and warm.
+
+Run with:
+
+    python -m azure_media_services.tests.benchmarks.bench_render [--renders N]
+"""
+import argparse
+import timeit
+
+import mock
+from xblock.field_data import DictFieldData
+
+from azure_media_services import AMSXBlock
+from azure_media_services.ams import loader
+
+
+def make_block():
+    block = AMSXBlock(mock.Mock(user_id='user_id'), DictFieldData({
+        'video_url': 'https://ams.streaming.mediaservices.windows.net/locator/video.ism/manifest',
+        'captions': [{'srclang': 'en', 'label': 'English', 'src': '//ams.blob.core.windows.net/en.vtt'}],
+    }), mock.Mock())
+    block.location = mock.Mock(org='org_name', course_key='course_key')
+    return block
+
+
+def bench(label, render, renders, cold):
+    def run():
+        if cold:
+            loader.clear()
+        render()
+
+    run()
+    seconds = min(timeit.repeat(run, number=renders, repeat=3)) / renders
+    print('{:<32} {:>9.3f} ms/render'.format(label, seconds * 1000))
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renders', type=int, default=200)
+    args = parser.parse_args()
+
+    block = make_block()
+    views = (
+        ('student_view', lambda: block.student_view({})),
+        ('studio_view', lambda: block.studio_view({})),
+    )
+    with mock.patch('azure_media_services.ams.get_azure_config', return_value={}), \
+            mock.patch.object(AMSXBlock, 'get_embed_url', return_value=None):
+        for name, render in views:
+            cold = bench('{} (cache cold)'.format(name), render, args.renders, cold=True)
+            warm = bench('{} (cache warm)'.format(name), render, args.renders, cold=False)
+            print('{:<32} {:>9.1f}x'.format('{} speedup'.format(name), cold / warm))
+
+
+if __name__ == '__main__':
+    main()
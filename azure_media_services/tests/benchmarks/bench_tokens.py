@@ -0,0 +1,53 @@
+"""
+Playback token issuance throughput: signing every time vs. cached signing keys and tokens.
+
+Run with:
+
+    python -m azure_media_services.tests.benchmarks.bench_tokens [--users N] [--rounds N]
+"""
+import argparse
+import base64
+import time
+
+from azure_media_services.tokens import PlaybackTokenService
+
+VERIFICATION_KEY = base64.b64encode(b'x' * 32).decode('ascii')
+ISSUER = 'http://openedx.microsoft.com/'
+SCOPE = 'urn:xblock-azure-media-services'
+
+
+def bench(label, issue, users, rounds):
+    start = time.time()
+    for _ in range(rounds):
+        for user_id in range(users):
+            issue(user_id)
+    elapsed = time.time() - start
+    tokens = users * rounds
+    print('{:<36} {:>10.0f} tokens/s {:>8.1f} us/token'.format(label, tokens / elapsed, elapsed / tokens * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    service = PlaybackTokenService()
+
+    def issue_uncached(user_id):
+        signing_key = base64.b64decode(VERIFICATION_KEY)
+        return service.issue_token(signing_key, user_id, ISSUER, SCOPE)
+
+    def issue_with_cached_key(user_id):
+        return service.issue_token(service.get_signing_key('block_id', VERIFICATION_KEY), user_id, ISSUER, SCOPE)
+
+    def issue_cached(user_id):
+        return service.get_token('block_id', user_id, VERIFICATION_KEY, ISSUER, SCOPE)
+
+    bench('decode + sign on every render', issue_uncached, args.users, args.rounds)
+    bench('cached signing key', issue_with_cached_key, args.users, args.rounds)
+    bench('cached signing key and tokens', issue_cached, args.users, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
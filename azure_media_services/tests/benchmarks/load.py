@@ -0,0 +1,230 @@
+"""
+Load test of the learner's paths: N concurrent learners watching videos served by a single worker (process).
+
+Each learner has its own `AMSXBlock` instances of the course's videos. It repeatedly renders `student_view`
+of a random video, fetches its transcript and publishes player events through the real handlers, with
+optional think time in between. Azure Media Services and blob storage are replaced with the local stand-ins
+from `azure_media_services.tests.fakes`, their latency and error rate are configurable.
+
+The run is repeated for each concurrency level: throughput that stops growing as learners are added marks
+the worker's saturation point.
+
+Run with:
+
+    python -m azure_media_services.tests.benchmarks.load [--learners 1 2 4 8 16] [--duration 10]
+        [--transcript-latency 0.02] [--transcript-error-rate 0.01] [--transcript-cache-ttl 60] ...
+"""
+import argparse
+from collections import Counter, OrderedDict
+import json
+import random
+import threading
+import time
+import timeit
+
+from django.test.utils import override_settings
+
+from azure_media_services.tests.benchmarks.suite import clear_caches, json_request, make_block, \
+    OfflineEnvironment, percentile
+
+OPERATIONS = ('student_view', 'fetch_transcript', 'publish_event')
+PLAYER_EVENTS = ('edx.video.loaded', 'edx.video.played', 'edx.video.paused')
+# Throughput gain (relative) below which adding learners is considered to saturate the worker:
+SATURATION_GAIN = 0.1
+
+
+class Learner(threading.Thread):
+    """
+    Simulated learner: watches random videos until the deadline, recording each call's latency.
+    """
+
+    def __init__(self, number, blocks, deadline, think_time, seed):
+        """
+        Set up learner's blocks (own instances, the way each request gets them in LMS).
+        """
+        super(Learner, self).__init__(name='learner-{}'.format(number))
+        self.daemon = True
+        self.blocks = blocks
+        self.deadline = deadline
+        self.think_time = think_time
+        self.random = random.Random(seed)
+        self.latencies = {operation: [] for operation in OPERATIONS}
+        self.calls = Counter()
+        self.errors = Counter()
+
+    def run(self):
+        while time.time() < self.deadline:
+            block = self.random.choice(self.blocks)
+            self.call('student_view', block.student_view, {})
+            caption = self.random.choice(block.captions)
+            self.call('fetch_transcript', block.fetch_transcript, json_request({
+                'srcUrl': caption['src'], 'srcLang': caption['srclang']
+            }))
+            for event_type in PLAYER_EVENTS:
+                self.call('publish_event', block.publish_event, json_request({
+                    'event_type': event_type, 'currentTime': self.random.randint(0, 600)
+                }))
+            if self.think_time:
+                time.sleep(self.random.uniform(0, 2 * self.think_time))
+
+    def call(self, operation, func, *args):
+        self.calls[operation] += 1
+        started = timeit.default_timer()
+        try:
+            result = func(*args)
+        except Exception:  # pylint: disable=broad-except
+            self.errors[operation] += 1
+            return
+        self.latencies[operation].append(timeit.default_timer() - started)
+        if getattr(result, 'json_body', {}).get('result') == 'error':
+            self.errors[operation] += 1
+
+
+def make_learner_blocks(env, learner, videos, publish):
+    blocks = []
+    for number in range(videos):
+        captions = [
+            {
+                'srclang': lang, 'label': lang,
+                'src': env.transcript_server.url('video-{}/{}.vtt'.format(number, lang)),
+            }
+            for lang in ('en', 'fr')
+        ]
+        blocks.append(make_block(
+            {
+                'video_url': '//ams.streaming.mediaservices.windows.net/video-{}.ism/manifest'.format(number),
+                'captions': captions,
+                'transcripts_enabled': True,
+            },
+            user_id='learner-{}'.format(learner),
+            usage_id=u'block-v1:org+course+run+type@azure_media_services+block@video-{}'.format(number),
+            publish=publish,
+        ))
+    return blocks
+
+
+def run_level(env, learners, duration, videos, think_time, publish):
+    """
+    Run `learners` concurrent learners for `duration` seconds and return the level's stats.
+    """
+    deadline = time.time() + duration
+    threads = [
+        Learner(number, make_learner_blocks(env, number, videos, publish), deadline, think_time, seed=number)
+        for number in range(learners)
+    ]
+    server = env.transcript_server
+    requests_before, errors_before = server.requests, server.errors
+    started = timeit.default_timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = timeit.default_timer() - started
+
+    operations = OrderedDict()
+    for operation in OPERATIONS:
+        latencies = sorted(sum((thread.latencies[operation] for thread in threads), []))
+        errors = sum(thread.errors[operation] for thread in threads)
+        operations[operation] = OrderedDict([
+            ('calls', sum(thread.calls[operation] for thread in threads)),
+            ('errors', errors),
+            ('ops_per_sec', len(latencies) / elapsed),
+            ('p50_ms', percentile(latencies, 0.50) * 1000 if latencies else None),
+            ('p95_ms', percentile(latencies, 0.95) * 1000 if latencies else None),
+            ('p99_ms', percentile(latencies, 0.99) * 1000 if latencies else None),
+        ])
+    return OrderedDict([
+        ('learners', learners),
+        ('ops_per_sec', sum(stats['ops_per_sec'] for stats in operations.values())),
+        ('operations', operations),
+        # Failed storage requests are retried, so they show up here rather than as failed fetches:
+        ('transcript_requests', server.requests - requests_before),
+        ('transcript_errors', server.errors - errors_before),
+    ])
+
+
+def find_saturation(levels):
+    """
+    Return the number of learners past which throughput grows by less than `SATURATION_GAIN` (or None).
+    """
+    for previous, level in zip(levels, levels[1:]):
+        if level['ops_per_sec'] < previous['ops_per_sec'] * (1 + SATURATION_GAIN):
+            return previous['learners']
+    return None
+
+
+def print_level(level):
+    print('{} learner(s): {:.0f} ops/s, storage: {} requests, {} failed'.format(
+        level['learners'], level['ops_per_sec'], level['transcript_requests'], level['transcript_errors']
+    ))
+    for operation, stats in level['operations'].items():
+        if stats['p50_ms'] is None:
+            print('  {:<18} {:>7} calls {:>5} errors'.format(operation, stats['calls'], stats['errors']))
+            continue
+        print('  {:<18} {:>7} calls {:>5} errors {:>9.0f} ops/s  p50 {:>8.2f}  p95 {:>8.2f}  p99 {:>8.2f} ms'.format(
+            operation, stats['calls'], stats['errors'], stats['ops_per_sec'],
+            stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+        ))
+
+
+def run(args):
+    """
+    Run all the concurrency levels and return their stats.
+    """
+    publish_latency = args.publish_latency
+
+    def publish(block, event_type, data):
+        if publish_latency:
+            time.sleep(publish_latency)
+
+    levels = []
+    environment = OfflineEnvironment(
+        videos=args.videos, cues=args.cues,
+        transcript_latency=args.transcript_latency, transcript_error_rate=args.transcript_error_rate,
+    )
+    with environment as env, override_settings(
+        AMS_TRANSCRIPT_CACHE_TTL=args.transcript_cache_ttl,
+        AMS_EVENTS_PUBLISH_MODE=args.events_mode,
+    ):
+        for learners in args.learners:
+            clear_caches()
+            level = run_level(env, learners, args.duration, args.videos, args.think_time, publish)
+            print_level(level)
+            levels.append(level)
+    return levels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--learners', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                        help='concurrency levels (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per level (default: %(default)s)')
+    parser.add_argument('--think-time', type=float, default=0, help='mean pause (seconds) between videos')
+    parser.add_argument('--videos', type=int, default=5, help='number of the course videos')
+    parser.add_argument('--cues', type=int, default=500, help='number of cues of the transcripts')
+    parser.add_argument('--transcript-latency', type=float, default=0, help='blob storage latency (seconds)')
+    parser.add_argument('--transcript-error-rate', type=float, default=0, help='share of failing storage requests')
+    parser.add_argument('--transcript-cache-ttl', type=int, default=60 * 60,
+                        help='AMS_TRANSCRIPT_CACHE_TTL, 0 revalidates transcripts on each fetch')
+    parser.add_argument('--events-mode', choices=('sync', 'async'), default='sync',
+                        help='AMS_EVENTS_PUBLISH_MODE (async takes LMS tracking, inline without it)')
+    parser.add_argument('--publish-latency', type=float, default=0, help='runtime.publish latency (seconds)')
+    parser.add_argument('--json', metavar='PATH', help='save results to the file')
+    args = parser.parse_args(argv)
+
+    levels = run(args)
+    saturation = find_saturation(levels)
+    if saturation is None:
+        print('No saturation up to {} learner(s)'.format(levels[-1]['learners']))
+    else:
+        print('Saturation at ~{} learner(s): more learners add less than {:.0%} throughput'.format(
+            saturation, SATURATION_GAIN
+        ))
+    if args.json:
+        with open(args.json, 'w') as results_file:
+            json.dump({'levels': levels, 'saturation': saturation}, results_file, indent=2, separators=(',', ': '))
+            results_file.write('\n')
+
+
+if __name__ == '__main__':
+    main()
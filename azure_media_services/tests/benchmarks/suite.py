@@ -0,0 +1,308 @@
+"""
+Benchmark suite of the xBlock's render paths and handlers, run offline against in-memory upstreams.
+
+Azure Media Services, edxval videos and blob storage are replaced with the stand-ins from
+`azure_media_services.tests.fakes` (transcripts are served by a local HTTP server), so numbers
+reflect the xBlock's own overhead and don't depend on the network.
+
+For each benchmark throughput, latency percentiles and memory (net gc-tracked objects retained per call
+and the process' peak RSS) are reported. Results can be saved as a baseline and later runs compared
+against it: the run fails if any benchmark got slower (or retains more objects) than the tolerance allows.
+
+Run with:
+
+    python -m azure_media_services.tests.benchmarks.suite [--iterations N] [--only NAME [NAME ...]]
+        [--save-baseline | --compare] [--baseline PATH] [--tolerance 0.25]
+"""
+import argparse
+from collections import OrderedDict
+import gc
+import gettext
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import timeit
+
+from django.core.cache import cache
+import mock
+from webob import Request
+from xblock.field_data import DictFieldData
+
+from azure_media_services import AMSXBlock
+from azure_media_services.cache import clear_local_caches
+from azure_media_services.clients import reset_media_service_clients
+from azure_media_services.tests import fakes
+from azure_media_services.video_info import get_video_info_cache
+
+DEFAULT_BASELINE = '.bench_baseline.json'
+# Metrics compared against the baseline (lower is better):
+COMPARED_METRICS = ('p50_ms', 'p95_ms')
+# Objects retained per call are compared in absolute terms, a few may legitimately come and go:
+RETAINED_OBJECTS_SLACK = 2
+
+USAGE_ID = u'block-v1:org+course+run+type@azure_media_services+block@video'
+
+
+def percentile(sorted_samples, fraction):
+    """
+    Return nearest-rank percentile of the sorted samples.
+    """
+    rank = int(math.ceil(fraction * len(sorted_samples)))
+    return sorted_samples[min(max(rank, 1), len(sorted_samples)) - 1]
+
+
+def max_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes:
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def measure(func, iterations, warmup):
+    """
+    Call `func` `iterations` times (after `warmup` calls) and return its stats.
+    """
+    for _ in range(warmup):
+        func()
+
+    timer = timeit.default_timer
+    latencies = []
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    started = timer()
+    for _ in range(iterations):
+        call_started = timer()
+        func()
+        latencies.append(timer() - call_started)
+    elapsed = timer() - started
+    gc.collect()
+    objects_after = len(gc.get_objects())
+
+    latencies.sort()
+    return OrderedDict([
+        ('iterations', iterations),
+        ('ops_per_sec', iterations / elapsed),
+        ('mean_ms', elapsed / iterations * 1000),
+        ('p50_ms', percentile(latencies, 0.50) * 1000),
+        ('p95_ms', percentile(latencies, 0.95) * 1000),
+        ('p99_ms', percentile(latencies, 0.99) * 1000),
+        ('max_ms', latencies[-1] * 1000),
+        ('retained_objects_per_call', float(objects_after - objects_before) / iterations),
+        ('max_rss_kb', max_rss_kb()),
+    ])
+
+
+def make_block(fields=None, user_id='user_id', usage_id=USAGE_ID, publish=None):
+    # Plain callables rather than mocks: mocks record each call, which would pollute allocation stats.
+    runtime = mock.Mock(user_id=user_id, user_is_staff=False)
+    runtime.service = lambda _block, _name: gettext.NullTranslations()
+    runtime.local_resource_url = lambda _block, path: '/resource/' + path
+    runtime.publish = publish or (lambda block, event_type, data: None)
+    block = AMSXBlock(runtime, DictFieldData(dict(fields or {})), mock.Mock(usage_id=usage_id, user_id=user_id))
+    block.location = mock.Mock(org='org_name', course_key='course_key')
+    return block
+
+
+def json_request(data):
+    return Request.blank('/', method='POST', body=json.dumps(data))
+
+
+def clear_caches():
+    cache.clear()
+    clear_local_caches()
+    reset_media_service_clients()
+
+
+class OfflineEnvironment(object):
+    """
+    Patches the xBlock's upstreams with the stand-ins for the duration of the context.
+    """
+
+    def __init__(self, videos=5000, cues=500, ams_latency=0, ams_error_rate=0, transcript_latency=0,
+                 transcript_error_rate=0):
+        """
+        Configure the number of course's stream videos, transcript's cues and upstreams latency and failures.
+        """
+        self.videos = fakes.make_videos(videos)
+        self.media_service = fakes.FakeMediaServiceClient(latency=ams_latency, error_rate=ams_error_rate)
+        self.transcript_server = fakes.TranscriptServer(
+            cues=cues, latency=transcript_latency, error_rate=transcript_error_rate
+        )
+        self.patchers = [
+            mock.patch('azure_media_services.ams.Video', fakes.FakeVideoModel(self.videos)),
+            mock.patch('azure_media_services.ams.get_media_service_client', return_value=self.media_service),
+            mock.patch('azure_media_services.ams.get_captions_info', fakes.get_captions_info),
+            mock.patch('azure_media_services.ams.get_video_info', fakes.get_video_info),
+            mock.patch('azure_media_services.ams.get_azure_config', return_value={'client_id': 'client_id'}),
+            mock.patch.object(AMSXBlock, 'get_embed_url', return_value=None),
+        ]
+
+    def __enter__(self):
+        self.transcript_server.start()
+        for patcher in self.patchers:
+            patcher.start()
+        clear_caches()
+        return self
+
+    def __exit__(self, *exc_info):
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        self.transcript_server.stop()
+
+
+def get_benchmarks(env):
+    """
+    Return ordered `{name: callable}` of the benchmarks.
+
+    Each callable returns the view's fragment or the handler's response.
+    """
+    edx_video_id = env.videos[len(env.videos) // 2].edx_video_id
+    transcript_url = env.transcript_server.url('asset/en.vtt')
+    captions = [
+        {'srclang': lang, 'label': lang, 'src': env.transcript_server.url('asset/{}.vtt'.format(lang))}
+        for lang in ('en', 'fr', 'de')
+    ]
+    block = make_block({
+        'video_url': '//ams.streaming.mediaservices.windows.net/locator/video.ism/manifest',
+        'captions': captions,
+        'transcripts_enabled': True,
+        'edx_video_id': edx_video_id,
+    })
+    protected_block = make_block({
+        'video_url': '//ams.streaming.mediaservices.windows.net/locator/video.ism/manifest',
+        'protection_type': 'token',
+        'verification_key': 'eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHg=',
+        'captions': captions,
+    })
+    video_info_cache = get_video_info_cache()
+    first_page = block.list_stream_videos(json_request({})).json_body
+    deep_cursor = {'cursor': first_page['next_cursor']}
+
+    def student_view_cold():
+        clear_caches()
+        return block.student_view({})
+
+    def fetch_transcript_cold():
+        clear_caches()
+        return block.fetch_transcript(json_request({'srcUrl': transcript_url, 'srcLang': 'en'}))
+
+    def video_info_cold():
+        video_info_cache.invalidate(edx_video_id)
+        return block.get_captions_and_video_info(json_request({'edx_video_id': edx_video_id}))
+
+    return OrderedDict([
+        ('student_view', lambda: block.student_view({})),
+        ('student_view_cold', student_view_cold),
+        ('student_view_protected', lambda: protected_block.student_view({})),
+        ('studio_view', lambda: block.studio_view({})),
+        ('list_stream_videos_first_page', lambda: block.list_stream_videos(json_request({}))),
+        ('list_stream_videos_next_page', lambda: block.list_stream_videos(json_request(deep_cursor))),
+        ('list_stream_videos_search', lambda: block.list_stream_videos(json_request({'search': 'Lab'}))),
+        ('fetch_transcript', lambda: block.fetch_transcript(
+            json_request({'srcUrl': transcript_url, 'srcLang': 'en'})
+        )),
+        ('fetch_transcript_cold', fetch_transcript_cold),
+        ('get_captions_and_video_info', lambda: block.get_captions_and_video_info(
+            json_request({'edx_video_id': edx_video_id})
+        )),
+        ('get_captions_and_video_info_cold', video_info_cold),
+        ('publish_event', lambda: block.publish_event(
+            json_request({'event_type': 'edx.video.played', 'currentTime': 42})
+        )),
+    ])
+
+
+def run(names=None, iterations=200, warmup=20, videos=5000, cues=500):
+    """
+    Run the benchmarks (all of them or the `names` ones) and return ordered `{name: stats}`.
+    """
+    results = OrderedDict()
+    with OfflineEnvironment(videos=videos, cues=cues) as env:
+        for name, func in get_benchmarks(env).items():
+            if names and name not in names:
+                continue
+            results[name] = measure(func, iterations, warmup)
+            print_result(name, results[name])
+    return results
+
+
+def print_result(name, stats):
+    print('{:<34} {:>9.0f} ops/s  p50 {:>8.3f}  p95 {:>8.3f}  p99 {:>8.3f} ms  {:>7.1f} obj/call'.format(
+        name, stats['ops_per_sec'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+        stats['retained_objects_per_call'],
+    ))
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return list of regressions (human readable) of `results` against `baseline` ones.
+    """
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if base[metric] and stats[metric] > base[metric] * (1 + tolerance):
+                regressions.append('{}: {} {:.3f} -> {:.3f} (+{:.0%})'.format(
+                    name, metric, base[metric], stats[metric], stats[metric] / base[metric] - 1
+                ))
+        retained, base_retained = stats['retained_objects_per_call'], base['retained_objects_per_call']
+        if retained > base_retained * (1 + tolerance) + RETAINED_OBJECTS_SLACK:
+            regressions.append('{}: retained_objects_per_call {:.1f} -> {:.1f}'.format(name, base_retained, retained))
+    return regressions
+
+
+def save_baseline(path, results):
+    baseline = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, separators=(',', ': '))
+        baseline_file.write('\n')
+
+
+def load_baseline(path):
+    with open(path) as baseline_file:
+        return json.load(baseline_file)['results']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--videos', type=int, default=5000, help='number of the course stream videos')
+    parser.add_argument('--cues', type=int, default=500, help='number of cues of the transcripts')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='run these benchmarks only')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file (default: %(default)s)')
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--save-baseline', action='store_true', help='save results as the baseline')
+    action.add_argument('--compare', action='store_true', help='compare results against the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = run(args.only, args.iterations, args.warmup, args.videos, args.cues)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print('Baseline saved to {}'.format(args.baseline))
+    elif args.compare:
+        if not os.path.exists(args.baseline):
+            print('No baseline at {}, run with --save-baseline first'.format(args.baseline))
+            return 2
+        regressions = compare(results, load_baseline(args.baseline), args.tolerance)
+        if regressions:
+            print('Regressions against {}:'.format(args.baseline))
+            for regression in regressions:
+                print('  ' + regression)
+            return 1
+        print('No regressions against {}'.format(args.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Offline stand-ins for the xBlock's upstreams: Azure Media Services client, edxval videos and blob storage.
+"""
+import BaseHTTPServer
+import datetime
+import hashlib
+import random
+import socket
+import SocketServer
+import threading
+import time
+
+from azure_media_services.ams import LocatorTypes
+
+
+def make_vtt(cues=100, cue_duration=4):
+    """
+    Return WebVTT transcript of `cues` numbered cues.
+    """
+    lines = [u'WEBVTT', u'']
+    for number in range(cues):
+        start, end = number * cue_duration, (number + 1) * cue_duration
+        lines.extend([
+            u'{}'.format(number + 1),
+            u'{} --> {}'.format(format_timestamp(start), format_timestamp(end)),
+            u'Cue number {} of the transcript, long enough to look like real speech.'.format(number + 1),
+            u'',
+        ])
+    return u'\n'.join(lines)
+
+
+def format_timestamp(seconds):
+    return u'{:02d}:{:02d}:{:02d}.000'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class TranscriptServer(object):
+    """
+    Local HTTP stand-in for the blob storage transcripts are hosted on.
+
+    Every `GET /<anything>.vtt` is answered with the same transcript (with `ETag`, honouring `If-None-Match`)
+    after `latency` seconds; `error_rate` share of requests fail with 503.
+
+    Usage:
+
+        with TranscriptServer(cues=200) as server:
+            url = server.url('video/en.vtt')
+    """
+
+    def __init__(self, cues=100, latency=0, error_rate=0, seed=0):
+        """
+        Prepare the transcript served, the server is started on entering the context.
+        """
+        self.content = make_vtt(cues).encode('utf-8')
+        self.etag = '"{}"'.format(hashlib.md5(self.content).hexdigest())
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.httpd = None
+        self.thread = None
+        self.connections = set()
+
+    def url(self, path):
+        return 'http://127.0.0.1:{}/{}'.format(self.httpd.server_port, path)
+
+    def start(self):
+        self.httpd = _ThreadingHTTPServer(('127.0.0.1', 0), self.make_handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='transcript-server')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        # Unblock the handlers waiting on kept-alive connections:
+        for connection in list(self.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def make_handler(self):
+        server = self
+
+        class TranscriptHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+                # Kept-alive responses would otherwise be held back by Nagle's algorithm:
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                server.connections.add(self.connection)
+
+            def finish(self):
+                BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+                server.connections.discard(self.connection)
+
+            def do_GET(self):  # noqa: N802
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.error_rate and server.random.random() < server.error_rate:
+                    server.errors += 1
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if self.headers.get('If-None-Match') == server.etag:
+                    self.send_response(304)
+                    self.send_header('ETag', server.etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/vtt')
+                self.send_header('Content-Length', str(len(server.content)))
+                self.send_header('ETag', server.etag)
+                self.end_headers()
+                self.wfile.write(server.content)
+
+            def log_message(self, *args):
+                pass
+
+        return TranscriptHandler
+
+
+class FakeMediaServiceClient(object):
+    """
+    Media service client answering from memory after `latency` seconds per call.
+
+    `error_rate` share of calls fail with `IOError` (the way a failed REST call does).
+    """
+
+    def __init__(self, latency=0, locator_ttl=60 * 60, error_rate=0, seed=0):
+        """
+        Configure calls latency, failures and how far in the future locators expire.
+        """
+        self.latency = latency
+        self.locator_ttl = locator_ttl
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            raise IOError('Azure Media Services is unavailable')
+
+    def get_input_asset_by_video_id(self, edx_video_id, asset_type):
+        self._call()
+        return {'Id': 'nb:cid:UUID:{}'.format(edx_video_id), 'Name': edx_video_id}
+
+    def get_asset_locators(self, asset_id, locator_type):
+        self._call()
+        expiration = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.locator_ttl)
+        host = 'ams.streaming.mediaservices.windows.net' if locator_type == LocatorTypes.OnDemandOrigin \
+            else 'ams.blob.core.windows.net'
+        return {
+            'Id': '{}:{}'.format(asset_id, host),
+            'Path': 'https://{}/{}/'.format(host, asset_id),
+            'ExpirationDateTime': expiration.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    def get_asset_files(self, asset_id):
+        self._call()
+        return [
+            {'Name': 'video_{}.mp4'.format(bitrate), 'ContentFileSize': str(bitrate * 1000)}
+            for bitrate in (400, 1000, 3400)
+        ]
+
+
+def get_captions_info(video, path_locator_sas):
+    return [
+        {
+            'download_url': u'{}{}.vtt'.format(path_locator_sas, lang),
+            'file_name': u'{}.vtt'.format(lang),
+            'language': lang,
+        }
+        for lang in ('en', 'fr', 'de')
+    ]
+
+
+def get_video_info(video, path_locator_on_demand, path_locator_sas, asset_files):
+    return {
+        'smooth_streaming_url': u'{}video.ism/manifest'.format(path_locator_on_demand),
+        'download_video_url': u'{}video_3400.mp4'.format(path_locator_sas) if path_locator_sas else '',
+    }
+
+
+class FakeVideo(object):
+    """
+    Bare `edxval.models.Video` stand-in.
+    """
+
+    class DoesNotExist(Exception):
+        """
+        No video with the given ID.
+        """
+
+    def __init__(self, edx_video_id, client_video_id, created):
+        """
+        Set the fields the xBlock reads.
+        """
+        self.edx_video_id = edx_video_id
+        self.client_video_id = client_video_id
+        self.created = created
+
+    def as_dict(self, fields):
+        return {field: getattr(self, field) for field in fields}
+
+
+class FakeVideoQuerySet(object):
+    """
+    Query set over in-memory videos.
+
+    Filtering is not evaluated (that's the database's job): only keyword lookups by `edx_video_id` narrow
+    the set, other filters are accepted and ignored, so the xBlock's own per-row work is what gets measured.
+    """
+
+    def __init__(self, videos, fields=None):
+        """
+        Wrap the list of `FakeVideo`s, `fields` is set once `values` is called.
+        """
+        self.videos = videos
+        self.fields = fields
+        self.index = None
+
+    def filter(self, *args, **kwargs):
+        if 'edx_video_id' in kwargs:
+            return FakeVideoQuerySet(self._by_id(kwargs['edx_video_id']), self.fields)
+        return self
+
+    def _by_id(self, edx_video_id):
+        # Indexed lookup, like the database's one:
+        if self.index is None:
+            self.index = {video.edx_video_id: video for video in self.videos}
+        video = self.index.get(edx_video_id)
+        return [video] if video else []
+
+    def exclude(self, *args, **kwargs):
+        return self
+
+    def order_by(self, *fields):
+        return self
+
+    def values(self, *fields):
+        return FakeVideoQuerySet(self.videos, fields)
+
+    def get(self, edx_video_id):
+        videos = self._by_id(edx_video_id)
+        if not videos:
+            raise FakeVideo.DoesNotExist(edx_video_id)
+        return videos[0]
+
+    def first(self):
+        return self[0] if self.videos else None
+
+    def _row(self, video):
+        return video.as_dict(self.fields) if self.fields else video
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._row(video) for video in self.videos[item]]
+        return self._row(self.videos[item])
+
+    def __iter__(self):
+        return (self._row(video) for video in self.videos)
+
+    def __len__(self):
+        return len(self.videos)
+
+
+def make_videos(count, seed=0):
+    """
+    Return `count` fake videos, newest first (the order stream videos are listed in).
+    """
+    rnd = random.Random(seed)
+    now = datetime.datetime(2017, 1, 1)
+    return [
+        FakeVideo(
+            edx_video_id='{:08x}-video-{}'.format(rnd.getrandbits(32), number),
+            client_video_id=u'Lecture {} - {}.mp4'.format(number, rnd.choice(['Intro', 'Lab', 'Recap'])),
+            created=now - datetime.timedelta(minutes=number),
+        )
+        for number in range(count)
+    ]
+
+
+class FakeVideoModel(object):
+    """
+    `edxval.models.Video` stand-in: `FakeVideoModel(videos).objects` is a query set over `videos`.
+    """
+
+    DoesNotExist = FakeVideo.DoesNotExist
+
+    def __init__(self, videos):
+        """
+        Expose `videos` through `objects` manager.
+        """
+        self.objects = FakeVideoQuerySet(videos)
@@ -1,16 +1,35 @@
+import base64
+from datetime import datetime
 import json
+import threading
+import time
 import unittest
+import zlib
 
+from django.core.cache import cache
 from django.core.urlresolvers import NoReverseMatch
+from django.db.models import Q
+from django.test.utils import override_settings
+import jwt
 import mock
 import requests
+from webob import Request
 from xblock.field_data import DictFieldData
 
-from azure_media_services import AMSXBlock
+from azure_media_services import ams, AMSXBlock
+from azure_media_services.cache import clear_local_caches
+from azure_media_services.clients import reset_media_service_clients
+from azure_media_services.transcripts import get_transcript_cache, TranscriptTooLarge
+from azure_media_services.utils import decode_cursor
 
 
 class AMSXBlockTests(unittest.TestCase):
 
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        reset_media_service_clients()
+
     def make_one(self, **kw):
         """
         Create a XBlock AMS for testing purpose.
@@ -32,6 +51,7 @@ class AMSXBlockTests(unittest.TestCase):
         self.assertEqual(block.captions, [])
         self.assertEqual(block.transcripts_enabled, True)
         self.assertEqual(block.download_url, None)
+        self.assertEqual(block.lazy_load, '')
 
     @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
     @mock.patch('azure_media_services.ams.get_azure_config', return_value={})
@@ -55,13 +75,102 @@ class AMSXBlockTests(unittest.TestCase):
 
         context = render_django_template.call_args[0][1]
         self.assertEqual(context['has_azure_config'], False)
-        self.assertEqual(context['list_stream_videos'], [])
-        self.assertEqual(len(context['fields']), 13)
+        self.assertNotIn('list_stream_videos', context)
+        self.assertEqual(len(context['fields']), 14)
 
         frag.add_javascript.assert_called_once_with('static/js/studio_edit.js')
         frag.add_css.assert_called_once_with("public/css/studio.css")
         frag.initialize_js.assert_called_once_with("StudioEditableXBlockMixin")
 
+    def test_protected_video_auth_token(self):
+        block = self.make_one(protection_type='AES', verification_key=base64.b64encode(b'signing_key'))
+        block.runtime.user_id = 'user_id'
+
+        token = block.get_playback_token()
+
+        claims = jwt.decode(token, b'signing_key', audience=block.token_scope,
+                            issuer=block.token_issuer, algorithms=['HS256'])
+        self.assertEqual(claims['sub'], 'user_id')
+        self.assertNotIn('signing_key', token)
+
+    def test_playback_token_handler(self):
+        block = self.make_one(protection_type='AES', verification_key=base64.b64encode(b'signing_key'))
+        block.runtime.user_id = 'user_id'
+
+        with mock.patch('time.time', return_value=1000):
+            response = block.playback_token(Request.blank('/'))
+            token = block.get_playback_token()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'], 'no-store')
+        self.assertEqual(response.json['token'], token)
+        self.assertEqual(response.json['expires_in'], ams.get_token_service().lifetime)
+
+    def test_playback_token_handler_errors(self):
+        protected = self.make_one(protection_type='AES', verification_key=base64.b64encode(b'signing_key'))
+        invalid_key = self.make_one(protection_type='AES', verification_key='not base64')
+
+        self.assertEqual(self.make_one().playback_token(Request.blank('/')).status_code, 404)
+        self.assertEqual(protected.playback_token(Request.blank('/', method='POST')).status_code, 405)
+        self.assertEqual(invalid_key.playback_token(Request.blank('/')).status_code, 503)
+
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
+    @mock.patch('azure_media_services.ams.loader.render_django_template')
+    def test_student_view_cached_player_is_token_free(self, render_django_template, _get_embed_url):
+        render_django_template.side_effect = lambda path, context: u'<source token="{}"/>'.format(context['auth_token'])
+        learner = self.make_one(protection_type='AES', verification_key=base64.b64encode(b'signing_key'))
+        learner.runtime.user_id = 'user_id'
+        another_learner = self.make_one(protection_type='AES', verification_key=base64.b64encode(b'signing_key'))
+        another_learner.runtime.user_id = 'another_user_id'
+
+        content = learner.student_view({}).content
+        another_content = another_learner.student_view({}).content
+
+        # The player is rendered once, each learner gets their own token:
+        self.assertEqual(render_django_template.call_count, 1)
+        self.assertEqual(render_django_template.call_args[0][1]['auth_token'], ams.PLAYBACK_TOKEN_PLACEHOLDER)
+        self.assertEqual(content, u'<source token="{}"/>'.format(learner.get_playback_token()))
+        self.assertEqual(another_content, u'<source token="{}"/>'.format(another_learner.get_playback_token()))
+        self.assertNotEqual(content, another_content)
+
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
+    @mock.patch('azure_media_services.ams.loader.render_django_template')
+    def test_anonymous_playback_tokens(self, render_django_template, _get_embed_url):
+        render_django_template.side_effect = lambda path, context: u'<source token="{}"/>'.format(context['auth_token'])
+        block = self.make_one(protection_type='AES', verification_key=base64.b64encode(b'signing_key'))
+        block.runtime.user_id = None
+
+        fragment = block.student_view({})
+
+        # Anonymous pages may be cached and shared (embed player), the player fetches the token instead:
+        self.assertEqual(fragment.content, u'<source token=""/>')
+        self.assertEqual(fragment.json_init_args['protection']['expires_in'], 0)
+        first = block.playback_token(Request.blank('/')).json['token']
+        second = block.playback_token(Request.blank('/')).json['token']
+        self.assertNotEqual(first, second)
+
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value='https://lms.com/embed')
+    @mock.patch('azure_media_services.ams.loader.render_django_template', return_value=u'<div>player</div>')
+    def test_student_view_player_is_cached(self, render_django_template, _get_embed_url):
+        learner = self.make_one(video_url='https://video.url', share='staff_only')
+        learner.runtime.user_is_staff = False
+        another_learner = self.make_one(video_url='https://video.url', share='staff_only')
+        another_learner.runtime.user_is_staff = False
+        staff = self.make_one(video_url='https://video.url', share='staff_only')
+        staff.runtime.user_is_staff = True
+
+        learner.student_view({})
+        another_learner.student_view({})
+        self.assertEqual(render_django_template.call_count, 1)
+
+        staff.student_view({})
+        self.assertEqual(render_django_template.call_count, 2)
+        self.assertTrue(render_django_template.call_args[0][1]['share'])
+
+        learner.video_url = 'https://edited.url'
+        learner.student_view({})
+        self.assertEqual(render_django_template.call_count, 3)
+
     @mock.patch('azure_media_services.ams.Video.objects.filter', return_value=mock.Mock(order_by=mock.Mock(
         return_value=['video1', 'video2'])))
     def test_get_list_stream_videos(self, video_filter):
@@ -76,6 +185,54 @@ class AMSXBlockTests(unittest.TestCase):
         video_filter().order_by.assert_called_once_with('-created', 'edx_video_id')
         self.assertEqual(list_stream_videos, ['video1', 'video2'])
 
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_list_stream_videos')
+    def test_list_stream_videos(self, get_list_stream_videos):
+        queryset = get_list_stream_videos.return_value
+        queryset.filter.return_value = queryset
+        videos = [
+            {'edx_video_id': 'id_{}'.format(i), 'client_video_id': 'video_{}'.format(i),
+             'created': datetime(2018, 1, 1, 0, 0, i)}
+            for i in range(3, 0, -1)
+        ]
+        values = queryset.values.return_value
+        values.__getitem__.side_effect = videos.__getitem__
+        values.first.return_value = {'edx_video_id': 'selected', 'client_video_id': 'selected_video'}
+        block = self.make_one(edx_video_id='selected')
+
+        response = block.list_stream_videos(
+            mock.Mock(method="POST", body=json.dumps({'search': 'video', 'page_size': 2}))
+        ).json
+
+        self.assertEqual(response['videos'], [
+            {'edx_video_id': 'id_3', 'client_video_id': 'video_3'},
+            {'edx_video_id': 'id_2', 'client_video_id': 'video_2'},
+        ])
+        self.assertEqual(response['selected'], {'edx_video_id': 'selected', 'client_video_id': 'selected_video'})
+        self.assertEqual(decode_cursor(response['next_cursor']), ['2018-01-01T00:00:02', 'id_2'])
+        queryset.values.assert_called_with('edx_video_id', 'client_video_id', 'created')
+
+        queryset.filter.reset_mock()
+        response = block.list_stream_videos(
+            mock.Mock(method="POST", body=json.dumps({'cursor': response['next_cursor'], 'page_size': 2}))
+        ).json
+
+        self.assertNotIn('selected', response)
+        queryset.filter.assert_called_once()
+        # `Q` objects don't support equality:
+        self.assertEqual(str(queryset.filter.call_args[0][0]), str(
+            Q(created__lt=datetime(2018, 1, 1, 0, 0, 2)) |
+            Q(created=datetime(2018, 1, 1, 0, 0, 2), edx_video_id__gt=u'id_2')
+        ))
+
+    def test_list_stream_videos_malformed_cursor(self):
+        block = self.make_one()
+
+        response = block.list_stream_videos(
+            mock.Mock(method="POST", body=json.dumps({'cursor': 'malformed'}))
+        ).json
+
+        self.assertEqual(response, {'result': 'error', 'message': 'Malformed `cursor`'})
+
     def test_drop_http_or_https(self):
         block = self.make_one()
 
@@ -100,7 +257,10 @@ class AMSXBlockTests(unittest.TestCase):
     ])
     @mock.patch('azure_media_services.ams.get_media_service_client', return_value=mock.Mock(
         get_input_asset_by_video_id=mock.Mock(return_value={'Id': 'asset_id'}),
-        get_asset_locators=mock.Mock(side_effect=({'Path': 'path_locator_on_demand'}, {'Path': 'path_locator_sas'})),
+        get_asset_locators=mock.Mock(side_effect=lambda asset_id, locator_type: {
+            'OnDemandOrigin': {'Path': 'path_locator_on_demand'},
+            'SAS': {'Path': 'path_locator_sas'},
+        }[locator_type]),
         get_asset_files=mock.Mock(return_value=['asset_file_1', 'asset_file_2'])
     ))
     @mock.patch('azure_media_services.ams.Video.objects.get', return_value='video_object')
@@ -119,7 +279,7 @@ class AMSXBlockTests(unittest.TestCase):
 
         media_service_client = get_media_service_client()
         media_service_client.get_input_asset_by_video_id.assert_called_once_with('edx_video_id', 'ENCODED')
-        self.assertEqual(
+        self.assertItemsEqual(
             media_service_client.get_asset_locators.call_args_list,
             [mock.call('asset_id', 'OnDemandOrigin'), mock.call('asset_id', 'SAS')]
         )
@@ -150,6 +310,56 @@ class AMSXBlockTests(unittest.TestCase):
 
         self.assertEqual(captions_and_video_info.json, expected_data)
 
+    @mock.patch('azure_media_services.ams.LocatorTypes')
+    @mock.patch('azure_media_services.ams.get_video_info', return_value={'smooth_streaming_url': 'url'})
+    @mock.patch('azure_media_services.ams.get_captions_info')
+    @mock.patch('azure_media_services.ams.get_media_service_client', return_value=mock.Mock(
+        get_input_asset_by_video_id=mock.Mock(return_value={'Id': 'asset_id'}),
+        get_asset_locators=mock.Mock(side_effect=lambda asset_id, locator_type: {
+            'OnDemandOrigin': {'Path': 'path_locator_on_demand'},
+        }[locator_type]),
+        get_asset_files=mock.Mock(return_value=['asset_file_1'])
+    ))
+    @mock.patch('azure_media_services.ams.Video.objects.get', return_value='video_object')
+    def test_get_captions_and_video_info_partial_failure(self, video_get, get_media_service_client,
+                                                         get_captions_info, get_video_info, locator_types):
+        locator_types.OnDemandOrigin = 'OnDemandOrigin'
+        locator_types.SAS = 'SAS'
+        block = self.make_one()
+        request = mock.Mock(method="POST", body=json.dumps({'edx_video_id': 'edx_video_id'}))
+
+        captions_and_video_info = block.get_captions_and_video_info(request).json
+
+        get_captions_info.assert_not_called()
+        get_video_info.assert_called_once_with('video_object', 'path_locator_on_demand', None, None)
+        self.assertEqual(captions_and_video_info['video_info'], {'smooth_streaming_url': 'url'})
+        # The lookup has failed rather than timed out:
+        self.assertIn("lookups have failed", captions_and_video_info['error_message'])
+
+        # Incomplete results aren't cached:
+        block.get_captions_and_video_info(request)
+        self.assertEqual(video_get.call_count, 2)
+
+    @override_settings(AMS_LOOKUP_TIMEOUT=0.05)
+    @mock.patch('azure_media_services.ams.LocatorTypes')
+    @mock.patch('azure_media_services.ams.get_video_info', return_value={'smooth_streaming_url': 'url'})
+    @mock.patch('azure_media_services.ams.get_captions_info', return_value=[])
+    @mock.patch('azure_media_services.ams.get_media_service_client', return_value=mock.Mock(
+        get_input_asset_by_video_id=mock.Mock(return_value={'Id': 'asset_id'}),
+        get_asset_locators=mock.Mock(return_value={'Path': 'path_locator'}),
+        get_asset_files=mock.Mock(side_effect=lambda asset_id: time.sleep(0.3))
+    ))
+    @mock.patch('azure_media_services.ams.Video.objects.get', return_value='video_object')
+    def test_get_captions_and_video_info_timeout(self, _video_get, _get_media_service_client,
+                                                 _get_captions_info, get_video_info, _locator_types):
+        block = self.make_one()
+        request = mock.Mock(method="POST", body=json.dumps({'edx_video_id': 'edx_video_id'}))
+
+        captions_and_video_info = block.get_captions_and_video_info(request).json
+
+        get_video_info.assert_called_once_with('video_object', 'path_locator', 'path_locator', None)
+        self.assertIn("didn't respond in time", captions_and_video_info['error_message'])
+
     @mock.patch('azure_media_services.ams.get_media_service_client', return_value=mock.Mock(
         get_input_asset_by_video_id=mock.Mock(return_value=[]),
     ))
@@ -175,8 +385,23 @@ class AMSXBlockTests(unittest.TestCase):
 
         self.assertEqual(captions_and_video_info.json, expected_data)
 
-    @mock.patch('azure_media_services.ams.requests.get', return_value=mock.Mock(
-        status_code=200, content='test_transcript_content'
+    @mock.patch('azure_media_services.ams.get_media_service_client', return_value=mock.Mock(
+        get_input_asset_by_video_id=mock.Mock(return_value=[]),
+    ))
+    @mock.patch('azure_media_services.ams.Video.objects.get', return_value='video_object')
+    def test_get_captions_and_video_info_is_cached(self, video_get, get_media_service_client):
+        block = self.make_one()
+        request = mock.Mock(method="POST", body=json.dumps({'edx_video_id': 'edx_video_id'}))
+
+        first = block.get_captions_and_video_info(request)
+        second = block.get_captions_and_video_info(request)
+
+        self.assertEqual(first.json, second.json)
+        video_get.assert_called_once_with(edx_video_id='edx_video_id')
+        get_media_service_client().get_input_asset_by_video_id.assert_called_once_with('edx_video_id', 'ENCODED')
+
+    @mock.patch('azure_media_services.transcripts.http_get', return_value=mock.Mock(
+        status_code=200, content='test_transcript_content', headers={}
     ))
     def test_fetch_transcript_success(self, request_get_mock):
         block = self.make_one()
@@ -185,12 +410,12 @@ class AMSXBlockTests(unittest.TestCase):
 
         handler_response = block.fetch_transcript(handler_request_mock)
 
-        request_get_mock.assert_called_once_with(test_data['srcUrl'])
+        request_get_mock.assert_called_once_with(test_data['srcUrl'], headers={})
         self.assertEqual(handler_response.json, {'result': 'success', 'content': 'test_transcript_content'})
 
     @mock.patch('azure_media_services.ams.log.exception')
     @mock.patch(
-        'azure_media_services.ams.requests.get', return_value=mock.Mock(status_code=400),
+        'azure_media_services.transcripts.http_get', return_value=mock.Mock(status_code=400),
         side_effect=requests.RequestException()
     )
     def test_fetch_transcript_ioerror(self, request_get_mock, logger_mock):
@@ -201,13 +426,14 @@ class AMSXBlockTests(unittest.TestCase):
 
         handler_response = block.fetch_transcript(handler_request_mock)
 
-        request_get_mock.assert_called_once_with(test_data['srcUrl'])
+        request_get_mock.assert_called_once_with(test_data['srcUrl'], headers={})
         logger_mock.assert_called_once_with(test_failure_message)
         self.assertEqual(handler_response.json, {'result': 'error', 'message': test_failure_message})
 
     @mock.patch('azure_media_services.ams.log.exception')
     @mock.patch(
-        'azure_media_services.ams.requests.get', return_value=mock.Mock(status_code=200), side_effect=ValueError()
+        'azure_media_services.transcripts.http_get', return_value=mock.Mock(status_code=200),
+        side_effect=ValueError()
     )
     def test_fetch_transcript_other_parse_error(self, request_get_mock, logger_mock):
         block = self.make_one()
@@ -220,7 +446,7 @@ class AMSXBlockTests(unittest.TestCase):
 
         handler_response = block.fetch_transcript(handler_request_mock)
 
-        request_get_mock.assert_called_once_with(test_data['srcUrl'])
+        request_get_mock.assert_called_once_with(test_data['srcUrl'], headers={})
         logger_mock.assert_called_once_with(test_log_message)
         self.assertEqual(handler_response.json, {'result': 'error', 'message': test_failure_message})
 
@@ -237,3 +463,387 @@ class AMSXBlockTests(unittest.TestCase):
         embed_url = block.get_embed_url()
         reverse.assert_called_once_with('embed_player', kwargs={'usage_key_string': 'usage_id'})
         self.assertIsNone(embed_url)
+
+    @mock.patch('azure_media_services.transcripts.http_get')
+    def test_transcript_handler(self, http_get_mock):
+        http_get_mock.return_value = mock.Mock(
+            status_code=200, headers={'ETag': '"etag"'}, iter_content=mock.Mock(return_value=iter(['WEB', 'VTT']))
+        )
+        block = self.make_one(captions=[{'srclang': 'en', 'src': 'test_transcript_url'}])
+
+        response = block.transcript(Request.blank('/', headers={'Accept-Encoding': 'identity'}), suffix='en')
+
+        http_get_mock.assert_called_once_with('test_transcript_url', headers={}, stream=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, 'WEBVTT')
+        self.assertEqual(response.headers['ETag'], '"etag"')
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(response.content_type, 'text/vtt')
+
+    @mock.patch('azure_media_services.transcripts.http_get')
+    def test_transcript_handler_gzip_and_revalidation(self, http_get_mock):
+        http_get_mock.return_value = mock.Mock(
+            status_code=200, headers={}, iter_content=mock.Mock(return_value=iter(['WEBVTT']))
+        )
+        block = self.make_one(captions=[{'srclang': 'en', 'src': 'test_transcript_url'}])
+
+        response = block.transcript(Request.blank('/', headers={'Accept-Encoding': 'gzip'}), suffix='en')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(zlib.decompress(response.body, 16 + zlib.MAX_WBITS), 'WEBVTT')
+
+        # Second request is served from the cache with own (weak, since gzipped) validator:
+        response = block.transcript(Request.blank('/', headers={'Accept-Encoding': 'gzip'}), suffix='en')
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        response = block.transcript(
+            Request.blank('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}), suffix='en'
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.body, '')
+        http_get_mock.assert_called_once()
+
+    @mock.patch('azure_media_services.transcripts.http_get', return_value=mock.Mock(
+        status_code=200, headers={'Content-Length': '100'}
+    ))
+    def test_transcript_handler_size_cap(self, http_get_mock):
+        block = self.make_one(captions=[{'srclang': 'en', 'src': 'test_transcript_url'}])
+
+        with override_settings(AMS_TRANSCRIPT_MAX_SIZE=10):
+            response = block.transcript(Request.blank('/'), suffix='en')
+
+        self.assertEqual(response.status_code, 502)
+        http_get_mock.return_value.close.assert_called_once_with()
+
+    @mock.patch('azure_media_services.transcripts.http_get', return_value=mock.Mock(
+        status_code=200, headers={}, iter_content=mock.Mock(return_value=iter(['WEBVTT\n', '\n' * 10]))
+    ))
+    def test_transcript_handler_size_cap_without_content_length(self, http_get_mock):
+        block = self.make_one(captions=[{'srclang': 'en', 'src': 'test_transcript_url'}])
+
+        with override_settings(AMS_TRANSCRIPT_MAX_SIZE=10):
+            response = block.transcript(Request.blank('/'), suffix='en')
+            # Headers are already out, so the body fails rather than ends short (WSGI aborts the connection):
+            with self.assertRaises(TranscriptTooLarge):
+                list(response.app_iter)
+
+        # Nothing is cached, the next request asks the storage again:
+        http_get_mock.return_value.iter_content.return_value = iter(['WEBVTT'])
+        response = block.transcript(Request.blank('/'), suffix='en')
+        self.assertEqual(zlib.decompress(response.body, 16 + zlib.MAX_WBITS), 'WEBVTT')
+        self.assertEqual(http_get_mock.call_count, 2)
+
+    def test_transcript_handler_unknown_language(self):
+        block = self.make_one(captions=[{'srclang': 'en', 'src': 'test_transcript_url'}])
+
+        self.assertEqual(block.transcript(Request.blank('/'), suffix='fr').status_code, 404)
+        self.assertEqual(block.transcript(Request.blank('/', method='POST'), suffix='en').status_code, 405)
+
+    def make_block_with_cached_transcripts(self):
+        captions = [
+            {'srclang': 'en', 'label': 'English', 'src': '//blob/en.vtt'},
+            {'srclang': 'fr', 'label': 'French', 'src': '//blob/fr.vtt'},
+        ]
+        block = self.make_one(captions=captions)
+        block.runtime.local_resource_url.side_effect = lambda _block, path: '/resource/' + path
+        for caption in captions:
+            get_transcript_cache().store(
+                get_transcript_cache().make_key(caption['src'], caption['srclang']),
+                'WEBVTT\n\n00:00:01.000 --> 00:00:02.000\n{}'.format(caption['label'])
+            )
+        return block
+
+    @mock.patch('azure_media_services.ams.get_language', return_value='fr-ca')
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
+    @mock.patch('azure_media_services.transcripts.http_get')
+    def test_student_view_prefetches_cached_transcript(self, http_get, _get_embed_url, _get_language):
+        block = self.make_block_with_cached_transcripts()
+
+        fragment = block.student_view({})
+
+        self.assertEqual(fragment.json_init_args['transcript_prefetch'], {
+            'lang': 'fr', 'cues': {'start': [1.0], 'end': [2.0], 'text': ['French']}
+        })
+        http_get.assert_not_called()
+
+    @mock.patch('azure_media_services.ams.get_language', return_value='de')
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
+    def test_student_view_prefetch_falls_back_to_first_transcript(self, _get_embed_url, _get_language):
+        block = self.make_block_with_cached_transcripts()
+
+        fragment = block.student_view({})
+
+        self.assertEqual(fragment.json_init_args['transcript_prefetch']['lang'], 'en')
+
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
+    @mock.patch('azure_media_services.transcripts.http_get')
+    def test_student_view_prefetch_is_cache_only(self, http_get, _get_embed_url):
+        block = self.make_one(captions=[{'srclang': 'en', 'label': 'English', 'src': '//blob/en.vtt'}])
+        block.runtime.local_resource_url.side_effect = lambda _block, path: '/resource/' + path
+
+        fragment = block.student_view({})
+
+        self.assertIsNone(fragment.json_init_args['transcript_prefetch'])
+        http_get.assert_not_called()
+
+    @override_settings(AMS_TRANSCRIPT_PREFETCH_MAX_SIZE=20)
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
+    def test_student_view_prefetch_size_cap(self, _get_embed_url):
+        block = self.make_block_with_cached_transcripts()
+
+        fragment = block.student_view({})
+
+        self.assertIsNone(fragment.json_init_args['transcript_prefetch'])
+
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
+    def test_student_view_lazy_load(self, _get_embed_url):
+        block = self.make_one(video_url='https://video.url', lazy_load='on')
+        block.runtime.local_resource_url.side_effect = lambda _block, path: '/resource/' + path
+
+        fragment = block.student_view({})
+
+        self.assertIn('js-amp-placeholder', fragment.content)
+        self.assertIn('data-lazy-setup', fragment.content)
+        self.assertNotIn(ams.AMP_JS_URL, [resource.data for resource in fragment.resources])
+        self.assertTrue(fragment.json_init_args['lazy_load'])
+        self.assertEqual(fragment.json_init_args['amp_urls'], {'js': ams.AMP_JS_URL, 'css': ams.AMP_CSS_URL})
+
+        block.lazy_load = 'off'
+        fragment = block.student_view({})
+
+        self.assertNotIn('js-amp-placeholder', fragment.content)
+        self.assertIn(ams.AMP_JS_URL, [resource.data for resource in fragment.resources])
+        self.assertFalse(fragment.json_init_args['lazy_load'])
+
+    def test_lazy_load_setting(self):
+        block = self.make_one()
+        self.assertFalse(block.is_lazy_load())
+
+        with override_settings(AMS_PLAYER_LAZY_LOAD=True):
+            self.assertTrue(block.is_lazy_load())
+            self.assertFalse(block._get_context_for_template(embedded=True)['lazy_load'])
+            block.lazy_load = 'off'
+            self.assertFalse(block.is_lazy_load())
+
+    @mock.patch('azure_media_services.transcripts.http_get', return_value=mock.Mock(
+        status_code=200, headers={}, content='WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nHello'
+    ))
+    def test_transcript_cues_handler(self, http_get_mock):
+        block = self.make_one(captions=[{'srclang': 'en', 'src': 'test_transcript_url'}])
+
+        response = block.transcript_cues(Request.blank('/', headers={'Accept-Encoding': 'identity'}), suffix='en')
+
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertEqual(json.loads(response.body), {'start': [1.0], 'end': [2.0], 'text': ['Hello']})
+
+        response = block.transcript_cues(
+            Request.blank('/', headers={'If-None-Match': response.headers['ETag']}), suffix='en'
+        )
+        self.assertEqual(response.status_code, 304)
+        http_get_mock.assert_called_once_with('test_transcript_url', headers={})
+
+    @override_settings(AMS_TRANSCRIPT_BATCH_MAX_SIZE=3)
+    def test_transcript_cues_batch_handler(self):
+        contents = {
+            'en_url': 'WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nHello',
+            'fr_url': 'WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nBonjour',
+        }
+        fetching = []
+        all_fetching = threading.Event()
+        met = []
+
+        def get_content(url, lang, tags=None):
+            # Languages are fetched at once: each fetch sees the other one in progress:
+            fetching.append(lang)
+            if len(fetching) % 2 == 0:
+                all_fetching.set()
+            met.append(all_fetching.wait(5))
+            return contents[url]
+
+        block = self.make_one(captions=[{'srclang': 'en', 'src': 'en_url'}, {'srclang': 'fr', 'src': 'fr_url'}])
+        with mock.patch('azure_media_services.ams.get_transcript_cache') as get_transcript_cache:
+            get_transcript_cache().get_content.side_effect = get_content
+            response = block.transcript_cues_batch(Request.blank('/', headers={'Accept-Encoding': 'identity'}))
+            not_modified = block.transcript_cues_batch(Request.blank('/', headers={
+                'If-None-Match': response.headers['ETag']
+            }))
+            get_transcript_cache().get_content.side_effect = IOError('Not found')
+            failed = block.transcript_cues_batch(Request.blank('/?lang=fr&lang=de', headers={
+                'Accept-Encoding': 'identity'
+            }))
+            too_many = block.transcript_cues_batch(Request.blank('/?lang=en&lang=fr&lang=de&lang=es'))
+
+        self.assertEqual(json.loads(response.body), {'transcripts': {
+            'en': {'start': [1.0], 'end': [2.0], 'text': ['Hello']},
+            'fr': {'start': [1.0], 'end': [2.0], 'text': ['Bonjour']},
+        }, 'errors': {}})
+        self.assertIn('public', response.headers['Cache-Control'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(met, [True] * 4)
+
+        # Errors are reported per language, such a response isn't cached:
+        self.assertEqual(json.loads(failed.body), {'transcripts': {}, 'errors': {
+            'de': 'Transcript not found: language [de]', 'fr': 'Transcript fetching failure: language [fr]',
+        }})
+        self.assertEqual(failed.headers['Cache-Control'], 'no-store')
+        self.assertNotIn('ETag', failed.headers)
+        self.assertEqual(too_many.status_code, 400)
+        self.assertEqual(block.transcript_cues_batch(Request.blank('/', method='POST')).status_code, 405)
+
+    def send_heartbeats(self, block, heartbeats, started_at=1514764800):
+        """
+        Send `(seconds since the previous one, data)` heartbeats to `watch_progress`, return the responses.
+        """
+        responses = []
+        now = started_at
+        for elapsed, data in heartbeats:
+            now += elapsed
+            with mock.patch('time.time', return_value=now):
+                response = block.watch_progress(Request.blank('/', method='POST', body=json.dumps(data)))
+            responses.append(json.loads(response.body))
+        return responses
+
+    @override_settings(AMS_WATCH_HEARTBEAT_INTERVAL=30)
+    def test_watch_progress(self):
+        block = self.make_one()
+
+        def heartbeat(data):
+            return self.send_heartbeats(block, [(30, data)], started_at=block.watch_heartbeat_at or 1514764800)[0]
+
+        self.assertEqual(heartbeat({'intervals': [[0, 30]]}), {
+            'result': 'success', 'percent': None, 'completed': False
+        })
+        self.assertEqual(heartbeat({'intervals': [[29.5, 60], [80, 90]], 'duration': 100}), {
+            'result': 'success', 'percent': 70.0, 'completed': False
+        })
+        self.assertEqual(block.watched_intervals, [[0, 60], [80, 90]])
+        block.runtime.publish.assert_not_called()
+
+        self.assertEqual(heartbeat({'intervals': [[60, 80], [90, 95]], 'duration': 100}), {
+            'result': 'success', 'percent': 95.0, 'completed': True
+        })
+        self.assertEqual(block.watched_intervals, [[0, 95]])
+        block.runtime.publish.assert_called_once_with(block, 'completion', {'completion': 1.0})
+
+        # Completion is published once:
+        heartbeat({'intervals': [[95, 100]], 'duration': 100})
+        self.assertEqual(block.runtime.publish.call_count, 1)
+
+    @mock.patch('azure_media_services.ams.get_video_duration', return_value=600.0)
+    def test_watch_progress_forged_duration(self, get_video_duration):
+        block = self.make_one(edx_video_id='edx_video_id')
+
+        # The duration known to edxval is used rather than the reported one:
+        responses = self.send_heartbeats(block, [(15, {'intervals': [[0, 1]], 'duration': 1})])
+
+        get_video_duration.assert_called_once_with('edx_video_id')
+        self.assertEqual(responses, [{'result': 'success', 'percent': 0.2, 'completed': False}])
+        self.assertEqual(block.watched_duration, 600)
+
+        # Without one, the first reported duration is kept, a shorter one doesn't make the watched share larger:
+        get_video_duration.return_value = None
+        block = self.make_one(edx_video_id='edx_video_id')
+        responses = self.send_heartbeats(block, [
+            (15, {'intervals': [[0, 10]], 'duration': 100}),
+            (15, {'intervals': [[10, 11]], 'duration': 11}),
+        ])
+
+        self.assertEqual([response['percent'] for response in responses], [10.0, 11.0])
+        self.assertEqual(block.watched_duration, 100)
+        block.runtime.publish.assert_not_called()
+
+    @override_settings(AMS_WATCH_HEARTBEAT_INTERVAL=15, AMS_WATCH_MAX_PLAYBACK_RATE=2, AMS_WATCH_HEARTBEAT_SLACK=5)
+    def test_watch_progress_forged_intervals(self):
+        block = self.make_one()
+
+        # A heartbeat is credited what could've been watched since the previous one (the duration isn't known yet):
+        responses = self.send_heartbeats(block, [
+            (15, {'intervals': [[0, 1e9]]}),
+            (10, {'intervals': [[100, 1e9]]}),
+            (3600, {'intervals': [[20, 60]], 'duration': 100}),
+        ])
+
+        # Up to the heartbeat interval at twice the speed plus slack, the parts past the end don't count:
+        self.assertEqual(block.watched_intervals, [[0, 55], [100, 125]])
+        self.assertEqual(responses[-1], {'result': 'success', 'percent': 55.0, 'completed': False})
+        block.runtime.publish.assert_not_called()
+
+    def test_watch_progress_malformed(self):
+        block = self.make_one()
+
+        for data in ({}, {'intervals': [[10, 5]]}, {'intervals': [[0, 1]], 'duration': 'long'}):
+            response = block.watch_progress(Request.blank('/', method='POST', body=json.dumps(data)))
+            self.assertEqual(json.loads(response.body)['result'], 'error')
+        self.assertEqual(block.watched_intervals, [])
+
+    @override_settings(AMS_WATCH_HEARTBEAT_INTERVAL=30)
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
+    def test_student_view_watch_heartbeat(self, _get_embed_url):
+        block = self.make_one(video_url='https://video.url')
+        block.runtime.local_resource_url.side_effect = lambda _block, path: '/resource/' + path
+
+        self.assertEqual(block.student_view({}).json_init_args['watch_heartbeat_interval'], 30)
+
+        block.runtime.user_id = None
+        self.assertEqual(block.student_view({}).json_init_args['watch_heartbeat_interval'], 0)
+
+    @override_settings(AMS_WATCH_HEARTBEAT_INTERVAL=0)
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
+    def test_student_view_completes_without_watch_tracking(self, _get_embed_url):
+        block = self.make_one(video_url='https://video.url')
+
+        block.student_view({})
+        block.student_view({})
+
+        # There are no progress reports to complete the block with, it's completed on view then (once):
+        block.runtime.publish.assert_called_once_with(block, 'completion', {'completion': 1.0})
+        self.assertTrue(block.watch_completed)
+
+        anonymous = self.make_one(video_url='https://video.url')
+        anonymous.runtime.user_id = None
+        anonymous.student_view({})
+        anonymous.runtime.publish.assert_not_called()
+
+    @override_settings(AMS_WATCH_HEARTBEAT_INTERVAL=30)
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
+    def test_student_view_does_not_complete_with_watch_tracking(self, _get_embed_url):
+        block = self.make_one(video_url='https://video.url')
+
+        block.student_view({})
+
+        block.runtime.publish.assert_not_called()
+
+    def test_publish_events(self):
+        block = self.make_one(video_url='video_url')
+        block.scope_ids.user_id = 'user_id'
+        test_data = {'events': [
+            {'event_type': 'edx.video.played', 'data': {}, 'timestamp': '2017-01-01T00:00:00.000Z'},
+            {'data': {}},
+            {'event_type': 'edx.video.closed_captions.shown', 'data': {'language_name': 'English'}},
+        ]}
+
+        handler_response = block.publish_events(mock.Mock(method="POST", body=json.dumps(test_data)))
+
+        self.assertEqual(handler_response.json, {
+            'result': 'success',
+            'published': 2,
+            'errors': [{'index': 1, 'message': 'Missing event_type in JSON data'}]
+        })
+        self.assertEqual(block.runtime.publish.call_args_list, [
+            mock.call(block, 'edx.video.played', {
+                'client_timestamp': '2017-01-01T00:00:00.000Z', 'video_url': 'video_url', 'user_id': 'user_id'
+            }),
+            mock.call(block, 'edx.video.closed_captions.shown', {
+                'language_name': 'English', 'video_url': 'video_url', 'user_id': 'user_id'
+            }),
+        ])
+
+    def test_publish_events_batch_size(self):
+        block = self.make_one()
+        test_data = {'events': [{'event_type': 'edx.video.played'}] * 3}
+
+        with override_settings(AMS_EVENTS_BATCH_MAX_SIZE=2):
+            handler_response = block.publish_events(mock.Mock(method="POST", body=json.dumps(test_data)))
+
+        self.assertEqual(handler_response.json['result'], 'error')
+        block.runtime.publish.assert_not_called()
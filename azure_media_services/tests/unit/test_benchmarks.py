@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from azure_media_services.tests import fakes
+from azure_media_services.tests.benchmarks import load, suite
+
+
+class BenchmarkSuiteTests(unittest.TestCase):
+
+    def test_percentile(self):
+        samples = range(1, 101)
+
+        self.assertEqual(suite.percentile(samples, 0.50), 50)
+        self.assertEqual(suite.percentile(samples, 0.95), 95)
+        self.assertEqual(suite.percentile(samples, 0.99), 99)
+        self.assertEqual(suite.percentile([7], 0.99), 7)
+
+    def test_compare(self):
+        base = {'p50_ms': 1.0, 'p95_ms': 2.0, 'retained_objects_per_call': 0.0}
+        baseline = {'fast': base, 'slow': base, 'leaky': base}
+        results = {
+            'fast': {'p50_ms': 1.2, 'p95_ms': 2.4, 'retained_objects_per_call': 1.0},
+            'slow': {'p50_ms': 1.5, 'p95_ms': 2.0, 'retained_objects_per_call': 0.0},
+            'leaky': {'p50_ms': 1.0, 'p95_ms': 2.0, 'retained_objects_per_call': 10.0},
+            'new': {'p50_ms': 9.0, 'p95_ms': 9.0, 'retained_objects_per_call': 9.0},
+        }
+
+        regressions = suite.compare(results, baseline, tolerance=0.25)
+
+        self.assertItemsEqual(
+            [regression.split(' ')[:2] for regression in regressions],
+            [['slow:', 'p50_ms'], ['leaky:', 'retained_objects_per_call']]
+        )
+
+    def test_handlers_succeed_offline(self):
+        with suite.OfflineEnvironment(videos=120, cues=10) as env:
+            for name, benchmark in suite.get_benchmarks(env).items():
+                response = benchmark()
+                if name.startswith(('student_view', 'studio_view')):
+                    self.assertTrue(response.content, name)
+                elif name.startswith('get_captions_and_video_info'):
+                    self.assertEqual(response.json_body['error_message'], '', name)
+                    self.assertEqual(len(response.json_body['captions']), 3, name)
+                else:
+                    self.assertEqual(response.json_body['result'], 'success', name)
+            # The warm one is fetched once, the cold one each time:
+            self.assertEqual(env.transcript_server.requests, 2)
+
+    def test_run(self):
+        results = suite.run(['publish_event'], iterations=3, warmup=1, videos=10, cues=10)
+
+        self.assertEqual(list(results), ['publish_event'])
+        self.assertEqual(results['publish_event']['iterations'], 3)
+        self.assertGreater(results['publish_event']['ops_per_sec'], 0)
+
+
+class LoadTests(unittest.TestCase):
+
+    def test_find_saturation(self):
+        levels = [
+            {'learners': 1, 'ops_per_sec': 100},
+            {'learners': 2, 'ops_per_sec': 190},
+            {'learners': 4, 'ops_per_sec': 200},
+            {'learners': 8, 'ops_per_sec': 150},
+        ]
+
+        self.assertEqual(load.find_saturation(levels), 2)
+        self.assertIsNone(load.find_saturation(levels[:2]))
+
+    def test_run(self):
+        results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, results_dir)
+        results_path = os.path.join(results_dir, 'results.json')
+
+        load.main(['--learners', '1', '2', '--duration', '0.2', '--cues', '10', '--json', results_path])
+
+        with open(results_path) as results_file:
+            results = json.load(results_file)
+        self.assertEqual([level['learners'] for level in results['levels']], [1, 2])
+        for level in results['levels']:
+            self.assertItemsEqual(level['operations'], load.OPERATIONS)
+            for stats in level['operations'].values():
+                self.assertGreater(stats['calls'], 0)
+                self.assertEqual(stats['errors'], 0)
+
+    def test_media_service_errors(self):
+        media_service = fakes.FakeMediaServiceClient(error_rate=1)
+
+        with self.assertRaises(IOError):
+            media_service.get_asset_files('asset_id')
+        self.assertEqual(media_service.errors, 1)
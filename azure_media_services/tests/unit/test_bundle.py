@@ -0,0 +1,47 @@
+import unittest
+
+from django.test.utils import override_settings
+import mock
+from xblock.field_data import DictFieldData
+
+from azure_media_services import AMSXBlock
+from azure_media_services.bundle import build_bundle, get_bundle_manifest
+
+
+@mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', mock.Mock(return_value=None))
+class BundleTests(unittest.TestCase):
+
+    def make_block(self):
+        block = AMSXBlock(mock.Mock(user_id='user_id'), DictFieldData({}), mock.Mock())
+        block.location = mock.Mock(org='org_name', course_key='course_key')
+        block.runtime.local_resource_url.side_effect = lambda _block, path: '/resource/' + path
+        return block
+
+    def test_bundle_is_up_to_date(self):
+        """
+        Run `make bundle` if this one fails.
+        """
+        manifest = get_bundle_manifest()
+        built = build_bundle()
+
+        self.assertEqual(manifest['js'], 'public/bundle/' + built['js'][0])
+        self.assertEqual(manifest['css'], 'public/bundle/' + built['css'][0])
+
+    def test_student_view_references_bundle(self):
+        manifest = get_bundle_manifest()
+        fragment = self.make_block().student_view({})
+
+        urls = [resource.data for resource in fragment.resources if resource.kind == 'url']
+        self.assertIn('/resource/' + manifest['js'], urls)
+        self.assertIn('/resource/' + manifest['css'], urls)
+        self.assertNotIn('function AzureMediaServicesBlock', fragment.head_html() + fragment.foot_html())
+
+    @override_settings(AMS_USE_ASSET_BUNDLE=False)
+    def test_student_view_inlines_sources_without_bundle(self):
+        fragment = self.make_block().student_view({})
+
+        self.assertIn('function AzureMediaServicesBlock', fragment.foot_html())
+        self.assertFalse([
+            resource for resource in fragment.resources
+            if resource.kind == 'url' and resource.data.startswith('/resource/')
+        ])
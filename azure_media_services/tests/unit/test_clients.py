@@ -0,0 +1,83 @@
+import threading
+import time
+import unittest
+
+import mock
+
+from azure_media_services.clients import MediaServiceClients
+from azure_media_services.executor import get_thread_pool
+
+
+class MediaServiceClientsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clients = MediaServiceClients(ttl=3600, refresh_margin=600)
+        self.config = {'client_id': 'client_id', 'secret': 'secret'}
+        self.build = mock.Mock(side_effect=lambda org: mock.Mock(org=org))
+
+    def get_config(self, org):
+        return self.config
+
+    def get(self, org='org'):
+        return self.clients.get(org, self.build, self.get_config)
+
+    def test_client_is_reused(self):
+        client = self.get()
+
+        self.assertIs(self.get(), client)
+        self.assertIsNot(self.get('other_org'), client)
+        self.assertEqual(self.build.call_args_list, [mock.call('org'), mock.call('other_org')])
+
+    def test_config_change_drops_client(self):
+        client = self.get()
+        self.config = dict(self.config, secret='new_secret')
+
+        self.assertIsNot(self.get(), client)
+        self.assertEqual(self.build.call_count, 2)
+
+    @mock.patch('azure_media_services.clients.time')
+    def test_expired_client_is_rebuilt(self, time_mock):
+        time_mock.time.return_value = 1000
+        client = self.get()
+
+        time_mock.time.return_value = 1000 + 3600
+        self.assertIsNot(self.get(), client)
+
+    @mock.patch('azure_media_services.clients.connection')
+    @mock.patch('azure_media_services.clients.time')
+    def test_client_is_refreshed_in_background(self, time_mock, connection):
+        time_mock.time.return_value = 1000
+        client = self.get()
+        time_mock.time.return_value = 1000 + 3000
+
+        # The request doesn't wait for the new client:
+        self.assertIs(self.get(), client)
+        # Wait for the refresh queued on the pool:
+        get_thread_pool('ams-clients', 1).apply(lambda: None)
+
+        self.assertIsNot(self.get(), client)
+        self.assertEqual(self.build.call_count, 2)
+        connection.close.assert_called_once_with()
+
+    def test_concurrent_requests_build_once(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def build(org):
+            started.set()
+            release.wait(5)
+            return mock.Mock()
+
+        self.build = mock.Mock(side_effect=build)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.get())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        started.wait(5)
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(self.build.call_count, 1)
+        self.assertEqual(len(set(id(result) for result in results)), 1)
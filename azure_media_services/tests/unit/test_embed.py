@@ -0,0 +1,178 @@
+import sys
+import unittest
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware import csrf
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+import mock
+
+from azure_media_services import ams
+from azure_media_services.cache import clear_local_caches
+from azure_media_services.embed import invalidate_embed_cache_on_publish
+
+USAGE_KEY_STRING = 'block-v1:org+course+run+type@azure_media_services+block@video'
+
+
+def make_request(authenticated=False, if_none_match=None, host='lms.com'):
+    request = mock.Mock(META={})
+    request.get_host.return_value = host
+    request.user.is_authenticated.return_value = authenticated
+    if if_none_match:
+        request.META['HTTP_IF_NONE_MATCH'] = if_none_match
+    return request
+
+
+@mock.patch('azure_media_services.ams.modulestore')
+@mock.patch('azure_media_services.ams.UsageKey')
+class EmbedPlayerTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        self.block = mock.Mock(share='staff_only')
+        self.get_module_by_usage_id = mock.Mock(return_value=(self.block, None))
+        self.render_xblock = mock.Mock(side_effect=self.fake_render_xblock)
+        patcher = mock.patch.dict(sys.modules, {
+            'lms': mock.Mock(),
+            'lms.djangoapps': mock.Mock(),
+            'lms.djangoapps.courseware': mock.Mock(),
+            'lms.djangoapps.courseware.module_render': mock.Mock(get_module_by_usage_id=self.get_module_by_usage_id),
+            'lms.djangoapps.courseware.views': mock.Mock(),
+            'lms.djangoapps.courseware.views.views': mock.Mock(render_xblock=self.render_xblock),
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def fake_render_xblock(request, *args, **kwargs):  # pylint: disable=unused-argument
+        response = HttpResponse(b'<html>player</html>', content_type='text/html; charset=utf-8')
+        # As `xframe_options_exempt` decorator of `render_xblock` does:
+        response.xframe_options_exempt = True
+        return response
+
+    @staticmethod
+    def render_xblock_with_csrf_token(request, *args, **kwargs):  # pylint: disable=unused-argument
+        response = HttpResponse(
+            u'<html><input name="csrfmiddlewaretoken" value="{}"></html>'.format(csrf.get_token(request)),
+            content_type='text/html; charset=utf-8'
+        )
+        response.xframe_options_exempt = True
+        response.set_cookie('lang', 'en')
+        return response
+
+    @staticmethod
+    def get_csrf_token(response):
+        return response.content.split(b'value="')[1].split(b'"')[0].decode('ascii')
+
+    @staticmethod
+    def configure_usage_key(usage_key_class):
+        usage_key = usage_key_class.from_string.return_value
+        usage_key.__unicode__ = lambda _self: USAGE_KEY_STRING
+        usage_key.course_key.org = 'org'
+        usage_key.course_key.course = 'course'
+        return usage_key
+
+    def embed_player(self, request):
+        return ams.get_embed_player_response(request, USAGE_KEY_STRING)
+
+    def test_anonymous_page_is_cached(self, usage_key_class, _modulestore):
+        self.configure_usage_key(usage_key_class)
+
+        first = self.embed_player(make_request())
+        second = self.embed_player(make_request())
+
+        self.assertEqual(self.get_module_by_usage_id.call_count, 1)
+        self.assertEqual(self.render_xblock.call_count, 1)
+        self.assertEqual(second.content, b'<html>player</html>')
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('public', second['Cache-Control'])
+        self.assertIn('max-age=300', second['Cache-Control'])
+
+        not_modified = self.embed_player(make_request(if_none_match=first['ETag']))
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_authenticated_page_is_not_cached(self, usage_key_class, _modulestore):
+        self.configure_usage_key(usage_key_class)
+
+        self.embed_player(make_request(authenticated=True))
+        response = self.embed_player(make_request(authenticated=True))
+
+        self.assertEqual(self.render_xblock.call_count, 2)
+        # The share decision is cached though:
+        self.assertEqual(self.get_module_by_usage_id.call_count, 1)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_not_shared(self, usage_key_class, _modulestore):
+        self.configure_usage_key(usage_key_class)
+        self.block.share = 'off'
+
+        self.assertEqual(self.embed_player(make_request()).status_code, 400)
+        self.assertEqual(self.embed_player(make_request()).status_code, 400)
+
+        self.assertEqual(self.get_module_by_usage_id.call_count, 1)
+        self.render_xblock.assert_not_called()
+
+    def test_invalidated_on_course_publish(self, usage_key_class, _modulestore):
+        usage_key = self.configure_usage_key(usage_key_class)
+        self.block.share = 'off'
+        self.embed_player(make_request())
+
+        self.block.share = 'staff_only'
+        invalidate_embed_cache_on_publish(sender=None, course_key=usage_key.course_key)
+
+        self.assertEqual(self.embed_player(make_request()).status_code, 200)
+        self.assertEqual(self.get_module_by_usage_id.call_count, 2)
+
+    def test_pages_are_cached_per_host(self, usage_key_class, _modulestore):
+        self.configure_usage_key(usage_key_class)
+        self.render_xblock.side_effect = lambda request, *args, **kwargs: HttpResponse(
+            u'<html>{}</html>'.format(request.get_host()), content_type='text/html; charset=utf-8'
+        )
+
+        self.embed_player(make_request())
+        other_site = self.embed_player(make_request(host='school.lms.com'))
+        cached = self.embed_player(make_request())
+
+        self.assertEqual(self.render_xblock.call_count, 2)
+        self.assertEqual(other_site.content, b'<html>school.lms.com</html>')
+        self.assertEqual(cached.content, b'<html>lms.com</html>')
+
+    def test_framing_is_allowed(self, usage_key_class, _modulestore):
+        self.configure_usage_key(usage_key_class)
+        middleware = XFrameOptionsMiddleware()
+
+        first = self.embed_player(make_request())
+        second = self.embed_player(make_request())
+        not_modified = self.embed_player(make_request(if_none_match=first['ETag']))
+
+        for response in (first, second, not_modified):
+            self.assertFalse(middleware.process_response(None, response).has_header('X-Frame-Options'))
+        self.assertEqual(second['Content-Type'], 'text/html; charset=utf-8')
+
+    def test_anonymous_visitors_get_own_csrf_tokens(self, usage_key_class, _modulestore):
+        self.configure_usage_key(usage_key_class)
+        self.render_xblock.side_effect = self.render_xblock_with_csrf_token
+        first_request, second_request = make_request(), make_request()
+
+        first = self.embed_player(first_request)
+        second = self.embed_player(second_request)
+
+        self.assertEqual(self.render_xblock.call_count, 1)
+        # The first visitor gets the rendered response as is, cookies included:
+        self.assertIn('lang', first.cookies)
+        first_token, second_token = self.get_csrf_token(first), self.get_csrf_token(second)
+        self.assertNotEqual(first_token, second_token)
+        self.assertNotIn(b'__AMS_CSRF_TOKEN__', second.content)
+        # Each token matches the visitor's own cookie (set by the middleware since the token's been used):
+        self.assertTrue(second_request.META['CSRF_COOKIE_USED'])
+        self.assertEqual(
+            csrf._unsalt_cipher_token(second_token),  # pylint: disable=protected-access
+            csrf._unsalt_cipher_token(second_request.META['CSRF_COOKIE']),  # pylint: disable=protected-access
+        )
+        self.assertNotEqual(second_request.META['CSRF_COOKIE'], first_request.META['CSRF_COOKIE'])
+        # CDNs mustn't hand the page out to others:
+        for response in (first, second):
+            self.assertIn('private', response['Cache-Control'])
+            self.assertNotIn('public', response['Cache-Control'])
+        self.assertEqual(second['ETag'], first['ETag'])
@@ -0,0 +1,254 @@
+from contextlib import contextmanager
+from datetime import datetime
+import threading
+import unittest
+
+from django.test.utils import override_settings
+from django.utils.timezone import utc
+import mock
+from xblock.field_data import DictFieldData
+
+from azure_media_services import AMSXBlock
+from azure_media_services.events import AsyncEventPublisher, BLOCK, DROP_OLDEST
+
+SHIM_CONTEXT_FIELDS = ['username', 'session', 'ip', 'agent', 'host', 'referer', 'accept_language', 'event_type']
+
+
+class FakeTracker(object):
+    """
+    `eventtracking` tracker merging the entered contexts.
+    """
+
+    def __init__(self, context):
+        """
+        Start with the request's context (as the tracking middleware enters it).
+        """
+        self.contexts = [context]
+
+    @contextmanager
+    def context(self, name, context):  # pylint: disable=unused-argument
+        self.contexts.append(context)
+        try:
+            yield
+        finally:
+            self.contexts.pop()
+
+    def resolve_context(self):
+        merged = {}
+        for context in self.contexts:
+            merged.update(context)
+        return merged
+
+
+def remove_shim_context(event):
+    """
+    As LMS's `track.shim.remove_shim_context`.
+    """
+    for field in SHIM_CONTEXT_FIELDS + ['client_id']:
+        event['context'].pop(field, None)
+
+
+def get_request_header(request, header, default=''):
+    return request.META.get(header, default) if request is not None else default
+
+
+def make_tracking(logged):
+    tracker = FakeTracker({'session': 'session', 'user_id': None, 'path': '/handler/publish_event', 'ip': 'ip'})
+    track_views = mock.Mock(
+        _get_request_ip=lambda request: request.META['REMOTE_ADDR'],
+        _get_request_header=get_request_header,
+        log_event=logged.append,
+    )
+    return mock.Mock(get_tracker=lambda: tracker), track_views
+
+
+def make_request():
+    request = mock.Mock(META={
+        'REMOTE_ADDR': '10.0.0.1', 'HTTP_REFERER': 'https://lms.com/courses', 'HTTP_ACCEPT_LANGUAGE': 'en',
+        'HTTP_USER_AGENT': 'Mozilla', 'SERVER_NAME': 'lms.com',
+    })
+    request.user.username = 'learner'
+    return request
+
+
+@contextmanager
+def lms_tracking(logged, request):
+    tracker, track_views = make_tracking(logged)
+    with mock.patch('azure_media_services.events.tracker', tracker), \
+            mock.patch('azure_media_services.events.track_views', track_views), \
+            mock.patch('azure_media_services.events.track_shim', mock.Mock(remove_shim_context=remove_shim_context)), \
+            mock.patch('azure_media_services.events.get_current_request', return_value=request):
+        yield tracker, track_views
+
+
+class AsyncEventPublisherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.logged = []
+        self.sink = mock.Mock()
+        patcher = mock.patch('azure_media_services.events.get_metrics_sink', return_value=self.sink)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_events_are_published_in_order(self):
+        publisher = AsyncEventPublisher()
+
+        with lms_tracking(self.logged, make_request()):
+            for position in range(5):
+                self.assertTrue(publisher.put('edx.video.played', {'position': position}, {'user_id': 'user_id'}))
+            self.assertTrue(publisher.flush(timeout=5))
+
+        self.assertEqual([(event['event_type'], event['event']) for event in self.logged],
+                         [('edx.video.played', {'position': position}) for position in range(5)])
+        # The request's context captured at queuing time is kept along with the block's one:
+        self.assertEqual(self.logged[0]['context'], {'path': '/handler/publish_event', 'user_id': 'user_id'})
+        self.assertEqual(publisher.stats(), {'queue_depth': 0, 'published': 5, 'dropped': 0, 'failed': 0})
+        self.sink.gauge.assert_called_with('events.queue_depth', 0, {})
+
+    def test_overflow_policies(self):
+        picked = threading.Semaphore(0)
+        release = threading.Event()
+
+        def log_event(event):
+            self.logged.append(event)
+            picked.release()
+            release.wait(5)
+
+        with lms_tracking(self.logged, make_request()) as (_tracker, track_views):
+            track_views.log_event = log_event
+            publisher = AsyncEventPublisher(max_size=1, overflow=DROP_OLDEST)
+            publisher.put('first', {})
+            # Once the worker has picked up the first event, the queue is empty again:
+            self.assertTrue(picked.acquire(True))
+            self.assertTrue(publisher.put('second', {}))
+            self.assertTrue(publisher.put('third', {}))
+            self.assertEqual(publisher.stats()['dropped'], 1)
+
+            blocking_publisher = AsyncEventPublisher(max_size=1, overflow=BLOCK, block_timeout=0.01)
+            blocking_publisher.put('fourth', {})
+            self.assertTrue(picked.acquire(True))
+            blocking_publisher.put('fifth', {})
+            self.assertFalse(blocking_publisher.put('sixth', {}))
+            self.assertEqual(blocking_publisher.stats()['dropped'], 1)
+
+            release.set()
+            self.assertTrue(publisher.flush())
+            self.assertTrue(blocking_publisher.flush())
+
+        # The oldest queued event is dropped with `drop_oldest`, the newest one with `block`:
+        self.assertEqual(sorted(event['event_type'] for event in self.logged), ['fifth', 'first', 'fourth', 'third'])
+        self.assertEqual(self.sink.increment.call_args_list, [mock.call('events.dropped', {})] * 2)
+
+    def test_failures_are_counted(self):
+        publisher = AsyncEventPublisher()
+
+        with lms_tracking(self.logged, make_request()) as (_tracker, track_views):
+            track_views.log_event = mock.Mock(side_effect=ValueError)
+            publisher.put('edx.video.played', {})
+            self.assertTrue(publisher.flush())
+
+        self.assertEqual(publisher.stats()['failed'], 1)
+        self.sink.increment.assert_called_once_with('events.failed', {})
+
+
+class AsyncPublishingModeTests(unittest.TestCase):
+
+    def make_block(self):
+        block = AMSXBlock(mock.Mock(), DictFieldData({}), mock.Mock(user_id='user_id'))
+        block.location = mock.Mock(org='org', course_key='course-v1:org+course+run')
+        return block
+
+    @override_settings(AMS_EVENTS_PUBLISH_MODE='async')
+    @mock.patch('azure_media_services.events.tracker')
+    @mock.patch('azure_media_services.events.track_views')
+    @mock.patch('azure_media_services.ams.get_event_publisher')
+    def test_publish_event_is_queued(self, get_event_publisher, _track_views, _tracker):
+        block = self.make_block()
+
+        block._publish_event('edx.video.played', {})
+
+        block.runtime.publish.assert_not_called()
+        get_event_publisher().put.assert_called_once_with(
+            'edx.video.played', {'video_url': '', 'user_id': 'user_id'},
+            {'user_id': 'user_id', 'course_id': 'course-v1:org+course+run', 'org_id': 'org', 'asides': {}}
+        )
+
+    @override_settings(AMS_EVENTS_PUBLISH_MODE='async')
+    @mock.patch('azure_media_services.events.tracker')
+    @mock.patch('azure_media_services.events.track_views')
+    @mock.patch('azure_media_services.ams.get_event_publisher')
+    def test_runtime_handled_events_are_published_inline(self, get_event_publisher, _track_views, _tracker):
+        block = self.make_block()
+
+        for event_type in ('grade', 'completion', 'progress'):
+            block._publish_event(event_type, {})
+
+        get_event_publisher().put.assert_not_called()
+        self.assertEqual(block.runtime.publish.call_count, 3)
+
+    @override_settings(AMS_EVENTS_PUBLISH_MODE='async')
+    @mock.patch('azure_media_services.events.tracker', None)
+    @mock.patch('azure_media_services.ams.get_event_publisher')
+    def test_published_inline_without_eventtracking(self, get_event_publisher):
+        block = self.make_block()
+
+        block._publish_event('edx.video.played', {})
+
+        get_event_publisher().put.assert_not_called()
+        block.runtime.publish.assert_called_once_with(
+            block, 'edx.video.played', {'video_url': '', 'user_id': 'user_id'}
+        )
+
+    @mock.patch('azure_media_services.events.datetime')
+    def test_async_event_is_logged_as_sync_one(self, events_datetime):
+        now = datetime(2018, 1, 1, 12, 0)
+        events_datetime.utcnow.return_value = now
+        request = make_request()
+        block = self.make_block()
+        sync_logged, async_logged = [], []
+
+        def server_track(request, event_type, event, page=None):
+            """
+            As LMS's `track.views.server_track` (called by `runtime.publish` for tracking events).
+            """
+            logged_event = {
+                'username': request.user.username,
+                'ip': track_views._get_request_ip(request),
+                'referer': get_request_header(request, 'HTTP_REFERER'),
+                'accept_language': get_request_header(request, 'HTTP_ACCEPT_LANGUAGE'),
+                'event_source': 'server',
+                'event_type': event_type,
+                'event': event,
+                'agent': get_request_header(request, 'HTTP_USER_AGENT'),
+                'page': page,
+                'time': now.replace(tzinfo=utc),
+                'host': get_request_header(request, 'SERVER_NAME'),
+                'context': tracker.get_tracker().resolve_context(),
+            }
+            remove_shim_context(logged_event)
+            track_views.log_event(logged_event)
+
+        def runtime_publish(publishing_block, event_type, event):
+            """
+            As LMS runtime's `publish` of a tracking event.
+            """
+            context = {'course_id': unicode(publishing_block.location.course_key),
+                       'org_id': publishing_block.location.org, 'user_id': 'user_id', 'asides': {}}
+            with tracker.get_tracker().context(event_type, context):
+                server_track(request, event_type, event, page='x_module')
+
+        block.runtime.publish.side_effect = runtime_publish
+        with lms_tracking(sync_logged, request) as (tracker, track_views):
+            block._publish_event('edx.video.played', {'currentTime': 1.5})
+
+        publisher = AsyncEventPublisher()
+        with override_settings(AMS_EVENTS_PUBLISH_MODE='async'), \
+                mock.patch('azure_media_services.ams.get_event_publisher', return_value=publisher), \
+                lms_tracking(async_logged, request):
+            block._publish_event('edx.video.played', {'currentTime': 1.5})
+            self.assertTrue(publisher.flush())
+
+        self.assertEqual(block.runtime.publish.call_count, 1)
+        self.assertEqual(len(sync_logged), 1)
+        self.assertEqual(sync_logged[0]['page'], 'x_module')
+        self.assertEqual(async_logged, sync_logged)
@@ -0,0 +1,60 @@
+from multiprocessing import TimeoutError
+import threading
+import time
+import unittest
+
+from azure_media_services.executor import get_thread_pool, run_concurrently
+
+
+class RunConcurrentlyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = get_thread_pool('test', 4)
+
+    def test_calls_run_in_parallel(self):
+        barrier = threading.Event()
+        started = []
+
+        def call(value):
+            started.append(value)
+            if len(started) == 3:
+                barrier.set()
+            # Would hang unless all the calls are run at the same time:
+            barrier.wait(5)
+            return value
+
+        start = time.time()
+        outcomes = run_concurrently(self.pool, [(call, (i,)) for i in range(3)], timeout=5)
+
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([outcome.value for outcome in outcomes], [0, 1, 2])
+
+    def test_errors_and_timeouts_are_isolated(self):
+        def fail():
+            raise ValueError()
+
+        outcomes = run_concurrently(self.pool, [(time.sleep, (0.5,)), (fail, ()), (len, ('ok',))], timeout=0.1)
+
+        self.assertIsInstance(outcomes[0].error, TimeoutError)
+        self.assertIsInstance(outcomes[1].error, ValueError)
+        self.assertEqual(outcomes[2].value, 2)
+
+    def test_durations(self):
+        outcomes = run_concurrently(self.pool, [(time.sleep, (0.1,)), (time.sleep, (0.5,))], timeout=0.2)
+
+        self.assertAlmostEqual(outcomes[0].duration, 0.1, delta=0.05)
+        self.assertAlmostEqual(outcomes[1].duration, 0.2, delta=0.05)
+
+    def test_calls_queued_past_deadline_are_skipped(self):
+        called = []
+        pool = get_thread_pool('test-single', 1)
+
+        outcomes = run_concurrently(pool, [(time.sleep, (0.3,)), (called.append, (True,))], timeout=0.1)
+        # Wait for the running call to return (it isn't cancelled), then for the queued one:
+        run_concurrently(pool, [(len, ('',))])
+
+        self.assertTrue(all(isinstance(outcome.error, TimeoutError) for outcome in outcomes))
+        self.assertEqual(called, [])
+
+    def test_pool_is_shared(self):
+        self.assertIs(get_thread_pool('test', 4), self.pool)
@@ -0,0 +1,31 @@
+import unittest
+
+from django.test.utils import override_settings
+import mock
+
+from azure_media_services import http_session
+
+
+class HttpSessionTests(unittest.TestCase):
+
+    @override_settings(AMS_HTTP_POOL_MAXSIZE=4, AMS_HTTP_MAX_RETRIES=2, AMS_HTTP_BACKOFF_FACTOR=0.5)
+    def test_build_http_session(self):
+        session = http_session.build_http_session()
+        adapter = session.get_adapter('https://account.blob.core.windows.net/')
+
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertEqual(adapter.max_retries.backoff_factor, 0.5)
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+
+    def test_session_is_shared(self):
+        self.assertIs(http_session.get_http_session(), http_session.get_http_session())
+
+    @override_settings(AMS_HTTP_CONNECT_TIMEOUT=1, AMS_HTTP_READ_TIMEOUT=5)
+    @mock.patch('azure_media_services.http_session.get_http_session')
+    def test_http_get(self, get_http_session):
+        http_session.http_get('//account.blob.core.windows.net/en.vtt', headers={})
+
+        get_http_session().get.assert_called_once_with(
+            'https://account.blob.core.windows.net/en.vtt', headers={}, timeout=(1, 5)
+        )
@@ -0,0 +1,151 @@
+import json
+import socket
+import unittest
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+import mock
+from xblock.field_data import DictFieldData
+
+from azure_media_services import AMSXBlock, metrics
+from azure_media_services.cache import clear_local_caches
+from azure_media_services.clients import reset_media_service_clients
+from azure_media_services.tests import fakes
+
+VIDEOS = fakes.make_videos(1)
+
+
+class RecordingSink(object):
+
+    enabled = True
+
+    def __init__(self):
+        """
+        Keep everything recorded.
+        """
+        self.timings = []
+        self.counters = []
+
+    def timing(self, name, value, tags):
+        self.timings.append((name, tags))
+
+    def increment(self, name, tags, value=1):
+        self.counters.append((name, tags, value))
+
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        metrics.reset_metrics_sink()
+        self.addCleanup(metrics.reset_metrics_sink)
+        reset_media_service_clients()
+
+    def use_sink(self, sink):
+        patcher = mock.patch('azure_media_services.metrics._sink', sink)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return sink
+
+    def make_block(self, **kw):
+        block = AMSXBlock(mock.Mock(), DictFieldData(kw), mock.Mock())
+        block.location = mock.Mock(org='org_name', course_key='course_key')
+        return block
+
+    def test_disabled_by_default(self):
+        func = mock.Mock()
+
+        self.assertFalse(metrics.get_metrics_sink().enabled)
+        self.assertIs(metrics.timed('upstream.call', func, {}), func)
+
+    @override_settings(AMS_METRICS_SINK='signal')
+    def test_signal_sink(self):
+        received = []
+
+        def receiver(sender, kind, name, value, tags, **kwargs):
+            received.append((kind, name, tags))
+
+        metrics.metric_recorded.connect(receiver)
+        self.addCleanup(metrics.metric_recorded.disconnect, receiver)
+        block = self.make_block()
+
+        block.publish_event(mock.Mock(method='POST', body=json.dumps({'event_type': 'edx.video.played'})))
+        block.publish_event(mock.Mock(method='POST', body=json.dumps({})))
+
+        tags = {'org': 'org_name', 'outcome': 'success'}
+        error_tags = {'org': 'org_name', 'outcome': 'error'}
+        self.assertEqual(received, [
+            ('timing', 'handler.publish_event', tags),
+            ('counter', 'handler.publish_event', tags),
+            ('timing', 'handler.publish_event', error_tags),
+            ('counter', 'handler.publish_event', error_tags),
+        ])
+
+    def test_statsd_sink(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        self.addCleanup(server.close)
+        sink = metrics.StatsdSink(host='127.0.0.1', port=server.getsockname()[1], prefix='ams')
+
+        sink.timing('view.student_view', 12.5, {'org': 'org_name', 'outcome': 'success'})
+        sink.increment('view.student_view', {'org': 'org_name', 'outcome': 'success'})
+
+        self.assertEqual(server.recv(512), b'ams.view.student_view:12.500|ms|#org:org_name,outcome:success')
+        self.assertEqual(server.recv(512), b'ams.view.student_view:1|c|#org:org_name,outcome:success')
+
+    @override_settings(AMS_METRICS_SINK='azure_media_services.tests.unit.test_metrics.RecordingSink')
+    def test_custom_sink(self):
+        self.assertIsInstance(metrics.get_metrics_sink(), RecordingSink)
+
+    @override_settings(AMS_METRICS_SINK='azure_media_services.tests.unit.test_metrics.MissingSink')
+    def test_broken_sink_disables_metrics(self):
+        self.assertIsInstance(metrics.get_metrics_sink(), metrics.NullSink)
+
+    def test_view_exception(self):
+        sink = self.use_sink(RecordingSink())
+        block = self.make_block()
+
+        with mock.patch.object(AMSXBlock, '_get_context_for_template', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                block.student_view({})
+
+        self.assertEqual(sink.counters, [('view.student_view', {'org': 'org_name', 'outcome': 'exception'}, 1)])
+
+    @mock.patch('azure_media_services.ams.get_video_info', fakes.get_video_info)
+    @mock.patch('azure_media_services.ams.get_captions_info', fakes.get_captions_info)
+    @mock.patch('azure_media_services.ams.get_media_service_client', return_value=fakes.FakeMediaServiceClient())
+    @mock.patch('azure_media_services.ams.Video', fakes.FakeVideoModel(VIDEOS))
+    def test_upstream_calls(self, _get_media_service_client):
+        sink = self.use_sink(RecordingSink())
+        block = self.make_block()
+        edx_video_id = VIDEOS[0].edx_video_id
+
+        block.get_captions_and_video_info(mock.Mock(method='POST', body=json.dumps({'edx_video_id': edx_video_id})))
+
+        tags = {'org': 'org_name', 'outcome': 'success'}
+        self.assertItemsEqual(sink.counters, [
+            ('upstream.get_input_asset_by_video_id', tags, 1),
+            ('upstream.get_asset_locators', tags, 1),
+            ('upstream.get_asset_locators', tags, 1),
+            ('upstream.get_asset_files', tags, 1),
+            ('handler.get_captions_and_video_info', tags, 1),
+        ])
+
+    @mock.patch('azure_media_services.transcripts.http_get')
+    def test_transcript_get(self, http_get):
+        sink = self.use_sink(RecordingSink())
+        http_get.return_value = mock.Mock(status_code=200, content=b'WEBVTT', headers={})
+        block = self.make_block(captions=[{'srclang': 'en', 'src': '//blob/en.vtt'}])
+
+        block.fetch_transcript(mock.Mock(method='POST', body=json.dumps({'srcUrl': '//blob/en.vtt', 'srcLang': 'en'})))
+        http_get.side_effect = IOError
+        block.fetch_transcript(mock.Mock(method='POST', body=json.dumps({'srcUrl': '//blob/fr.vtt', 'srcLang': 'fr'})))
+
+        self.assertEqual(sink.counters, [
+            ('upstream.transcript_get', {'org': 'org_name', 'outcome': 'success'}, 1),
+            ('handler.fetch_transcript', {'org': 'org_name', 'outcome': 'success'}, 1),
+            ('upstream.transcript_get', {'org': 'org_name', 'outcome': 'error'}, 1),
+            ('handler.fetch_transcript', {'org': 'org_name', 'outcome': 'error'}, 1),
+        ])
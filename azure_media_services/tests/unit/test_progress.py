@@ -0,0 +1,67 @@
+import unittest
+
+from azure_media_services.progress import clean_intervals, coalesce, get_heartbeat_allowance, get_watched_fraction, \
+    limit_intervals, merge_intervals, parse_duration
+
+
+class WatchProgressTests(unittest.TestCase):
+
+    def test_merge_intervals(self):
+        stored = [[0, 10], [20, 30], [50, 60]]
+
+        self.assertEqual(merge_intervals(stored, [[9, 12]]), [[0, 12], [20, 30], [50, 60]])
+        # Nearly touching intervals are joined, the ones in between are absorbed:
+        self.assertEqual(merge_intervals(stored, [[10.5, 19.5]]), [[0, 30], [50, 60]])
+        self.assertEqual(merge_intervals(stored, [[15, 55]]), [[0, 10], [15, 60]])
+        self.assertEqual(merge_intervals(stored, [[40, 45], [70, 70.04]]), [
+            [0, 10], [20, 30], [40, 45], [50, 60], [70, 70.0]
+        ])
+        self.assertEqual(merge_intervals(stored, [[-1, 100]]), [[-1, 100]])
+        # Stored intervals are left intact:
+        self.assertEqual(stored, [[0, 10], [20, 30], [50, 60]])
+
+    def test_size_is_bounded(self):
+        intervals = merge_intervals([], [[position * 10, position * 10 + 5] for position in range(100)], max_count=8)
+
+        self.assertEqual(len(intervals), 8)
+        self.assertEqual(intervals[0][0], 0)
+        self.assertEqual(intervals[-1][1], 995)
+
+        intervals = [[0, 1], [10, 11], [11.5, 20], [30, 31]]
+        coalesce(intervals, 3)
+        self.assertEqual(intervals, [[0, 1], [10, 20], [30, 31]])
+
+    def test_watched_fraction(self):
+        self.assertEqual(get_watched_fraction([[0, 30], [60, 90]], 120), 0.5)
+        self.assertEqual(get_watched_fraction([[0, 130]], 120), 1.0)
+        self.assertIsNone(get_watched_fraction([[0, 30]], 0))
+        # Parts past the end don't count:
+        self.assertEqual(get_watched_fraction([[0, 50], [110, 1000], [2000, 3000]], 120), 0.5)
+
+    def test_heartbeat_allowance(self):
+        self.assertEqual(get_heartbeat_allowance(10, 15, max_rate=2, slack=5), 25)
+        # Elapsed time is capped by the heartbeat interval, the first heartbeat gets the interval:
+        self.assertEqual(get_heartbeat_allowance(3600, 15, max_rate=2, slack=5), 35)
+        self.assertEqual(get_heartbeat_allowance(None, 15, max_rate=2, slack=5), 35)
+        self.assertEqual(get_heartbeat_allowance(-10, 15, max_rate=2, slack=5), 5)
+
+        self.assertEqual(limit_intervals([[0, 10], [20, 1e9], [40, 50]], 25), [[0, 10], [20, 35]])
+        self.assertEqual(limit_intervals([[0, 10]], 0), [])
+
+    def test_clean_intervals(self):
+        self.assertEqual(clean_intervals([[0, 10], [5, 5], [95, 101]], duration=100), [[0, 10], [95, 100]])
+        self.assertEqual(clean_intervals([['1.5', 3]]), [[1.5, 3]])
+
+        for malformed in (None, [[1]], [[5, 1]], [[-1, 1]], [[0, float('inf')]], [(0, 1)], [[102, 103]]):
+            with self.assertRaises(ValueError):
+                clean_intervals(malformed, duration=100)
+        with self.assertRaises(ValueError):
+            clean_intervals([[0, 1]] * 3, max_count=2)
+        with self.assertRaises(TypeError):
+            clean_intervals([[None, 1]])
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration(120.5), 120.5)
+        self.assertIsNone(parse_duration(None))
+        self.assertIsNone(parse_duration(float('nan')))
+        self.assertIsNone(parse_duration(0))
@@ -0,0 +1,81 @@
+import unittest
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+import mock
+
+from azure_media_services.cache import clear_local_caches
+from azure_media_services.resources import CachedResourceLoader
+
+
+class CachedResourceLoaderTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        self.loader = CachedResourceLoader('azure_media_services.ams')
+
+    @mock.patch('xblockutils.resources.pkg_resources.resource_string', return_value=b'content')
+    def test_resources_are_loaded_once(self, resource_string):
+        self.assertEqual(self.loader.load_unicode('static/js/player.js'), u'content')
+        self.assertEqual(self.loader.load_unicode('static/js/player.js'), u'content')
+
+        resource_string.assert_called_once_with('azure_media_services.ams', 'static/js/player.js')
+
+    def test_templates_are_compiled_once(self):
+        template = self.loader.get_template('templates/404.html')
+
+        self.assertIs(self.loader.get_template('templates/404.html'), template)
+
+    def test_render_django_template(self):
+        rendered = self.loader.render_django_template('/templates/player.html', {
+            'video_url': 'https://video.url', 'captions': [], 'share': False
+        })
+        self.assertIn('https://video.url', rendered)
+        self.assertEqual(
+            self.loader.render_django_template('/templates/player.html', {'video_url': 'https://other.url'}).count(
+                'https://other.url'
+            ),
+            rendered.count('https://video.url')
+        )
+
+    @override_settings(AMS_RESOURCES_AUTO_RELOAD=True)
+    @mock.patch('xblockutils.resources.pkg_resources.resource_string', side_effect=(b'old', b'new'))
+    def test_auto_reload(self, resource_string):
+        with mock.patch.object(self.loader, 'get_mtime', return_value=1):
+            self.assertEqual(self.loader.load_unicode('static/js/player.js'), u'old')
+            self.assertEqual(self.loader.load_unicode('static/js/player.js'), u'old')
+        with mock.patch.object(self.loader, 'get_mtime', return_value=2):
+            self.assertEqual(self.loader.load_unicode('static/js/player.js'), u'new')
+
+        self.assertEqual(resource_string.call_count, 2)
+
+    def test_clear(self):
+        template = self.loader.get_template('templates/404.html')
+        self.loader.clear()
+
+        self.assertIsNot(self.loader.get_template('templates/404.html'), template)
+
+    def test_rendered_fragments_are_cached_by_variant(self):
+        context = {'video_url': 'https://video.url'}
+        with mock.patch.object(self.loader, 'render_django_template', return_value='html') as render:
+            self.loader.render_django_template_cached('/templates/player.html', dict(context), context)
+            self.loader.render_django_template_cached('/templates/player.html', dict(context), context)
+            self.assertEqual(render.call_count, 1)
+
+            # E.g. the block has been edited in Studio:
+            edited = {'video_url': 'https://other.url'}
+            self.loader.render_django_template_cached('/templates/player.html', dict(edited), edited)
+            self.assertEqual(render.call_count, 2)
+
+            with mock.patch('azure_media_services.resources.get_language', return_value='fr'):
+                self.loader.render_django_template_cached('/templates/player.html', dict(context), context)
+            self.assertEqual(render.call_count, 3)
+
+    @override_settings(AMS_RESOURCES_AUTO_RELOAD=True)
+    def test_rendered_fragments_are_not_cached_in_debug(self):
+        with mock.patch.object(self.loader, 'render_django_template', return_value='html') as render:
+            self.loader.render_django_template_cached('/templates/player.html', {}, {})
+            self.loader.render_django_template_cached('/templates/player.html', {}, {})
+
+        self.assertEqual(render.call_count, 2)
@@ -0,0 +1,284 @@
+import json
+import unittest
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+import mock
+from xblock.field_data import DictFieldData
+
+from azure_media_services import AMSXBlock
+from azure_media_services.cache import clear_local_caches
+from azure_media_services.search import build_segment, CourseIndex, get_accessible_usage_ids, get_search_index, \
+    tokenize, update_course_index, update_search_index_on_publish
+
+COURSE_KEY = 'course-v1:org+course+run'
+
+TRANSCRIPTS = {
+    '//blob/intro-en.vtt': (
+        u'WEBVTT\n\n00:00:01.000 --> 00:00:04.000\nWelcome to the <b>course</b>!\n\n'
+        u'00:00:05.500 --> 00:00:09.000\nThe course covers Fourier transforms.\n\n'
+        u'00:01:00.000 --> 00:01:03.000\nFourier series come first.\n'
+    ),
+    '//blob/intro-fr.vtt': u'WEBVTT\n\n00:00:01.000 --> 00:00:04.000\nBienvenue au cours Fourier !\n',
+    '//blob/lab-en.vtt': u'WEBVTT\n\n00:00:02.000 --> 00:00:03.000\nFourier transforms in the lab.\n',
+}
+
+
+def get_content(url, lang):
+    try:
+        return TRANSCRIPTS[url]
+    except KeyError:
+        raise IOError('Not found')
+
+
+def make_item(name, display_name, captions):
+    return mock.Mock(
+        location=u'block-v1:org+course+run+type@azure_media_services+block@{}'.format(name),
+        display_name=display_name,
+        captions=captions,
+    )
+
+
+INTRO_USAGE_ID = u'block-v1:org+course+run+type@azure_media_services+block@intro'
+
+
+def make_items():
+    return [
+        make_item('intro', u'Intro', [
+            {'srclang': 'en', 'src': '//blob/intro-en.vtt'},
+            {'srclang': 'fr', 'src': '//blob/intro-fr.vtt'},
+        ]),
+        make_item('lab', u'Lab', [{'srclang': 'en', 'src': '//blob/lab-en.vtt'}]),
+    ]
+
+
+class CourseIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = CourseIndex([
+            build_segment(u'intro', u'Intro', 'en', TRANSCRIPTS['//blob/intro-en.vtt']),
+            build_segment(u'intro', u'Intro', 'fr', TRANSCRIPTS['//blob/intro-fr.vtt']),
+            build_segment(u'lab', u'Lab', 'en', TRANSCRIPTS['//blob/lab-en.vtt']),
+        ])
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize(u'Welcome to the Caf\xe9, A-B!'), [u'welcome', u'to', u'the', u'caf\xe9'])
+
+    def test_search(self):
+        results = self.index.search(u'FOURIER')
+
+        self.assertEqual([(result['usage_id'], result['lang'], result['total']) for result in results], [
+            (u'intro', 'en', 2), (u'intro', 'fr', 1), (u'lab', 'en', 1),
+        ])
+        self.assertEqual(results[0]['display_name'], u'Intro')
+        self.assertEqual(results[0]['matches'], [
+            {'start': 5.5, 'text': u'The course covers Fourier transforms.'},
+            {'start': 60.0, 'text': u'Fourier series come first.'},
+        ])
+
+    def test_all_terms_match_within_cue(self):
+        results = self.index.search(u'fourier transforms', lang='en')
+
+        self.assertEqual([(result['usage_id'], result['matches'][0]['start']) for result in results], [
+            (u'intro', 5.5), (u'lab', 2.0),
+        ])
+        # Terms are in the transcript, but not in the same cue:
+        self.assertEqual(self.index.search(u'welcome fourier'), [])
+        self.assertEqual(self.index.search(u'missing'), [])
+        self.assertEqual(self.index.search(u'?'), [])
+
+    def test_usage_ids(self):
+        results = self.index.search(u'fourier', usage_ids={u'lab'})
+
+        self.assertEqual([result['usage_id'] for result in results], [u'lab'])
+        self.assertEqual(self.index.search(u'fourier', usage_ids=set()), [])
+
+    def test_limits(self):
+        results = self.index.search(u'fourier', max_results=1, max_matches=1)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['total'], 2)
+        self.assertEqual(len(results[0]['matches']), 1)
+
+
+@mock.patch('azure_media_services.search.get_transcript_cache')
+class TranscriptSearchIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        self.index = get_search_index()
+
+    def test_update_is_incremental(self, get_transcript_cache):
+        get_transcript_cache().get_content.side_effect = get_content
+        items = make_items()
+
+        stats = self.index.update_course(COURSE_KEY, items)
+        self.assertEqual(stats, {'indexed': 3, 'unchanged': 0, 'failed': []})
+        revision = self.index.get_manifest(COURSE_KEY)['revision']
+        self.assertEqual(len(self.index.get_course_index(COURSE_KEY).search(u'fourier')), 3)
+
+        # Nothing has changed:
+        stats = self.index.update_course(COURSE_KEY, items)
+        self.assertEqual(stats, {'indexed': 0, 'unchanged': 3, 'failed': []})
+        self.assertEqual(self.index.get_manifest(COURSE_KEY)['revision'], revision)
+
+        # Only the changed caption is indexed again, the removed block is dropped:
+        items[0].captions[0] = {'srclang': 'en', 'src': '//blob/lab-en.vtt'}
+        stats = self.index.update_course(COURSE_KEY, items[:1])
+        self.assertEqual(stats, {'indexed': 1, 'unchanged': 1, 'failed': []})
+        self.assertNotEqual(self.index.get_manifest(COURSE_KEY)['revision'], revision)
+        results = self.index.get_course_index(COURSE_KEY).search(u'fourier')
+        self.assertEqual([(result['usage_id'].rsplit('@', 1)[1], result['lang']) for result in results], [
+            (u'intro', 'en'), (u'intro', 'fr'),
+        ])
+        self.assertEqual(results[0]['matches'], [{'start': 2.0, 'text': u'Fourier transforms in the lab.'}])
+
+    def test_reuploaded_transcript_is_indexed_again(self, get_transcript_cache):
+        transcripts = dict(TRANSCRIPTS)
+        get_transcript_cache().get_content.side_effect = lambda url, lang: transcripts[url]
+        self.index.update_course(COURSE_KEY, make_items())
+
+        # The same URL serves a new version of the transcript:
+        transcripts['//blob/lab-en.vtt'] = u'WEBVTT\n\n00:00:02.000 --> 00:00:03.000\nLaplace transforms in the lab.\n'
+        stats = self.index.update_course(COURSE_KEY, make_items())
+
+        self.assertEqual(stats, {'indexed': 1, 'unchanged': 2, 'failed': []})
+        results = self.index.get_course_index(COURSE_KEY).search(u'laplace')
+        self.assertEqual([result['usage_id'].rsplit('@', 1)[1] for result in results], [u'lab'])
+
+    def test_failed_transcript_is_skipped(self, get_transcript_cache):
+        get_transcript_cache().get_content.side_effect = get_content
+        items = make_items()
+        items[1].captions = [{'srclang': 'en', 'src': '//blob/missing.vtt'}]
+
+        stats = self.index.update_course(COURSE_KEY, items)
+
+        self.assertEqual(stats['indexed'], 2)
+        self.assertEqual(stats['failed'], [u'block-v1:org+course+run+type@azure_media_services+block@lab:en'])
+        self.assertEqual(len(self.index.get_course_index(COURSE_KEY).search(u'fourier')), 2)
+
+        # A transcript indexed before is kept if it can't be fetched:
+        get_transcript_cache().get_content.side_effect = lambda url, lang: get_content(
+            url.replace('intro-fr', 'missing'), lang
+        )
+        stats = self.index.update_course(COURSE_KEY, items)
+
+        self.assertEqual(stats['unchanged'], 1)
+        self.assertEqual(len(stats['failed']), 2)
+        self.assertEqual(len(self.index.get_course_index(COURSE_KEY).search(u'fourier')), 2)
+
+    def test_not_indexed(self, _get_transcript_cache):
+        self.assertIsNone(self.index.get_course_index('course-v1:org+other+run'))
+
+    @mock.patch('azure_media_services.search.ModuleStoreEnum')
+    @mock.patch('azure_media_services.search.modulestore')
+    def test_published_blocks_are_indexed(self, modulestore, module_store_enum, get_transcript_cache):
+        get_transcript_cache().get_content.side_effect = get_content
+        store = modulestore()
+        branches = []
+        store.branch_setting.side_effect = lambda branch, course_key: mock.MagicMock(
+            __enter__=lambda _self: branches.append(branch)
+        )
+        store.get_items.side_effect = lambda *args, **kwargs: make_items() if branches else []
+
+        stats = update_course_index(COURSE_KEY)
+
+        store.branch_setting.assert_called_once_with(module_store_enum.Branch.published_only, COURSE_KEY)
+        self.assertEqual(stats['indexed'], 3)
+
+
+class AccessibleUsageIdsTests(unittest.TestCase):
+
+    @mock.patch('azure_media_services.search.modulestore')
+    def test_accessible_usage_ids_are_cached(self, modulestore):
+        get_course_blocks = mock.Mock(return_value=[INTRO_USAGE_ID])
+        get_search_index().accessible_usage_ids.clear()
+        course = modulestore().get_course.return_value
+        course.course_version = 'version-1'
+        learner, other_learner = mock.Mock(id=1), mock.Mock(id=2)
+
+        with mock.patch.dict('sys.modules', {
+            'lms': mock.Mock(), 'lms.djangoapps': mock.Mock(), 'lms.djangoapps.course_blocks': mock.Mock(),
+            'lms.djangoapps.course_blocks.api': mock.Mock(get_course_blocks=get_course_blocks),
+        }):
+            self.assertEqual(get_accessible_usage_ids(learner, COURSE_KEY), {INTRO_USAGE_ID})
+            get_accessible_usage_ids(learner, COURSE_KEY)
+            self.assertEqual(get_course_blocks.call_count, 1)
+
+            # Each user gets their own blocks, a publish gets the course new ones:
+            get_accessible_usage_ids(other_learner, COURSE_KEY)
+            course.course_version = 'version-2'
+            get_accessible_usage_ids(learner, COURSE_KEY)
+            self.assertEqual(get_course_blocks.call_count, 3)
+
+
+class SearchTranscriptsHandlerTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+
+        patcher = mock.patch('azure_media_services.search.get_accessible_usage_ids', return_value=set(
+            unicode(item.location) for item in make_items()
+        ))
+        self.get_accessible_usage_ids = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.runtime = mock.Mock()
+
+    def search(self, **data):
+        block = AMSXBlock(self.runtime, DictFieldData({}), mock.Mock())
+        block.location = mock.Mock(org='org', course_key=COURSE_KEY)
+        response = block.search_transcripts(mock.Mock(method='POST', body=json.dumps(data)))
+        return json.loads(response.body)
+
+    @mock.patch('azure_media_services.search.schedule_course_index_update')
+    @mock.patch('azure_media_services.search.get_transcript_cache')
+    def test_search(self, get_transcript_cache, schedule_course_index_update):
+        get_transcript_cache().get_content.side_effect = get_content
+
+        self.assertEqual(self.search(query=u'fourier'), {'result': 'success', 'results': [], 'indexed': False})
+        schedule_course_index_update.assert_called_once_with(COURSE_KEY)
+        self.get_accessible_usage_ids.assert_not_called()
+
+        get_search_index().update_course(COURSE_KEY, make_items())
+        response = self.search(query=u'fourier', lang='en', limit=1)
+
+        self.assertTrue(response['indexed'])
+        self.assertEqual(len(response['results']), 1)
+        self.assertEqual(response['results'][0]['lang'], 'en')
+        self.assertEqual(response['results'][0]['matches'][0]['start'], 5.5)
+        self.get_accessible_usage_ids.assert_called_with(self.runtime.get_real_user.return_value, COURSE_KEY)
+
+    @mock.patch('azure_media_services.search.get_transcript_cache')
+    def test_inaccessible_blocks_are_filtered_out(self, get_transcript_cache):
+        get_transcript_cache().get_content.side_effect = get_content
+        get_search_index().update_course(COURSE_KEY, make_items())
+        self.get_accessible_usage_ids.return_value = {INTRO_USAGE_ID}
+
+        response = self.search(query=u'fourier', lang='en')
+
+        self.assertEqual([result['usage_id'] for result in response['results']], [INTRO_USAGE_ID])
+
+    def test_anonymous(self):
+        self.runtime.get_real_user.return_value = None
+
+        self.assertEqual(self.search(query=u'fourier')['result'], 'error')
+
+    def test_bad_request(self):
+        self.assertEqual(self.search()['result'], 'error')
+        self.assertEqual(self.search(query=u'  ')['result'], 'error')
+        self.assertEqual(self.search(query=u'fourier', limit='all')['result'], 'error')
+
+    @override_settings(AMS_TRANSCRIPT_SEARCH_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.search(query=u'fourier')['result'], 'error')
+
+    @mock.patch('azure_media_services.search.schedule_course_index_update')
+    def test_update_on_publish(self, schedule_course_index_update):
+        update_search_index_on_publish(None, course_key=COURSE_KEY)
+        schedule_course_index_update.assert_called_once_with(COURSE_KEY)
+
+        with override_settings(AMS_TRANSCRIPT_SEARCH_ENABLED=False):
+            update_search_index_on_publish(None, course_key=COURSE_KEY)
+        self.assertEqual(schedule_course_index_update.call_count, 1)
@@ -0,0 +1,77 @@
+import base64
+import unittest
+
+import jwt
+import mock
+
+from azure_media_services.tokens import InvalidSigningKey, PlaybackTokenService
+
+SIGNING_KEY = b'signing-key-of-32-bytes-length!!'
+VERIFICATION_KEY = base64.b64encode(SIGNING_KEY).decode('ascii')
+
+
+class PlaybackTokenServiceTests(unittest.TestCase):
+
+    def setUp(self):
+        self.service = PlaybackTokenService(lifetime=600, refresh_margin=120)
+
+    def get_token(self, user_id='user_id', verification_key=VERIFICATION_KEY, issuer='issuer'):
+        return self.service.get_token('block_id', user_id, verification_key, issuer, 'scope')
+
+    def test_token_claims(self):
+        claims = jwt.decode(self.get_token(), SIGNING_KEY, audience='scope', issuer='issuer', algorithms=['HS256'])
+
+        self.assertEqual(claims['sub'], 'user_id')
+        self.assertEqual(claims['exp'] - claims['nbf'], 600 + 300)
+
+    def test_token_is_reused_until_it_nears_expiry(self):
+        with mock.patch('azure_media_services.cache.time.time', return_value=1000), \
+                mock.patch('azure_media_services.tokens.time.time', return_value=1000):
+            token = self.get_token()
+        with mock.patch('azure_media_services.cache.time.time', return_value=1479), \
+                mock.patch('azure_media_services.tokens.time.time', return_value=1479):
+            self.assertEqual(self.get_token(), token)
+        with mock.patch('azure_media_services.cache.time.time', return_value=1480), \
+                mock.patch('azure_media_services.tokens.time.time', return_value=1480):
+            self.assertNotEqual(self.get_token(), token)
+
+        self.assertEqual(self.service.stats()['issued'], 2)
+        self.assertEqual(self.service.stats()['reused'], 1)
+
+    def test_token_expiry(self):
+        with mock.patch('azure_media_services.cache.time.time', return_value=1000), \
+                mock.patch('azure_media_services.tokens.time.time', return_value=1000):
+            token, expires_at = self.service.get_token_and_expiry('block_id', 'user_id', VERIFICATION_KEY, 'i', 's')
+        with mock.patch('azure_media_services.cache.time.time', return_value=1400), \
+                mock.patch('azure_media_services.tokens.time.time', return_value=1400):
+            # A reused token keeps its original expiration time:
+            self.assertEqual(
+                self.service.get_token_and_expiry('block_id', 'user_id', VERIFICATION_KEY, 'i', 's'),
+                (token, expires_at)
+            )
+
+        self.assertEqual(expires_at, 1000 + 600)
+
+    def test_tokens_are_per_user_and_settings(self):
+        token = self.get_token()
+
+        self.assertNotEqual(self.get_token(user_id='another_user_id'), token)
+        self.assertNotEqual(self.get_token(issuer='another_issuer'), token)
+        self.assertNotEqual(
+            self.get_token(verification_key=base64.b64encode(b'another-key').decode('ascii')), token
+        )
+
+    def test_anonymous_tokens_are_unique(self):
+        self.assertNotEqual(self.get_token(user_id=None), self.get_token(user_id=None))
+        self.assertEqual(self.service.stats()['cached'], 0)
+
+    @mock.patch('azure_media_services.tokens.base64.b64decode', wraps=base64.b64decode)
+    def test_signing_key_is_decoded_once(self, b64decode):
+        self.get_token()
+        self.get_token(user_id='another_user_id')
+
+        b64decode.assert_called_once_with(VERIFICATION_KEY)
+
+    def test_invalid_verification_key(self):
+        with self.assertRaises(InvalidSigningKey):
+            self.get_token(verification_key='not base64')
@@ -0,0 +1,119 @@
+import unittest
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+import mock
+import requests
+
+from azure_media_services.cache import LRUCache, TieredCache
+from azure_media_services.transcripts import TranscriptCache
+
+
+def make_response(status_code=200, content='', headers=None):
+    response = mock.Mock(status_code=status_code, content=content, headers=headers or {})
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError()
+    return response
+
+
+class LRUCacheTests(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(max_size=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+
+    @mock.patch('azure_media_services.cache.time.time', side_effect=(100, 100, 111))
+    def test_expiration(self, _time):
+        lru = LRUCache(timeout=10)
+        lru.set('a', 1)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('a'))
+
+
+class TieredCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch('azure_media_services.cache.time.time')
+    def test_shared_entry_keeps_its_expiration_locally(self, time_mock):
+        time_mock.return_value = 1000
+        TieredCache('test', timeout=600).set('key', 'value', 60)
+
+        # Another process picks the entry up from the shared tier 50 seconds later:
+        other = TieredCache('test', timeout=600)
+        time_mock.return_value = 1050
+        self.assertEqual(other.get('key'), 'value')
+        self.assertEqual(other.stats()['shared_hits'], 1)
+
+        # Its local copy expires along with the shared entry rather than `timeout` seconds later:
+        time_mock.return_value = 1061
+        self.assertIsNone(other.get('key'))
+        self.assertEqual(other.stats()['misses'], 1)
+
+
+class TranscriptCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.transcript_cache = TranscriptCache()
+
+    @mock.patch('azure_media_services.transcripts.http_get', return_value=make_response(
+        content='WEBVTT', headers={'ETag': '"etag"'}
+    ))
+    def test_fresh_entry_is_served_from_cache(self, request_get_mock):
+        self.assertEqual(self.transcript_cache.get_content('url', 'en'), 'WEBVTT')
+        self.assertEqual(self.transcript_cache.get_content('url', 'en'), 'WEBVTT')
+
+        request_get_mock.assert_called_once_with('url', headers={})
+        stats = self.transcript_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['local_hits'], 1)
+
+    @mock.patch('azure_media_services.transcripts.http_get', return_value=make_response(content='WEBVTT'))
+    def test_cache_is_keyed_on_language(self, request_get_mock):
+        self.transcript_cache.get_content('url', 'en')
+        self.transcript_cache.get_content('url', 'fr')
+
+        self.assertEqual(request_get_mock.call_count, 2)
+
+    @mock.patch('azure_media_services.transcripts.http_get')
+    def test_stale_entry_is_revalidated(self, request_get_mock):
+        request_get_mock.side_effect = (
+            make_response(content='WEBVTT', headers={'ETag': '"etag"', 'Last-Modified': 'yesterday'}),
+            make_response(status_code=304),
+        )
+        with override_settings(AMS_TRANSCRIPT_CACHE_TTL=-1):
+            self.transcript_cache.get_content('url', 'en')
+            content = self.transcript_cache.get_content('url', 'en')
+
+        self.assertEqual(content, 'WEBVTT')
+        request_get_mock.assert_called_with('url', headers={
+            'If-None-Match': '"etag"', 'If-Modified-Since': 'yesterday'
+        })
+        self.assertEqual(self.transcript_cache.stats()['revalidations'], 1)
+
+    @mock.patch('azure_media_services.transcripts.http_get', return_value=make_response(status_code=404))
+    def test_http_errors_are_not_cached(self, request_get_mock):
+        with self.assertRaises(IOError):
+            self.transcript_cache.get_content('url', 'en')
+        with self.assertRaises(IOError):
+            self.transcript_cache.get_content('url', 'en')
+
+        self.assertEqual(request_get_mock.call_count, 2)
+
+    @mock.patch('azure_media_services.transcripts.http_get', return_value=make_response(content='WEBVTT'))
+    def test_big_transcripts_are_not_cached(self, request_get_mock):
+        with override_settings(AMS_TRANSCRIPT_CACHE_MAX_ITEM_SIZE=3):
+            self.transcript_cache.get_content('url', 'en')
+            self.transcript_cache.get_content('url', 'en')
+
+        self.assertEqual(request_get_mock.call_count, 2)
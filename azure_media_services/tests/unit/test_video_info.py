@@ -0,0 +1,134 @@
+import threading
+import time
+import unittest
+
+from django.core.cache import cache
+import mock
+
+from azure_media_services.cache import clear_local_caches
+from azure_media_services.video_info import invalidate_video_info_on_save, parse_locator_expiry, VideoInfoCache
+
+FOUND = {'error_message': '', 'video_info': {'smooth_streaming_url': 'url'}, 'captions': []}
+MISSING = {'error_message': 'missing', 'video_info': {}, 'captions': []}
+
+
+class ParseLocatorExpiryTests(unittest.TestCase):
+
+    def test_formats(self):
+        self.assertEqual(parse_locator_expiry({'ExpirationDateTime': '/Date(1521234567000)/'}), 1521234567)
+        self.assertEqual(parse_locator_expiry({'ExpirationDateTime': '2018-03-16T21:09:27.5087434Z'}), 1521234567)
+        self.assertIsNone(parse_locator_expiry({'ExpirationDateTime': 'soon'}))
+        self.assertIsNone(parse_locator_expiry({'Path': 'path'}))
+
+
+class VideoInfoCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        self.video_info_cache = VideoInfoCache(timeout=600, negative_timeout=60, expiry_margin=300)
+
+    def test_result_is_cached_per_org(self):
+        resolve = mock.Mock(return_value=(FOUND, [{'Path': 'path'}]))
+
+        self.assertEqual(self.video_info_cache.get_or_resolve('org', 'video_id', resolve), FOUND)
+        self.assertEqual(self.video_info_cache.get_or_resolve('org', 'video_id', resolve), FOUND)
+        self.assertEqual(resolve.call_count, 1)
+
+        self.video_info_cache.get_or_resolve('other_org', 'video_id', resolve)
+        self.assertEqual(resolve.call_count, 2)
+
+    def test_timeouts(self):
+        now = time.time()
+        expiring_soon = {'ExpirationDateTime': '/Date({})/'.format(int((now + 400) * 1000))}
+        expired = {'ExpirationDateTime': '/Date({})/'.format(int((now + 100) * 1000))}
+
+        self.assertEqual(self.video_info_cache.get_timeout(MISSING, []), 60)
+        self.assertEqual(self.video_info_cache.get_timeout(FOUND, [{'Path': 'path'}]), 600)
+        self.assertAlmostEqual(self.video_info_cache.get_timeout(FOUND, [expiring_soon]), 100, delta=2)
+        self.assertEqual(self.video_info_cache.get_timeout(FOUND, [expiring_soon, expired]), 0)
+
+    def test_result_built_from_expired_locator_is_not_cached(self):
+        expired = {'ExpirationDateTime': '/Date({})/'.format(int(time.time() * 1000))}
+        resolve = mock.Mock(return_value=(FOUND, [expired]))
+
+        self.video_info_cache.get_or_resolve('org', 'video_id', resolve)
+        self.video_info_cache.get_or_resolve('org', 'video_id', resolve)
+
+        self.assertEqual(resolve.call_count, 2)
+
+    def test_negative_result_is_cached(self):
+        resolve = mock.Mock(return_value=(MISSING, []))
+
+        self.video_info_cache.get_or_resolve('org', 'video_id', resolve)
+        self.assertEqual(self.video_info_cache.get_or_resolve('org', 'video_id', resolve), MISSING)
+        self.assertEqual(resolve.call_count, 1)
+
+    def test_invalidate(self):
+        resolve = mock.Mock(return_value=(FOUND, []))
+        self.video_info_cache.get_or_resolve('org', 'video_id', resolve)
+        self.video_info_cache.get_or_resolve('other_org', 'video_id', resolve)
+
+        self.video_info_cache.invalidate('video_id')
+        self.video_info_cache.get_or_resolve('org', 'video_id', resolve)
+        self.video_info_cache.get_or_resolve('other_org', 'video_id', resolve)
+
+        self.assertEqual(resolve.call_count, 4)
+
+    def test_generation_is_cached_locally(self):
+        resolve = mock.Mock(return_value=(FOUND, []))
+        shared = self.video_info_cache.cache.shared
+
+        with mock.patch.object(shared, 'get', wraps=shared.get) as shared_get:
+            self.video_info_cache.get_or_resolve('org', 'video_id', resolve)
+            self.assertEqual(shared_get.call_count, 2)
+            # Served from the in-process tier without asking the shared cache for the generation:
+            self.video_info_cache.get_or_resolve('org', 'video_id', resolve)
+            self.assertEqual(shared_get.call_count, 2)
+
+        # Invalidation in another process is picked up once the cached generation expires:
+        VideoInfoCache().invalidate('video_id')
+        self.video_info_cache.generations.clear()
+        self.video_info_cache.get_or_resolve('org', 'video_id', resolve)
+        self.assertEqual(resolve.call_count, 2)
+
+    @mock.patch('azure_media_services.video_info.invalidate_video_info')
+    def test_invalidate_on_video_save(self, invalidate_video_info):
+        invalidate_video_info_on_save(sender=None, instance=mock.Mock(edx_video_id='video_id'))
+        invalidate_video_info.assert_called_once_with('video_id')
+
+    def test_in_flight_lookups_are_deduplicated(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def resolve():
+            started.set()
+            release.wait(5)
+            return FOUND, []
+
+        resolve = mock.Mock(side_effect=resolve)
+        results = []
+
+        def lookup():
+            results.append(self.video_info_cache.get_or_resolve('org', 'video_id', resolve))
+
+        leader = threading.Thread(target=lookup)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lookup) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(resolve.call_count, 1)
+        self.assertEqual(results, [FOUND] * 4)
+
+    def test_failed_lookup_is_not_cached(self):
+        resolve = mock.Mock(side_effect=(IOError(), (FOUND, [])))
+
+        with self.assertRaises(IOError):
+            self.video_info_cache.get_or_resolve('org', 'video_id', resolve)
+        self.assertEqual(self.video_info_cache.get_or_resolve('org', 'video_id', resolve), FOUND)
@@ -0,0 +1,85 @@
+from StringIO import StringIO
+import time
+import unittest
+
+from django.core.cache import cache
+from django.core.management import call_command
+import mock
+
+from azure_media_services.cache import clear_local_caches
+from azure_media_services.management.commands.warm_ams_video_info import Command
+from azure_media_services.video_info import get_video_info_cache
+
+FOUND = {'error_message': '', 'video_info': {'smooth_streaming_url': 'url'}, 'captions': []}
+MISSING = {'error_message': 'missing', 'video_info': {}, 'captions': []}
+
+RESOLVED = {
+    'video_ok': (FOUND, [{'Path': 'on_demand'}, {'Path': 'sas'}]),
+    'video_expiring': (FOUND, [
+        {'Path': 'on_demand', 'ExpirationDateTime': '/Date({})/'.format(int((time.time() + 3600) * 1000))},
+        {'Path': 'sas'},
+    ]),
+    'video_no_sas': (FOUND, [{'Path': 'on_demand'}]),
+    'video_missing': (MISSING, []),
+}
+
+
+def resolve(edx_video_id, lookup_pool):
+    if lookup_pool is None:
+        raise AssertionError('Lookups have to run on a pool of their own')
+    if edx_video_id == 'video_failing':
+        raise IOError('Azure is down')
+    return RESOLVED[edx_video_id]
+
+
+def make_block(edx_video_id):
+    return mock.Mock(edx_video_id=edx_video_id, resolve_captions_and_video_info=mock.Mock(side_effect=resolve))
+
+
+class WarmAMSVideoInfoTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+
+    @mock.patch('azure_media_services.management.commands.warm_ams_video_info.connection')
+    @mock.patch('azure_media_services.management.commands.warm_ams_video_info.CourseKey')
+    @mock.patch('azure_media_services.management.commands.warm_ams_video_info.modulestore')
+    def test_warm_up(self, modulestore, course_key, _connection):
+        course_key.from_string.return_value = mock.Mock(org='org_name')
+        blocks = [make_block(edx_video_id) for edx_video_id in (
+            'video_ok', 'video_ok', 'video_expiring', 'video_no_sas', 'video_missing', 'video_failing', ''
+        )]
+        modulestore().get_items.return_value = blocks
+        stdout = StringIO()
+
+        video_info_cache = get_video_info_cache()
+        with mock.patch.object(video_info_cache.cache, 'set', wraps=video_info_cache.cache.set) as cache_set:
+            call_command(Command(), 'course-v1:org_name+course+run', workers=2, ttl=7200, stdout=stdout)
+
+        modulestore().bulk_operations.assert_called_once_with(course_key.from_string.return_value)
+        modulestore().get_items.assert_called_once_with(
+            course_key.from_string.return_value, qualifiers={'category': 'azure_media_services'}
+        )
+        # Each video is resolved once:
+        self.assertEqual(blocks[0].resolve_captions_and_video_info.call_count, 1)
+        blocks[1].resolve_captions_and_video_info.assert_not_called()
+
+        resolve_again = mock.Mock()
+        self.assertEqual(video_info_cache.get_or_resolve('org_name', 'video_ok', resolve_again), FOUND)
+        self.assertEqual(video_info_cache.get_or_resolve('org_name', 'video_missing', resolve_again), MISSING)
+        resolve_again.assert_not_called()
+
+        report = stdout.getvalue()
+        timeouts = {key.split(':')[1]: timeout for (key, _result, timeout), _kwargs in cache_set.call_args_list}
+        self.assertEqual(timeouts['video_ok'], 7200)
+        # Entries never outlive the locators (minus the margin):
+        self.assertLessEqual(timeouts['video_expiring'], 3600 - 300)
+        self.assertEqual(timeouts['video_missing'], 60)
+
+        self.assertIn('Found 7 AMS blocks, 5 distinct videos', report)
+        self.assertIn('cached: 4 for 7200s', report)
+        self.assertIn('video_expiring: 3', report)
+        self.assertIn("Failed (1):\n  video_failing: IOError('Azure is down',)", report)
+        self.assertIn('Missing on Azure Media Services (1):\n  video_missing', report)
+        self.assertIn('Missing progressive (SAS) locator, no captions auto-fetching (1):\n  video_no_sas', report)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+from django.core.cache import cache
+import mock
+
+from azure_media_services.webvtt import CueIndex, get_cue_index_json, parse_webvtt
+
+WEBVTT = b"""\xef\xbb\xbfWEBVTT
+Kind: captions
+
+NOTE a comment
+
+intro
+00:00:01.000 --> 00:00:04.500 align:start
+<v Speaker>Hello &amp; welcome</v>
+
+00:00:10.250 --> 00:00:12.000
+second line
+continues
+
+00:00:05.000 --> 00:00:08.000
+<c.yellow>out of order</c>
+
+01:02:03.004 --> 01:02:05.000
+late
+"""
+
+
+class ParseWebVTTTests(unittest.TestCase):
+
+    def test_parse_webvtt(self):
+        index = parse_webvtt(WEBVTT)
+
+        self.assertEqual(list(index.starts), [1.0, 5.0, 10.25, 3723.004])
+        self.assertEqual(list(index.ends), [4.5, 8.0, 12.0, 3725.0])
+        self.assertEqual(index.texts, [u'Hello & welcome', u'out of order', u'second line\ncontinues', u'late'])
+
+    def test_find(self):
+        index = parse_webvtt(WEBVTT)
+
+        self.assertEqual(index.find(0.5), -1)
+        self.assertEqual(index.find(1.0), 0)
+        self.assertEqual(index.find(4.6), -1)
+        self.assertEqual(index.find(11), 2)
+        self.assertEqual(index.find(3724), 3)
+        self.assertEqual(index.find(4000), -1)
+
+    def test_compact_json(self):
+        index_json = parse_webvtt(WEBVTT).to_json()
+
+        self.assertNotIn(' ', index_json.replace('second line', '').replace('out of order', '').replace(
+            'Hello & welcome', ''))
+        self.assertEqual(CueIndex.from_dict(json.loads(index_json)).texts[3], u'late')
+
+    def test_malformed_blocks_are_skipped(self):
+        index = parse_webvtt(u'WEBVTT\n\n00:01.000 --> garbage\ntext\n\n00:02.000 --> 00:03.000\nok')
+
+        self.assertEqual(index.texts, [u'ok'])
+        self.assertEqual(list(index.starts), [2.0])
+
+
+class CueIndexMemoizationTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch('azure_media_services.webvtt.parse_webvtt', wraps=parse_webvtt)
+    def test_memoized_per_version(self, parse_webvtt_mock):
+        digest, index_json = get_cue_index_json(WEBVTT)
+        self.assertEqual(get_cue_index_json(WEBVTT), (digest, index_json))
+        self.assertEqual(parse_webvtt_mock.call_count, 1)
+
+        new_digest, _ = get_cue_index_json(WEBVTT + b'\n01:10:00.000 --> 01:10:01.000\nnew\n')
+        self.assertNotEqual(new_digest, digest)
+        self.assertEqual(parse_webvtt_mock.call_count, 2)
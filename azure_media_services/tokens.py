@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Short-lived per-user playback tokens (JWT) for protected content.
+"""
+import base64
+import binascii
+import threading
+import time
+import uuid
+
+from django.conf import settings
+import jwt
+
+from .cache import LRUCache
+
+# Defaults, each of them can be overridden in Django settings:
+# - how long (seconds) playback tokens are valid for;
+PLAYBACK_TOKEN_LIFETIME = 10 * 60
+# - how long (seconds) before its expiration a token is no longer handed out (a new one is issued);
+PLAYBACK_TOKEN_REFRESH_MARGIN = 2 * 60
+# - how many tokens (and decoded signing keys) are kept in memory.
+PLAYBACK_TOKEN_CACHE_SIZE = 10000
+
+# Tolerance (seconds) for the clock skew between LMS and Azure Media Services:
+NOT_BEFORE_SKEW = 5 * 60
+
+_token_service = None
+_token_service_lock = threading.Lock()
+
+
+class InvalidSigningKey(ValueError):
+    """
+    Verification key isn't a valid Base64 string.
+    """
+
+
+class PlaybackTokenService(object):
+    """
+    Issues HS256-signed JWTs restricted to the configured issuer and scope (audience).
+
+    Decoded signing keys are cached per block and tokens per block and user, a token is reused
+    until it's `refresh_margin` seconds away from expiry (anonymous users get a unique token each time).
+    Both caches are in-process only: secrets never leave the process.
+
+    Tokens are handed out along with their expiration time: a page holding one has to get a fresh one
+    (see `playback_token` handler) before it expires.
+    """
+
+    def __init__(self, lifetime=PLAYBACK_TOKEN_LIFETIME, refresh_margin=PLAYBACK_TOKEN_REFRESH_MARGIN,
+                 max_size=PLAYBACK_TOKEN_CACHE_SIZE):
+        """
+        Configure tokens lifetime and the caches size.
+        """
+        self.lifetime = lifetime
+        self.refresh_margin = min(refresh_margin, lifetime)
+        self.signing_keys = LRUCache(max_size=max_size)
+        self.tokens = LRUCache(max_size=max_size)
+        self.issued = 0
+        self.reused = 0
+
+    def get_signing_key(self, block_id, verification_key):
+        """
+        Return decoded signing key, the block's key is decoded again only if it's been changed.
+        """
+        cached = self.signing_keys.get(block_id)
+        if cached is not None and cached[0] == verification_key:
+            return cached[1]
+        try:
+            signing_key = base64.b64decode(verification_key)
+        except (TypeError, binascii.Error) as error:
+            raise InvalidSigningKey(error)
+        self.signing_keys.set(block_id, (verification_key, signing_key))
+        return signing_key
+
+    def issue_token(self, signing_key, user_id, issuer, scope, now=None):
+        now = int(now or time.time())
+        claims = {
+            'iss': issuer,
+            'aud': scope,
+            'nbf': now - NOT_BEFORE_SKEW,
+            'exp': now + self.lifetime,
+        }
+        if user_id is not None:
+            claims['sub'] = unicode(user_id)
+        else:
+            claims['jti'] = uuid.uuid4().hex
+        token = jwt.encode(claims, signing_key, algorithm='HS256')
+        # PyJWT<2 returns bytes:
+        return token.decode('ascii') if isinstance(token, bytes) else token
+
+    def get_token(self, block_id, user_id, verification_key, issuer, scope):
+        """
+        Return playback token of the user for the block.
+
+        :raises InvalidSigningKey: if the verification key can't be decoded.
+        """
+        return self.get_token_and_expiry(block_id, user_id, verification_key, issuer, scope)[0]
+
+    def get_token_and_expiry(self, block_id, user_id, verification_key, issuer, scope):
+        """
+        Return `(token, expires_at)` of the user for the block, `expires_at` is a UNIX timestamp.
+
+        :raises InvalidSigningKey: if the verification key can't be decoded.
+        """
+        signing_key = self.get_signing_key(block_id, verification_key)
+        now = int(time.time())
+        if user_id is None:
+            # Anonymous visitors can't be told apart, each of them gets a token of their own:
+            self.issued += 1
+            return self.issue_token(signing_key, user_id, issuer, scope, now), now + self.lifetime
+
+        # Any change of the key, issuer or scope makes the previously issued tokens useless:
+        key = (block_id, user_id, issuer, scope, verification_key)
+        entry = self.tokens.get(key)
+        if entry is not None:
+            self.reused += 1
+            return entry
+
+        entry = (self.issue_token(signing_key, user_id, issuer, scope, now), now + self.lifetime)
+        self.tokens.set(key, entry, self.lifetime - self.refresh_margin)
+        self.issued += 1
+        return entry
+
+    def stats(self):
+        return {'issued': self.issued, 'reused': self.reused, 'cached': len(self.tokens)}
+
+
+def get_token_service():
+    """
+    Return process-wide playback token service (created on first use).
+    """
+    global _token_service
+    if _token_service is None:
+        with _token_service_lock:
+            if _token_service is None:
+                _token_service = PlaybackTokenService(
+                    lifetime=getattr(settings, 'AMS_PLAYBACK_TOKEN_LIFETIME', PLAYBACK_TOKEN_LIFETIME),
+                    refresh_margin=getattr(
+                        settings, 'AMS_PLAYBACK_TOKEN_REFRESH_MARGIN', PLAYBACK_TOKEN_REFRESH_MARGIN
+                    ),
+                    max_size=getattr(settings, 'AMS_PLAYBACK_TOKEN_CACHE_SIZE', PLAYBACK_TOKEN_CACHE_SIZE),
+                )
+    return _token_service
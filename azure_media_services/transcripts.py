@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Transcripts (WebVTT files hosted on Azure blob storage) fetching and caching.
+"""
+import hashlib
+import logging
+import threading
+import time
+import zlib
+
+from django.conf import settings
+
+from .cache import TieredCache
+from .http_session import http_get
+from .metrics import timed
+
+log = logging.getLogger(__name__)
+
+# Defaults, each of them can be overridden in Django settings:
+# - how long (seconds) a cached transcript is served without asking the storage;
+TRANSCRIPT_CACHE_TTL = 60 * 60
+# - how long (seconds) an outdated transcript is kept for conditional revalidation;
+TRANSCRIPT_CACHE_STALE_TTL = 24 * 60 * 60
+# - how many transcripts are kept in the in-process LRU tier;
+TRANSCRIPT_CACHE_SIZE = 128
+# - transcripts bigger than this (bytes) are never cached;
+TRANSCRIPT_CACHE_MAX_ITEM_SIZE = 2 * 1024 * 1024
+# - Django cache alias to be used as a shared tier;
+TRANSCRIPT_CACHE_ALIAS = 'default'
+# - chunk size (bytes) transcripts are streamed with;
+TRANSCRIPT_CHUNK_SIZE = 16 * 1024
+# - transcripts bigger than this (bytes) are refused.
+TRANSCRIPT_MAX_SIZE = 10 * 1024 * 1024
+
+
+class TranscriptTooLarge(IOError):
+    """
+    Transcript exceeds `AMS_TRANSCRIPT_MAX_SIZE`.
+    """
+
+
+class TranscriptStream(object):
+    """
+    Iterable transcript body along with its validators.
+
+    It can be handed over to WSGI as an `app_iter`: `close` releases the upstream connection.
+    """
+
+    def __init__(self, chunks, etag=None, response=None):
+        """
+        Wrap `chunks` iterable, `response` is an upstream response to be closed along with the stream.
+        """
+        self.chunks = chunks
+        self.etag = etag
+        self.response = response
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()
+
+
+class TranscriptCache(object):
+    """
+    Transcripts cache keyed on transcript URL and language.
+
+    Fresh entries are served straight from the cache. Outdated ones are kept for a while
+    and revalidated against the storage with `If-None-Match`/`If-Modified-Since`, so an
+    unchanged transcript costs an empty 304 response instead of a full download.
+    """
+
+    def __init__(self):
+        """
+        Size the cache according to Django settings.
+        """
+        self.cache = TieredCache(
+            'ams-transcript',
+            max_size=getattr(settings, 'AMS_TRANSCRIPT_CACHE_SIZE', TRANSCRIPT_CACHE_SIZE),
+            timeout=self.stale_ttl,
+            alias=getattr(settings, 'AMS_TRANSCRIPT_CACHE_ALIAS', TRANSCRIPT_CACHE_ALIAS),
+        )
+        self.revalidations = 0
+        self._revalidations_lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'AMS_TRANSCRIPT_CACHE_TTL', TRANSCRIPT_CACHE_TTL)
+
+    @property
+    def stale_ttl(self):
+        return max(getattr(settings, 'AMS_TRANSCRIPT_CACHE_STALE_TTL', TRANSCRIPT_CACHE_STALE_TTL), self.ttl)
+
+    @property
+    def max_item_size(self):
+        return getattr(settings, 'AMS_TRANSCRIPT_CACHE_MAX_ITEM_SIZE', TRANSCRIPT_CACHE_MAX_ITEM_SIZE)
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'AMS_TRANSCRIPT_MAX_SIZE', TRANSCRIPT_MAX_SIZE)
+
+    @property
+    def chunk_size(self):
+        return getattr(settings, 'AMS_TRANSCRIPT_CHUNK_SIZE', TRANSCRIPT_CHUNK_SIZE)
+
+    @staticmethod
+    def make_key(url, lang):
+        return u'{}|{}'.format(lang, url)
+
+    def get_content(self, url, lang, tags=None):
+        """
+        Return transcript's content, fetching (or revalidating) it when needed.
+
+        :param tags: metrics tags of the storage request (e.g. `org`).
+
+        :raises IOError: on any transport or HTTP error (`requests` exceptions are IOErrors).
+        """
+        key = self.make_key(url, lang)
+        entry = self.cache.get(key)
+        if entry is not None and entry['expires_at'] > time.time():
+            return entry['content']
+
+        response = self.request(url, tags, headers=self.conditional_headers(entry))
+
+        if entry is not None and response.status_code == 304:
+            self._count_revalidation()
+            self.store(key, entry['content'], entry.get('etag'), entry.get('last_modified'))
+            return entry['content']
+
+        response.raise_for_status()
+        content = response.content
+        self.store(key, content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return content
+
+    def get_cached_content(self, url, lang):
+        """
+        Return transcript's content if it's cached and fresh or None, the storage is never asked.
+        """
+        entry = self.cache.get(self.make_key(url, lang))
+        if entry is not None and entry['expires_at'] > time.time():
+            return entry['content']
+        return None
+
+    def open(self, url, lang, tags=None):
+        """
+        Return `TranscriptStream` of the transcript.
+
+        Cached transcripts are served from memory; otherwise the storage response is streamed
+        chunk by chunk and copied into the cache on the fly (if it fits).
+
+        :raises TranscriptTooLarge: if the transcript exceeds the size cap.
+        :raises IOError: on any other transport or HTTP error.
+        """
+        key = self.make_key(url, lang)
+        entry = self.cache.get(key)
+        if entry is not None and entry['expires_at'] > time.time():
+            return self.entry_stream(entry)
+
+        response = self.request(url, tags, headers=self.conditional_headers(entry), stream=True)
+
+        if entry is not None and response.status_code == 304:
+            response.close()
+            self._count_revalidation()
+            self.store(key, entry['content'], entry.get('etag'), entry.get('last_modified'))
+            return self.entry_stream(entry)
+
+        response.raise_for_status()
+        content_length = response.headers.get('Content-Length')
+        if content_length and int(content_length) > self.max_size:
+            response.close()
+            raise TranscriptTooLarge("Transcript is too large: {} bytes".format(content_length))
+
+        etag = response.headers.get('ETag')
+        chunks = self.iter_response(key, response, etag, response.headers.get('Last-Modified'))
+        return TranscriptStream(chunks, etag=etag, response=response)
+
+    def _count_revalidation(self):
+        with self._revalidations_lock:
+            self.revalidations += 1
+
+    @staticmethod
+    def request(url, tags, **kwargs):
+        return timed('upstream.transcript_get', http_get, tags or {}, get_response_outcome)(url, **kwargs)
+
+    def iter_response(self, key, response, etag, last_modified):
+        """
+        Yield response body chunks, caching the whole body once it's read.
+
+        :raises TranscriptTooLarge: once the body exceeds the size cap (storage didn't tell its length upfront).
+            The headers are sent by then, so the error makes WSGI server abort the connection: a response
+            cut short silently would be cached by browsers and CDNs as a complete one.
+        """
+        size = 0
+        chunks = []
+        for chunk in response.iter_content(self.chunk_size):
+            size += len(chunk)
+            if size > self.max_size:
+                log.warning("Transcript streaming is interrupted, size cap is exceeded: %s", key)
+                raise TranscriptTooLarge("Transcript is too large: over {} bytes".format(self.max_size))
+            if size <= self.max_item_size:
+                chunks.append(chunk)
+            yield chunk
+        if size <= self.max_item_size:
+            self.store(key, b''.join(chunks), etag, last_modified)
+
+    def entry_stream(self, entry):
+        content = entry['content']
+        chunk_size = self.chunk_size
+        chunks = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+        return TranscriptStream(chunks, etag=entry.get('etag') or entry.get('digest'))
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, key, content, etag=None, last_modified=None):
+        if len(content) > self.max_item_size:
+            log.debug("Transcript is too big to be cached: %s (%d bytes)", key, len(content))
+            return
+        self.cache.set(key, {
+            'content': content,
+            'etag': etag,
+            'last_modified': last_modified,
+            # Own validator for storages which don't provide ETag:
+            'digest': '"{}"'.format(hashlib.md5(content).hexdigest()),
+            'expires_at': time.time() + self.ttl,
+        }, self.stale_ttl)
+
+    def invalidate(self, url, lang):
+        self.cache.delete(self.make_key(url, lang))
+
+    def stats(self):
+        """
+        Hit/miss counters to help sizing the cache.
+        """
+        stats = self.cache.stats()
+        stats['revalidations'] = self.revalidations
+        return stats
+
+
+_transcript_cache = None
+
+
+def get_response_outcome(response):
+    if response.status_code == 304:
+        return 'not_modified'
+    return 'error' if response.status_code >= 400 else 'success'
+
+
+def get_transcript_cache():
+    """
+    Return process-wide transcripts cache (created on first use).
+    """
+    global _transcript_cache
+    if _transcript_cache is None:
+        _transcript_cache = TranscriptCache()
+    return _transcript_cache
+
+
+def gzip_chunks(chunks, level=6):
+    """
+    Compress chunks iterable on the fly into gzip stream.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -4,6 +4,8 @@ Copyright (c) Microsoft Corporation. All Rights Reserved.
 
 Licensed under the MIT license. See LICENSE file on the project webpage for details.
 """
+import base64
+import json
 
 
 def _(text):
@@ -13,6 +15,42 @@ def _(text):
     return text
 
 
+def etag_matches(etag, if_none_match):
+    """
+    Weak comparison of `etag` against `If-None-Match` header value.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    def strip_weak(value):
+        value = value.strip()
+        return value[2:] if value.startswith('W/') else value
+
+    return strip_weak(etag) in [strip_weak(value) for value in if_none_match.split(',')]
+
+
+def encode_cursor(values):
+    """
+    Encode keyset pagination position (list of JSON serializable values) into an opaque string.
+    """
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decode `encode_cursor` result, raise ValueError if the cursor is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (TypeError, UnicodeError, AttributeError) as error:
+        raise ValueError(error)
+    if not isinstance(values, list):
+        raise ValueError('Cursor must encode a list')
+    return values
+
+
 class AssetsMode(object):
     """
     Modes enum for `assets_download` xBlock field.
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Cache of captions and video info resolved from Azure Media Services (asset, locators and files lookups).
+"""
+import calendar
+from datetime import datetime
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_save
+from edxval.models import Video
+
+from .cache import LRUCache, TieredCache
+
+log = logging.getLogger(__name__)
+
+# Defaults, each of them can be overridden in Django settings:
+# - how long (seconds) resolved video info is cached;
+VIDEO_INFO_CACHE_TTL = 10 * 60
+# - how long (seconds) video info put into the cache by `warm_ams_video_info` command is cached;
+VIDEO_INFO_WARM_TTL = 24 * 60 * 60
+# - how long (seconds) "video is missing" results are cached;
+VIDEO_INFO_NEGATIVE_CACHE_TTL = 60
+# - how many entries are kept in the in-process LRU tier;
+VIDEO_INFO_CACHE_SIZE = 256
+# - how long (seconds) before locator's expiration cached video info is considered stale;
+VIDEO_INFO_LOCATOR_EXPIRY_MARGIN = 5 * 60
+# - how long (seconds) concurrent requests wait for the in-flight lookup of the same video;
+VIDEO_INFO_IN_FLIGHT_TIMEOUT = 30
+# - how long (seconds) video's generation is cached in-process, i.e. an invalidation may take to reach other processes.
+VIDEO_INFO_GENERATION_TTL = 5
+
+# How long (seconds) video durations known to edxval are cached in-process (they're dropped on `Video.save` as well):
+VIDEO_DURATION_CACHE_TTL = 10 * 60
+
+ODATA_DATE_RE = re.compile(r'^/Date\((-?\d+)[^)]*\)/$')
+ISO_DATE_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})')
+
+_video_info_cache = None
+_video_info_cache_lock = threading.Lock()
+_video_durations = LRUCache(max_size=VIDEO_INFO_CACHE_SIZE, timeout=VIDEO_DURATION_CACHE_TTL)
+
+
+def parse_locator_expiry(locator):
+    """
+    Return locator's `ExpirationDateTime` as a UNIX timestamp or None.
+
+    Both OData JSON date formats are supported: `/Date(1521234567000)/` and ISO 8601 (UTC).
+    """
+    value = (locator or {}).get('ExpirationDateTime')
+    if not value:
+        return None
+    match = ODATA_DATE_RE.match(value)
+    if match:
+        return int(match.group(1)) / 1000.0
+    match = ISO_DATE_RE.match(value)
+    if match:
+        return calendar.timegm(datetime(*[int(part) for part in match.groups()]).utctimetuple())
+    return None
+
+
+class VideoInfoCache(object):
+    """
+    Captions and video info keyed by org and `edx_video_id`.
+
+    - entries never outlive the locators their URLs are built from;
+    - "video is missing" results are cached for a shorter time;
+    - concurrent lookups of the same video (within the process) wait for a single upstream lookup;
+    - `invalidate` bumps per-video generation in the shared cache, so entries of all orgs
+      are dropped at once, in all the processes within `generation_timeout`.
+    """
+
+    def __init__(self, timeout=VIDEO_INFO_CACHE_TTL, negative_timeout=VIDEO_INFO_NEGATIVE_CACHE_TTL,
+                 max_size=VIDEO_INFO_CACHE_SIZE, expiry_margin=VIDEO_INFO_LOCATOR_EXPIRY_MARGIN,
+                 in_flight_timeout=VIDEO_INFO_IN_FLIGHT_TIMEOUT, generation_timeout=VIDEO_INFO_GENERATION_TTL):
+        """
+        Configure TTLs and the in-process tier size.
+        """
+        self.cache = TieredCache('ams-video-info', max_size=max_size, timeout=timeout)
+        # Generations are cached in-process briefly, so a lookup served locally doesn't hit the shared cache:
+        self.generations = LRUCache(max_size=max_size, timeout=generation_timeout)
+        self.negative_timeout = negative_timeout
+        self.expiry_margin = expiry_margin
+        self.in_flight_timeout = in_flight_timeout
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+
+    def generation_key(self, edx_video_id):
+        return self.cache.make_key(u'generation:{}'.format(edx_video_id))
+
+    def get_generation(self, edx_video_id):
+        generation = self.generations.get(edx_video_id)
+        if generation is None:
+            generation = self.cache.shared.get(self.generation_key(edx_video_id), 0)
+            self.generations.set(edx_video_id, generation)
+        return generation
+
+    def make_key(self, org, edx_video_id):
+        return u'{}:{}:{}'.format(org, edx_video_id, self.get_generation(edx_video_id))
+
+    def get_timeout(self, result, locators, timeout=None):
+        """
+        Return cache timeout for the resolved `result` (0 - don't cache).
+
+        `timeout` (if given) replaces the default one, it's still capped by the locators' expiration.
+        """
+        if locators is None:
+            # Incomplete result (some of the lookups have failed):
+            return 0
+        if not result.get('video_info'):
+            return self.negative_timeout
+
+        timeout = timeout or self.cache.timeout
+        expires_at = [parse_locator_expiry(locator) for locator in locators]
+        expires_at = [expiry for expiry in expires_at if expiry is not None]
+        if expires_at:
+            timeout = min(timeout, int(min(expires_at) - time.time() - self.expiry_margin))
+        return max(timeout, 0)
+
+    def get_or_resolve(self, org, edx_video_id, resolve):
+        """
+        Return cached video info or resolve (and cache) it.
+
+        :param resolve: callable performing the lookup, returns `(result, locators)`;
+                        `locators` is None if the result is incomplete.
+        """
+        key = self.make_key(org, edx_video_id)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+
+        with self._in_flight_lock:
+            event = self._in_flight.get(key)
+            is_leader = event is None
+            if is_leader:
+                event = self._in_flight[key] = threading.Event()
+
+        if not is_leader:
+            event.wait(self.in_flight_timeout)
+            result = self.cache.get(key)
+            if result is not None:
+                return result
+            # The leader has failed (or its result isn't cacheable), look up on our own:
+            return self._resolve(key, resolve)
+
+        try:
+            return self._resolve(key, resolve)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.pop(key, None)
+            event.set()
+
+    def _resolve(self, key, resolve):
+        result, locators = resolve()
+        self._store(key, result, locators)
+        return result
+
+    def _store(self, key, result, locators, timeout=None):
+        timeout = self.get_timeout(result, locators, timeout)
+        if timeout:
+            self.cache.set(key, result, timeout)
+        return timeout
+
+    def store(self, org, edx_video_id, result, locators, timeout=None):
+        """
+        Cache `result` resolved elsewhere (e.g. when warming the cache up), for `timeout` seconds if given.
+
+        :return: cache timeout applied (0 - the result hasn't been cached).
+        """
+        return self._store(self.make_key(org, edx_video_id), result, locators, timeout)
+
+    def invalidate(self, edx_video_id):
+        """
+        Drop cached video info of all orgs (e.g. after the video has been re-encoded).
+        """
+        generation_key = self.generation_key(edx_video_id)
+        try:
+            generation = self.cache.shared.incr(generation_key)
+        except ValueError:
+            generation = 1
+            self.cache.shared.set(generation_key, generation, None)
+        self.generations.set(edx_video_id, generation)
+
+
+def get_video_info_cache():
+    """
+    Return process-wide video info cache (created on first use).
+    """
+    global _video_info_cache
+    if _video_info_cache is None:
+        with _video_info_cache_lock:
+            if _video_info_cache is None:
+                _video_info_cache = VideoInfoCache(
+                    timeout=getattr(settings, 'AMS_VIDEO_INFO_CACHE_TTL', VIDEO_INFO_CACHE_TTL),
+                    negative_timeout=getattr(
+                        settings, 'AMS_VIDEO_INFO_NEGATIVE_CACHE_TTL', VIDEO_INFO_NEGATIVE_CACHE_TTL
+                    ),
+                    max_size=getattr(settings, 'AMS_VIDEO_INFO_CACHE_SIZE', VIDEO_INFO_CACHE_SIZE),
+                    expiry_margin=getattr(
+                        settings, 'AMS_VIDEO_INFO_LOCATOR_EXPIRY_MARGIN', VIDEO_INFO_LOCATOR_EXPIRY_MARGIN
+                    ),
+                    in_flight_timeout=getattr(
+                        settings, 'AMS_VIDEO_INFO_IN_FLIGHT_TIMEOUT', VIDEO_INFO_IN_FLIGHT_TIMEOUT
+                    ),
+                    generation_timeout=getattr(settings, 'AMS_VIDEO_INFO_GENERATION_TTL', VIDEO_INFO_GENERATION_TTL),
+                )
+    return _video_info_cache
+
+
+def get_video_duration(edx_video_id):
+    """
+    Return duration (seconds) of the video as edxval knows it or None if it's unknown.
+
+    Watch progress relies on it rather than on the duration reported by the player, it's checked on each heartbeat.
+    """
+    duration = _video_durations.get(edx_video_id)
+    if duration is None:
+        duration = Video.objects.filter(edx_video_id=edx_video_id).values_list('duration', flat=True).first() or 0
+        _video_durations.set(edx_video_id, duration)
+    return duration or None
+
+
+def invalidate_video_info(edx_video_id):
+    get_video_info_cache().invalidate(edx_video_id)
+    _video_durations.delete(edx_video_id)
+
+
+def invalidate_video_info_on_save(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Video status/encoding changes go through `Video.save`, so cached info is dropped on each save.
+    """
+    log.debug("Invalidating cached video info: edx_video_id [%s]", instance.edx_video_id)
+    invalidate_video_info(instance.edx_video_id)
+
+
+post_save.connect(invalidate_video_info_on_save, sender=Video, dispatch_uid='ams_invalidate_video_info')
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Server-side WebVTT parsing into a compact cue index.
+
+Spec: https://w3c.github.io/webvtt/
+"""
+from array import array
+from bisect import bisect_right
+import hashlib
+import json
+import re
+
+from django.conf import settings
+
+from .cache import TieredCache
+
+TIMESTAMP = r'(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})'
+CUE_TIMINGS_RE = re.compile(r'^\s*' + TIMESTAMP + r'\s+-->\s+' + TIMESTAMP)
+TAG_RE = re.compile(r'<[^>]*>')
+ENTITIES = (('&lt;', '<'), ('&gt;', '>'), ('&nbsp;', u'\xa0'), ('&lrm;', u'\u200e'), ('&rlm;', u'\u200f'),
+            ('&amp;', '&'))
+
+# Defaults, can be overridden in Django settings:
+# - how many cue indexes are kept in the in-process LRU tier;
+CUE_INDEX_CACHE_SIZE = 64
+# - how long (seconds) cue indexes are cached (they are keyed on transcript's content digest).
+CUE_INDEX_CACHE_TTL = 24 * 60 * 60
+
+_cue_index_cache = None
+
+
+class CueIndex(object):
+    """
+    Cues sorted by start time and stored column-wise in arrays.
+
+    Lookup of the cue being displayed at a given time is a binary search.
+    """
+
+    __slots__ = ('starts', 'ends', 'texts')
+
+    def __init__(self, starts=(), ends=(), texts=()):
+        """
+        Build the index from start times, end times and texts (sorted by start time).
+        """
+        self.starts = array('d', starts)
+        self.ends = array('d', ends)
+        self.texts = list(texts)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def find(self, time):
+        """
+        Return position of the (latest started) cue active at `time` or -1.
+        """
+        position = bisect_right(self.starts, time) - 1
+        if position >= 0 and time < self.ends[position]:
+            return position
+        return -1
+
+    def to_dict(self):
+        """
+        Compact representation: parallel arrays of start times, end times (seconds) and texts.
+        """
+        return {
+            'start': [round(start, 3) for start in self.starts],
+            'end': [round(end, 3) for end in self.ends],
+            'text': self.texts,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['start'], data['end'], data['text'])
+
+
+def parse_timestamp(hours, minutes, seconds, milliseconds):
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(milliseconds) / 1000.0
+
+
+def clean_cue_text(lines):
+    """
+    Strip WebVTT markup (voice/class/timestamp tags) and unescape entities.
+    """
+    text = TAG_RE.sub('', u'\n'.join(lines))
+    for entity, char in ENTITIES:
+        text = text.replace(entity, char)
+    return text.strip()
+
+
+def parse_webvtt(content):
+    """
+    Parse WebVTT file content into `CueIndex`.
+
+    The parser is lenient: malformed blocks are skipped rather than failing the whole file.
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', 'replace')
+    content = content.lstrip(u'\ufeff').replace(u'\r\n', u'\n').replace(u'\r', u'\n')
+
+    cues = []
+    for block in re.split(r'\n[ \t]*\n', content):
+        lines = block.strip(u'\n').split(u'\n')
+        # An optional cue identifier may precede the timings line:
+        for position, line in enumerate(lines[:2]):
+            match = CUE_TIMINGS_RE.match(line)
+            if match:
+                start = parse_timestamp(*match.groups()[:4])
+                end = parse_timestamp(*match.groups()[4:])
+                cues.append((start, end, clean_cue_text(lines[position + 1:])))
+                break
+
+    cues.sort(key=lambda cue: cue[0])
+    return CueIndex(
+        [cue[0] for cue in cues],
+        [cue[1] for cue in cues],
+        [cue[2] for cue in cues],
+    )
+
+
+def get_cue_index_cache():
+    global _cue_index_cache
+    if _cue_index_cache is None:
+        _cue_index_cache = TieredCache(
+            'ams-cue-index',
+            max_size=getattr(settings, 'AMS_CUE_INDEX_CACHE_SIZE', CUE_INDEX_CACHE_SIZE),
+            timeout=getattr(settings, 'AMS_CUE_INDEX_CACHE_TTL', CUE_INDEX_CACHE_TTL),
+        )
+    return _cue_index_cache
+
+
+def get_cue_index_json(content):
+    """
+    Return compact JSON cue index for transcript's content along with its version (content digest).
+
+    Parsing is memoized per transcript version.
+    """
+    digest = hashlib.md5(content if isinstance(content, bytes) else content.encode('utf-8')).hexdigest()
+    cache = get_cue_index_cache()
+    index_json = cache.get(digest)
+    if index_json is None:
+        index_json = parse_webvtt(content).to_json()
+        cache.set(digest, index_json)
+    return digest, index_json
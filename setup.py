@@ -29,6 +29,8 @@ setup(
     description='This XBlock implements a video player that utilizes the Azure Media Services.',
     packages=[
         'azure_media_services',
+        'azure_media_services.management',
+        'azure_media_services.management.commands',
     ],
     include_package_data=True,
     dependency_links=[